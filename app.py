@@ -3,14 +3,39 @@ import pandas as pd
 import numpy as np
 import json
 import os
-import io
+import sys
+import sqlite3
+import csv
 import requests
-import shutil
 import re
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import uuid
+import hashlib
 import base64
+import array
+import bisect
+import heapq
+import glob
+import copy
+import functools
+import time
+import threading
+import contextlib
+import zipfile
 import warnings
+import enum
+from collections import OrderedDict
+from collections.abc import Mapping
+from xml.sax.saxutils import escape, quoteattr
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from openpyxl import Workbook, load_workbook
+
+try:
+    import fcntl
+except ImportError:
+    # ويندوز: القفل عبر msvcrt
+    fcntl = None
+    import msvcrt
 warnings.filterwarnings('ignore')
 
 # ===============================
@@ -19,21 +44,50 @@ warnings.filterwarnings('ignore')
 APP_CONFIG = {
     "APP_TITLE": "نظام إدارة صيانة الماكينات - توقيت التشحيم وتغيير الزيت",
     "APP_ICON": "⚙️",
-    
+
     # إعدادات GitHub
     "REPO_NAME": "mahmedabdallh123/BELYARN",
     "BRANCH": "main",
     "FILE_PATH": "oil.xlsx",
     "LOCAL_FILE": "oil.xlsx",
-    
+    "GITHUB_API_URL": "https://api.github.com",
+
+    # إعدادات الرفع في الخلفية
+    "PUSH_DEBOUNCE_SECONDS": 5,
+    "PUSH_MAX_RETRIES": 5,
+    "PUSH_BACKOFF_SECONDS": 2,
+    "HTTP_TIMEOUT_SECONDS": 15,
+
+    # إعدادات التخزين: "sqlite" أو "json"
+    "STORAGE_BACKEND": "sqlite",
+
+    # سجل الصيانة: حجم كل ملف من ملفات السجل قبل بدء ملف جديد
+    "HISTORY_SEGMENT_BYTES": 1_000_000,
+    "REPORT_CACHE_MAX_BYTES": 256 * 1024 * 1024,
+    # ملفات التصدير المتبقية من عمليات سابقة تُحذف بعد هذه المدة
+    "REPORT_FILE_MAX_AGE_SECONDS": 24 * 3600,
+    "DATE_CACHE_MAX_ENTRIES": 50_000,
+
+    # تخزين JSON: حجم سجل الكتابة المسبقة قبل دمجه في ملف البيانات
+    "JSON_JOURNAL_MAX_BYTES": 4 * 1024 * 1024,
+
+    # المجدول الخلفي: أقصى مدة بين تحديثين لفهرس الاستحقاق والتنبيهات
+    "DUE_SCHEDULER_INTERVAL_SECONDS": 60,
+
+    # توقع الاستحقاق: وزن القراءة ينخفض للنصف كل هذه المدة، وأقصى معدل تشغيل مقبول
+    "USAGE_RATE_HALFLIFE_DAYS": 30,
+    "USAGE_MAX_HOURS_PER_DAY": 24,
+
     # إعدادات الأمان
     "MAX_ACTIVE_USERS": 5,
     "SESSION_DURATION_MINUTES": 60,
-    
+
     # إعدادات الواجهة
     "SHOW_TECH_SUPPORT_TO_ALL": True,
+    # وضع العرض المباشر: كل كم ثانية تتحقق الأجزاء الحية من تغير البيانات
+    "LIVE_REFRESH_SECONDS": 5,
     "CUSTOM_TABS": ["🏭 لوحة القيادة", "➕ إضافة ماكينة", "📊 إدارة الصيانة", "⏰ المؤقتات التنازلية", "📈 التقارير والإحصائيات", "⚙️ الإعدادات"],
-    
+
     # أنواع الصيانة الافتراضية
     "DEFAULT_MAINTENANCE_TYPES": [
         {"id": "oil_change", "name": "تغيير الزيت", "unit": "ساعات", "default_interval": 1000},
@@ -42,11 +96,11 @@ APP_CONFIG = {
         {"id": "inspection", "name": "فحص دوري", "unit": "أيام", "default_interval": 30},
         {"id": "calibration", "name": "معايرة", "unit": "أشهر", "default_interval": 6}
     ],
-    
+
     # إعدادات الإشعارات
     "WARNING_DAYS_BEFORE": 7,
     "CRITICAL_DAYS_BEFORE": 3,
-    
+
     # ألوان الحالة
     "COLORS": {
         "normal": "#28a745",
@@ -60,8 +114,12 @@ APP_CONFIG = {
 # 🗂 إعدادات الملفات
 # ===============================
 USERS_FILE = "users.json"
-STATE_FILE = "state.json"
+SESSIONS_DB_FILE = "sessions.db"
 MACHINES_FILE = "machines_data.json"
+MACHINES_DB_FILE = "machines_data.db"
+HISTORY_DIR = "maintenance_history"
+REPORTS_DIR = "reports_exports"
+FETCH_META_FILE = f"{APP_CONFIG['LOCAL_FILE']}.fetch.json"
 SESSION_DURATION = timedelta(minutes=APP_CONFIG["SESSION_DURATION_MINUTES"])
 MAX_ACTIVE_USERS = APP_CONFIG["MAX_ACTIVE_USERS"]
 
@@ -71,85 +129,226 @@ GITHUB_EXCEL_URL = f"https://github.com/{APP_CONFIG['REPO_NAME'].split('/')[0]}/
 # ===============================
 # 🔄 دوال المزامنة مع GitHub - معدلة
 # ===============================
-def save_local_excel_and_push(sheets_dict, commit_message="Update from Oil Maintenance System"):
-    """حفظ الملف محلياً ورفعه إلى GitHub باستخدام GitHub API مباشرة"""
-    try:
-        # 1. حفظ محلياً أولاً
-        with pd.ExcelWriter(APP_CONFIG["LOCAL_FILE"], engine="openpyxl") as writer:
-            for name, df in sheets_dict.items():
-                df.to_excel(writer, sheet_name=name, index=False)
-        
-        st.info("✅ تم الحفظ المحلي بنجاح")
-        
-        # 2. محاولة الرفع إلى GitHub
-        token = st.secrets.get("github", {}).get("token", None)
-        
-        if not token:
-            st.warning("⚠️ لم يتم العثور على GitHub token. سيتم الحفظ محلياً فقط.")
-            return sheets_dict
-        
-        # قراءة الملف المحفوظ
-        with open(APP_CONFIG["LOCAL_FILE"], "rb") as f:
-            file_content = f.read()
-        
-        # ترميز المحتوى إلى base64
-        encoded_content = base64.b64encode(file_content).decode('utf-8')
-        
-        # إنشاء payload للرفع
-        owner, repo = APP_CONFIG["REPO_NAME"].split('/')
-        file_path = APP_CONFIG["FILE_PATH"]
-        branch = APP_CONFIG["BRANCH"]
-        
-        # URL لـ GitHub API
-        api_url = f"https://api.github.com/repos/{owner}/{repo}/contents/{file_path}"
+class GitHubPushWorker:
+    """عامل خلفي يجمع لقطات ملف Excel المتتالية ويرفعها إلى GitHub في commit واحد لكل نافذة زمنية"""
+
+    def __init__(self, api_url, repo_name, branch, file_path,
+                 debounce_seconds=5, max_retries=5, backoff_seconds=2, timeout=15):
+        self.api_url = api_url.rstrip("/")
+        self.repo_name = repo_name
+        self.branch = branch
+        self.file_path = file_path
+        self.debounce_seconds = debounce_seconds
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.timeout = timeout
         
-        # الحصول على معلومات الملف الحالي (إذا كان موجوداً)
+        self._cond = threading.Condition()
+        self._pending = None
+        self._thread = None
+        self._sha = None
+        self._status = {
+            "state": "idle",
+            "pending_updates": 0,
+            "last_push_at": None,
+            "last_error": None,
+            "commits": 0
+        }
+
+    def submit(self, content, commit_message, token):
+        """إضافة لقطة جديدة للطابور (تستبدل أي لقطة لم تُرفع بعد)"""
+        with self._cond:
+            if self._pending is None:
+                self._pending = {"messages": []}
+            self._pending["content"] = content
+            self._pending["token"] = token
+            self._pending["messages"].append(commit_message)
+            self._pending["submitted_at"] = time.monotonic()
+            self._status["state"] = "pending"
+            self._status["pending_updates"] = len(self._pending["messages"])
+            
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="github-push-worker", daemon=True)
+                self._thread.start()
+            
+            self._cond.notify_all()
+
+    def status(self):
+        """نسخة من حالة العامل للعرض في الواجهة"""
+        with self._cond:
+            return dict(self._status)
+
+    def flush(self, timeout=None):
+        """انتظار إفراغ الطابور (للاختبارات والإيقاف)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending is not None or self._status["state"] == "pushing":
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None:
+                    self._cond.wait()
+                
+                # انتظار هدوء التعديلات قبل الرفع حتى تُدمج في commit واحد
+                while True:
+                    quiet_for = time.monotonic() - self._pending["submitted_at"]
+                    if quiet_for >= self.debounce_seconds:
+                        break
+                    self._cond.wait(self.debounce_seconds - quiet_for)
+                
+                batch = self._pending
+                self._pending = None
+                self._status["state"] = "pushing"
+                self._status["pending_updates"] = 0
+            
+            messages = batch["messages"]
+            commit_message = messages[-1]
+            if len(messages) > 1:
+                commit_message = f"{commit_message} (+{len(messages) - 1} تحديثات مجمعة)"
+            
+            error = None
+            for attempt in range(self.max_retries):
+                try:
+                    self._push(batch["content"], commit_message, batch["token"])
+                    error = None
+                    break
+                except Exception as e:
+                    error = str(e)
+                    with self._cond:
+                        # لقطة أحدث وصلت أثناء الانتظار ستحل محل هذه
+                        if self._pending is not None:
+                            break
+                    # لا انتظار بعد آخر محاولة: الخطأ يظهر فوراً والعامل جاهز للقطة التالية
+                    if attempt < self.max_retries - 1:
+                        time.sleep(min(60, self.backoff_seconds * (2 ** attempt)))
+            
+            with self._cond:
+                if error is None:
+                    self._status["last_push_at"] = datetime.now().isoformat()
+                    self._status["last_error"] = None
+                    self._status["commits"] += 1
+                else:
+                    self._status["last_error"] = error
+                
+                if self._pending is not None:
+                    self._status["state"] = "pending"
+                else:
+                    self._status["state"] = "error" if error else "idle"
+                self._cond.notify_all()
+
+    def _push(self, content, commit_message, token):
+        owner, repo = self.repo_name.split('/')
+        url = f"{self.api_url}/repos/{owner}/{repo}/contents/{self.file_path}"
         headers = {
             "Authorization": f"token {token}",
             "Accept": "application/vnd.github.v3+json"
         }
+        payload = {
+            "message": commit_message,
+            "content": base64.b64encode(content).decode('utf-8'),
+            "branch": self.branch
+        }
         
-        # التحقق مما إذا كان الملف موجوداً
-        response = requests.get(api_url, headers=headers, params={"ref": branch})
-        
-        if response.status_code == 200:
-            # الملف موجود، نحتاج إلى SHA للتحديث
-            file_info = response.json()
-            sha = file_info.get("sha")
-            
-            payload = {
-                "message": commit_message,
-                "content": encoded_content,
-                "sha": sha,
-                "branch": branch
-            }
-            
-            # تحديث الملف
-            update_response = requests.put(api_url, headers=headers, json=payload)
+        # نستخدم آخر SHA معروف مباشرة ولا نجلبه إلا عند عدم معرفته أو تعارضه
+        for refresh_sha in (self._sha is None, True):
+            if refresh_sha:
+                response = requests.get(url, headers=headers, params={"ref": self.branch}, timeout=self.timeout)
+                if response.status_code == 200:
+                    self._sha = response.json().get("sha")
+                elif response.status_code == 404:
+                    self._sha = None
+                else:
+                    raise RuntimeError(f"GitHub API {response.status_code}")
             
-            if update_response.status_code == 200:
-                st.success("✅ تم تحديث الملف على GitHub بنجاح!")
+            if self._sha:
+                payload["sha"] = self._sha
             else:
-                st.error(f"❌ فشل تحديث الملف: {update_response.json().get('message', 'Unknown error')}")
-        
-        elif response.status_code == 404:
-            # الملف غير موجود، إنشاء جديد
-            payload = {
-                "message": commit_message,
-                "content": encoded_content,
-                "branch": branch
-            }
+                payload.pop("sha", None)
             
-            # إنشاء الملف
-            create_response = requests.put(api_url, headers=headers, json=payload)
+            response = requests.put(url, headers=headers, json=payload, timeout=self.timeout)
             
-            if create_response.status_code == 201:
-                st.success("✅ تم إنشاء الملف على GitHub بنجاح!")
-            else:
-                st.error(f"❌ فشل إنشاء الملف: {create_response.json().get('message', 'Unknown error')}")
+            if response.status_code in (200, 201):
+                self._sha = response.json().get("content", {}).get("sha")
+                return
+            if response.status_code not in (409, 422):
+                break
         
-        else:
-            st.error(f"❌ خطأ في الاتصال بـ GitHub API: {response.status_code}")
+        try:
+            message = response.json().get("message", "Unknown error")
+        except ValueError:
+            message = "Unknown error"
+        raise RuntimeError(f"GitHub API {response.status_code}: {message}")
+
+@st.cache_resource
+def _github_push_worker():
+    """عامل رفع واحد على مستوى الخادم"""
+    return GitHubPushWorker(
+        APP_CONFIG["GITHUB_API_URL"],
+        APP_CONFIG["REPO_NAME"],
+        APP_CONFIG["BRANCH"],
+        APP_CONFIG["FILE_PATH"],
+        debounce_seconds=APP_CONFIG["PUSH_DEBOUNCE_SECONDS"],
+        max_retries=APP_CONFIG["PUSH_MAX_RETRIES"],
+        backoff_seconds=APP_CONFIG["PUSH_BACKOFF_SECONDS"],
+        timeout=APP_CONFIG["HTTP_TIMEOUT_SECONDS"]
+    )
+
+def queue_github_push(commit_message):
+    """وضع النسخة المحلية الحالية في طابور الرفع إلى GitHub دون انتظار"""
+    token = st.secrets.get("github", {}).get("token", None)
+
+    if not token:
+        st.warning("⚠️ لم يتم العثور على GitHub token. سيتم الحفظ محلياً فقط.")
+        return False
+
+    with open(APP_CONFIG["LOCAL_FILE"], "rb") as f:
+        file_content = f.read()
+
+    _github_push_worker().submit(file_content, commit_message, token)
+    return True
+
+def render_push_status():
+    """مؤشر غير معطل لحالة الرفع إلى GitHub"""
+    status = _github_push_worker().status()
+    labels = {
+        "idle": "🟢 متزامن مع GitHub",
+        "pending": f"🟡 بانتظار الرفع ({status['pending_updates']} تحديث)",
+        "pushing": "🔄 جاري الرفع إلى GitHub...",
+        "error": "🔴 فشل الرفع إلى GitHub"
+    }
+    st.caption(labels.get(status["state"], status["state"]))
+
+    if status["last_error"]:
+        st.caption(f"آخر خطأ: {status['last_error']}")
+    elif status["last_push_at"]:
+        st.caption(f"آخر رفع: {status['last_push_at'][:16].replace('T', ' ')}")
+
+def save_local_excel_and_push(sheets_dict, commit_message="Update from Oil Maintenance System"):
+    """حفظ الملف محلياً ثم وضعه في طابور الرفع إلى GitHub في الخلفية"""
+    try:
+        # 1. حفظ محلياً أولاً (يُعاد كتابة الخلايا المتغيرة فقط، والمفتاح هو العمود الأول)
+        changed = sync_excel_sheets({
+            name: {
+                "key": df.columns[0] if len(df.columns) else None,
+                "columns": list(df.columns),
+                "records": df.astype(object).where(df.notna(), None).to_dict("records")
+            }
+            for name, df in sheets_dict.items()
+        })
+        
+        if not changed:
+            return sheets_dict
+        
+        st.info("✅ تم الحفظ المحلي بنجاح")
+        
+        # 2. الرفع إلى GitHub يتم في الخلفية مع دمج التحديثات المتقاربة
+        queue_github_push(commit_message)
         
         return sheets_dict
         
@@ -158,26 +357,723 @@ def save_local_excel_and_push(sheets_dict, commit_message="Update from Oil Maint
         # حتى لو فشل الرفع لـ GitHub، نعود بالبيانات المحفوظة محلياً
         return sheets_dict
 
-def fetch_from_github():
-    """جلب الملف من GitHub"""
+def _load_fetch_meta():
+    """بيانات آخر جلب (ETag + بصمة المحتوى) لإرسال طلبات شرطية"""
     try:
-        # أولاً: جرب رابط RAW المباشر
-        response = requests.get(GITHUB_EXCEL_URL, stream=True, timeout=15)
-        
-        if response.status_code == 200:
-            with open(APP_CONFIG["LOCAL_FILE"], "wb") as f:
-                shutil.copyfileobj(response.raw, f)
+        with open(FETCH_META_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_fetch_meta(meta):
+    """حفظ بيانات الجلب بكتابة ذرية"""
+    write_json_atomic(FETCH_META_FILE, meta, indent=None)
+
+def _file_sha256(path):
+    """بصمة SHA-256 لمحتوى ملف (None إذا لم يوجد)"""
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+def _local_matches_fetch(meta, path):
+    """هل الملف المحلي ما زال مطابقاً لآخر نسخة جُلبت؟ (البصمة الرخيصة أولاً ثم SHA-256)"""
+    if not meta.get("sha256"):
+        return False
+    signature = _file_signature(path)
+    if signature is None:
+        return False
+    if meta.get("signature") == list(signature):
+        return True
+    return _file_sha256(path) == meta["sha256"]
+
+def fetch_from_github(url=None):
+    """جلب الملف من GitHub بطلب شرطي (ETag) واستكمال التنزيل المنقطع
+
+    يُكتب المحتوى في ملف مؤقت ثم يُستبدل به الملف المحلي ذرياً بعد التحقق منه،
+    ولا تُبطل الكاشات (المصنف والماكينات والتقارير) إلا إذا تغير المحتوى فعلاً.
+    تعيد True إذا تغير الملف المحلي.
+    """
+    url = url or GITHUB_EXCEL_URL
+    path = APP_CONFIG["LOCAL_FILE"]
+    part_path = f"{path}.part"
+    meta = _load_fetch_meta()
+    if meta.get("url") != url:
+        meta = {"url": url}
+
+    headers = {}
+    # 304 لا يكفي إلا إذا كان الملف المحلي ما زال هو النسخة المجلوبة
+    if meta.get("etag") and _local_matches_fetch(meta, path):
+        headers["If-None-Match"] = meta["etag"]
+
+    # استكمال تنزيل منقطع لنفس النسخة فقط
+    resume_from = 0
+    if meta.get("partial_etag") and os.path.exists(part_path):
+        resume_from = os.path.getsize(part_path)
+        headers["Range"] = f"bytes={resume_from}-"
+        headers["If-Range"] = meta["partial_etag"]
+
+    try:
+        with requests.get(url, headers=headers, stream=True, timeout=APP_CONFIG["HTTP_TIMEOUT_SECONDS"]) as response:
+            if response.status_code == 304:
+                st.info("ℹ️ الملف على GitHub لم يتغير")
+                return False
             
-            st.success("✅ تم تحديث البيانات من GitHub")
-            return True
-        else:
-            st.warning("⚠️ لا يمكن الوصول للملف على GitHub، سيتم استخدام النسخة المحلية")
-            return False
+            if response.status_code not in (200, 206):
+                st.warning("⚠️ لا يمكن الوصول للملف على GitHub، سيتم استخدام النسخة المحلية")
+                return False
+            
+            etag = response.headers.get("ETag")
+            if response.status_code == 200:
+                resume_from = 0
             
+            with open(part_path, "ab" if resume_from else "wb") as f:
+                # الملف الجزئي يُفرغ على القرص قبل تسجيل ETag الجديد، فلا يُستكمل
+                # أبداً محتوى نسخة بطلب Range لنسخة أخرى
+                if meta.get("partial_etag") != etag:
+                    f.flush()
+                    os.fsync(f.fileno())
+                    meta["partial_etag"] = etag
+                    _save_fetch_meta(meta)
+                for chunk in response.iter_content(chunk_size=1 << 16):
+                    f.write(chunk)
+            
+            # التحقق من اكتمال التنزيل
+            expected_size = response.headers.get("Content-Length")
+            if expected_size is not None and os.path.getsize(part_path) != resume_from + int(expected_size):
+                st.warning("⚠️ التنزيل غير مكتمل، سيتم استكماله في المحاولة التالية")
+                return False
+
     except Exception as e:
         st.warning(f"⚠️ فشل التحديث من GitHub: {e}")
         return False
 
+    # التحقق من أن المحتوى ملف Excel سليم قبل استبدال الملف المحلي
+    if not zipfile.is_zipfile(part_path):
+        os.remove(part_path)
+        meta.pop("partial_etag", None)
+        _save_fetch_meta(meta)
+        st.warning("⚠️ الملف المستلم من GitHub ليس ملف Excel صالحاً، سيتم استخدام النسخة المحلية")
+        return False
+
+    new_hash = _file_sha256(part_path)
+    changed = new_hash != _file_sha256(path)
+
+    with _excel_sync_state()["lock"]:
+        if changed:
+            os.replace(part_path, path)
+            invalidate_excel_cache()
+            invalidate_machines_cache()
+            _report_cache().clear()
+        else:
+            os.remove(part_path)
+        
+        meta.pop("partial_etag", None)
+        meta.update({
+            "etag": etag,
+            "sha256": new_hash,
+            "signature": list(_file_signature(path) or ()),
+            "fetched_at": datetime.now().isoformat()
+        })
+        _save_fetch_meta(meta)
+
+    if changed:
+        st.success("✅ تم تحديث البيانات من GitHub")
+    else:
+        st.info("ℹ️ البيانات المحلية مطابقة لـ GitHub")
+    return changed
+
+# ===============================
+# 📗 المزامنة التزايدية لملف Excel
+# ===============================
+MACHINES_SHEET_COLUMNS = [
+    "machine_id", "name", "model", "serial_number", "location",
+    "installation_date", "total_hours", "status", "notes", "created_at", "updated_at"
+]
+
+MAINTENANCE_SHEET_COLUMNS = [
+    "maintenance_id", "machine_id", "machine_name", "maintenance_type", "maintenance_type_id",
+    "last_date", "last_hours", "next_date", "next_hours", "interval", "interval_unit",
+    "status", "remaining_days", "remaining_hours", "updated_at"
+]
+
+_XLSX_MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_XLSX_REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_XLSX_PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+_XLSX_ILLEGAL_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+_XLSX_STYLES = (
+    f'<styleSheet xmlns="{_XLSX_MAIN_NS}">'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+@st.cache_resource
+def _excel_sync_state():
+    """نسخة مشتركة من أوراق الملف مع صفوفها وXML كل صف لإعادة كتابة المتغير فقط"""
+    return {
+        "lock": threading.RLock(),
+        "signature": None,
+        "sheets": None
+    }
+
+def invalidate_excel_cache():
+    """إبطال نسخة المصنف المحفوظة في الذاكرة (مثلاً بعد جلب الملف من GitHub)"""
+    state = _excel_sync_state()
+    with state["lock"]:
+        state["signature"] = None
+        state["sheets"] = None
+
+def _excel_cell_value(value):
+    """توحيد قيمة الخلية حتى تتطابق القيم المكتوبة مع المقروءة من الملف"""
+    if value is None or (isinstance(value, str) and value == ""):
+        return None
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+def _excel_cell_xml(value):
+    """ترميز خلية واحدة (النصوص inline حتى لا نحتاج جدول نصوص مشترك)"""
+    if value is None:
+        return "<c/>"
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f"<c><v>{value!r}</v></c>"
+    text = escape(_XLSX_ILLEGAL_CHARS.sub("", str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+def _excel_row_xml(row):
+    """ترميز صف كامل؛ الصفوف بدون أرقام مواضع فيمكن نقلها أو حذفها دون إعادة ترميز غيرها"""
+    return ("<row>" + "".join(_excel_cell_xml(v) for v in row) + "</row>").encode("utf-8")
+
+def _new_sheet_cache(columns, key_idx, rows):
+    """بناء كاش ورقة من صفوفها (المفتاح رقم الصف إذا لم يوجد عمود مفتاح)"""
+    cache = {"columns": tuple(columns), "key_idx": key_idx, "rows": {}, "xml": {}, "body": None}
+    for position, row in enumerate(rows):
+        key = position if key_idx is None else row[key_idx]
+        if key in cache["rows"]:
+            # مفاتيح مكررة: نرجع لترقيم الصفوف حتى لا يضيع أي صف
+            return _new_sheet_cache(columns, None, rows)
+        cache["rows"][key] = row
+    return cache
+
+def _load_excel_sheets(path):
+    """قراءة كل أوراق الملف الحالي مرة واحدة عند أول مزامنة"""
+    sheets = {}
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return sheets
+
+    wb = load_workbook(path, read_only=True)
+    try:
+        for ws in wb.worksheets:
+            rows_iter = ws.iter_rows(values_only=True)
+            header = list(next(rows_iter, None) or [])
+            while header and header[-1] is None:
+                header.pop()
+            width = len(header)
+            
+            rows = []
+            for values in rows_iter:
+                row = tuple(_excel_cell_value(v) for v in values[:width])
+                rows.append(row + (None,) * (width - len(row)))
+            
+            sheets[ws.title] = _new_sheet_cache(header, None, rows)
+    finally:
+        wb.close()
+
+    return sheets
+
+def _sheet_body(cache):
+    """XML الورقة كاملة؛ يُعاد تجميعه فقط إذا تغير أحد صفوفها"""
+    if cache["body"] is None:
+        xml = cache["xml"]
+        parts = [_excel_row_xml(cache["columns"])]
+        for key, row in cache["rows"].items():
+            row_xml = xml.get(key)
+            if row_xml is None:
+                row_xml = xml[key] = _excel_row_xml(row)
+            parts.append(row_xml)
+        cache["body"] = (
+            f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<worksheet xmlns="{_XLSX_MAIN_NS}"><sheetData>'.encode("utf-8")
+            + b"".join(parts)
+            + b"</sheetData></worksheet>"
+        )
+    return cache["body"]
+
+def _write_xlsx(path, sheets):
+    """كتابة الحزمة كاملة في ملف مؤقت ثم استبداله ذرياً"""
+    names = list(sheets)
+    content_types = "".join(
+        f'<Override PartName="/xl/worksheets/sheet{i}.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        for i in range(1, len(names) + 1)
+    )
+    workbook_sheets = "".join(
+        f'<sheet name={quoteattr(name)} sheetId="{i}" r:id="rId{i}"/>'
+        for i, name in enumerate(names, start=1)
+    )
+    workbook_rels = "".join(
+        f'<Relationship Id="rId{i}" Type="{_XLSX_REL_NS}/worksheet" Target="worksheets/sheet{i}.xml"/>'
+        for i in range(1, len(names) + 1)
+    )
+
+    tmp_path = f"{path}.tmp"
+    with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+        zf.writestr("[Content_Types].xml", (
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+            f'{content_types}</Types>'
+        ))
+        zf.writestr("_rels/.rels", (
+            f'<Relationships xmlns="{_XLSX_PKG_REL_NS}">'
+            f'<Relationship Id="rId1" Type="{_XLSX_REL_NS}/officeDocument" Target="xl/workbook.xml"/>'
+            '</Relationships>'
+        ))
+        zf.writestr("xl/workbook.xml", (
+            f'<workbook xmlns="{_XLSX_MAIN_NS}" xmlns:r="{_XLSX_REL_NS}"><sheets>{workbook_sheets}</sheets></workbook>'
+        ))
+        zf.writestr("xl/_rels/workbook.xml.rels", (
+            f'<Relationships xmlns="{_XLSX_PKG_REL_NS}">{workbook_rels}'
+            f'<Relationship Id="rId{len(names) + 1}" Type="{_XLSX_REL_NS}/styles" Target="styles.xml"/>'
+            '</Relationships>'
+        ))
+        zf.writestr("xl/styles.xml", _XLSX_STYLES)
+        for i, name in enumerate(names, start=1):
+            zf.writestr(f"xl/worksheets/sheet{i}.xml", _sheet_body(sheets[name]))
+
+    os.replace(tmp_path, path)
+
+def _excel_sheets_cache():
+    """أوراق الملف المحفوظة في الذاكرة (تُقرأ من جديد إذا تغير الملف من الخارج)"""
+    path = APP_CONFIG["LOCAL_FILE"]
+    state = _excel_sync_state()
+
+    with state["lock"]:
+        signature = _file_signature(path)
+        if state["sheets"] is None or signature != state["signature"]:
+            state["sheets"] = _load_excel_sheets(path)
+            state["signature"] = signature
+        return state["sheets"]
+
+def _patch_owned_rows(cache, columns, key_idx, owner_idx, owners, records):
+    """استبدال صفوف مالكين محددين في كاش ورقة (ترميز صفوفهم فقط)؛ تعيد True إذا تغير شيء"""
+    owners = {_excel_cell_value(owner) for owner in owners}
+    new_rows = {}
+    for record in records:
+        row = tuple(_excel_cell_value(record.get(c)) for c in columns)
+        new_rows[row[key_idx]] = row
+    
+    changed = False
+    for key in [key for key, row in cache["rows"].items() if row[owner_idx] in owners and key not in new_rows]:
+        del cache["rows"][key]
+        cache["xml"].pop(key, None)
+        changed = True
+    for key, row in new_rows.items():
+        if cache["rows"].get(key) != row:
+            cache["rows"][key] = row
+            cache["xml"].pop(key, None)
+            changed = True
+    return changed
+
+def sync_excel_sheets(sheets):
+    """مزامنة أوراق ملف Excel مع إعادة ترميز الصفوف المتغيرة فقط
+
+    sheets: {اسم الورقة: {"key": عمود المفتاح, "columns": [...], "records": [dict, ...]}}
+    الصفوف تُطابق بعمود المفتاح (مثل maintenance_id)، والأوراق غير المذكورة
+    تبقى كما هي. تغير الأعمدة يعيد بناء الورقة كاملة.
+    مع "append": True تُضاف الصفوف ذات المفاتيح الجديدة فقط ولا يُحذف شيء.
+    مع "owners" (وعمود "owner"): records هي الصفوف الحالية لهؤلاء المالكين فقط (الماكينات
+    المحفوظة)، فتُستبدل صفوفهم وحدها وتبقى بقية الورقة دون قراءة أو ترميز؛ وإذا لم تطابق
+    الورقة المحفوظة بنيتها تُزامن كاملة من "full" (دالة تعيد كل الصفوف).
+    تعيد True إذا تغير الملف فعلاً.
+    """
+    path = APP_CONFIG["LOCAL_FILE"]
+    state = _excel_sync_state()
+
+    with state["lock"]:
+        cached_sheets = _excel_sheets_cache()
+        changed = False
+        
+        for name, spec in sheets.items():
+            columns = tuple(spec["columns"])
+            key_column = spec.get("key")
+            key_idx = columns.index(key_column) if key_column in columns else None
+            
+            cache = cached_sheets.get(name)
+            
+            # ورقة مقروءة من الملف بدون مفتاح: نعيد فهرستها بعمود المفتاح إذا كانت الأعمدة نفسها
+            if cache is not None and cache["key_idx"] is None and key_idx is not None and cache["columns"] == columns:
+                rekeyed = _new_sheet_cache(columns, key_idx, list(cache["rows"].values()))
+                if rekeyed["key_idx"] is not None:
+                    cache = cached_sheets[name] = rekeyed
+            
+            records = spec["records"]
+            if spec.get("owners") is not None:
+                if cache is not None and key_idx is not None and cache["key_idx"] == key_idx and cache["columns"] == columns:
+                    if _patch_owned_rows(cache, columns, key_idx, columns.index(spec["owner"]), spec["owners"], records):
+                        cache["body"] = None
+                        changed = True
+                    continue
+                records = spec["full"]()
+            
+            rows = [tuple(_excel_cell_value(record.get(c)) for c in columns) for record in records]
+            
+            # وضع الإلحاق: صفوف جديدة فقط في نهاية الورقة
+            if (spec.get("append") and cache is not None and key_idx is not None
+                    and cache["key_idx"] == key_idx and cache["columns"] == columns):
+                for row in rows:
+                    if row[key_idx] not in cache["rows"]:
+                        cache["rows"][row[key_idx]] = row
+                        cache["body"] = None
+                        changed = True
+                continue
+            
+            fresh = _new_sheet_cache(columns, key_idx, rows)
+            new_rows = fresh["rows"]
+            
+            if (cache is None or fresh["key_idx"] is None
+                    or cache["key_idx"] != fresh["key_idx"] or cache["columns"] != columns):
+                # تغير بنية الورقة أو لا يوجد مفتاح فريد: إعادة بنائها كاملة
+                if cache is None or cache["columns"] != columns or list(cache["rows"].values()) != rows:
+                    cached_sheets[name] = fresh
+                    changed = True
+                continue
+            
+            sheet_changed = False
+            
+            # الصفوف المحذوفة
+            for key in [k for k in cache["rows"] if k not in new_rows]:
+                del cache["rows"][key]
+                cache["xml"].pop(key, None)
+                sheet_changed = True
+            
+            # الصفوف الجديدة والمعدلة
+            for key, row in new_rows.items():
+                if cache["rows"].get(key) != row:
+                    cache["rows"][key] = row
+                    cache["xml"].pop(key, None)
+                    sheet_changed = True
+            
+            if sheet_changed:
+                cache["body"] = None
+                changed = True
+        
+        if changed:
+            _write_xlsx(path, cached_sheets)
+            state["signature"] = _file_signature(path)
+        
+        return changed
+
+# ===============================
+# 📜 سجل الصيانة (إلحاق فقط)
+# ===============================
+HISTORY_COLUMNS = [
+    "history_id", "machine_id", "maintenance_type", "maintenance_type_id", "date",
+    "hours", "technician", "description", "cost", "parts_used",
+    "event_type", "previous_date", "previous_hours", "timestamp"
+]
+
+class MaintenanceHistoryLog:
+    """سجل أحداث إلحاقي (إتمام صيانة وقراءات ساعات) مقسم إلى ملفات JSONL
+
+    لا يُعاد كتابة أي سطر بعد إضافته؛ عند تجاوز الملف الحالي الحجم المحدد يبدأ ملف جديد.
+    الفهرس في الذاكرة: موضع كل حدث بالترتيب، وأحداث كل ماكينة مرتبة بوقت الحدث
+    (تاريخه المسجل وليس وقت إضافته، فالإتمام بتاريخ سابق يقع في مكانه).
+    الكتابة تحت قفل ملف حصري والقراءة تحت قفل مشترك بين العمليات.
+    """
+
+    def __init__(self, directory, segment_bytes):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self._lock = threading.RLock()
+        self._segments = []
+        self._by_machine = {}
+
+    def _segment_path(self, number):
+        return os.path.join(self.directory, f"events-{number:06d}.jsonl")
+
+    @staticmethod
+    def event_time(event):
+        """وقت الحدث بصيغة ISO: تاريخه المسجل (يوم/شهر/سنة) مع ساعة تسجيله"""
+        timestamp = event.get("timestamp", "")
+        try:
+            day = datetime.strptime(event.get("date") or "", "%d/%m/%Y").date().isoformat()
+        except ValueError:
+            return timestamp
+        return f"{day}T{timestamp[11:] or '00:00:00'}"
+
+    def _index_event(self, event, segment_idx, offset):
+        self._segments[segment_idx]["offsets"].append(offset)
+        bisect.insort(
+            self._by_machine.setdefault(event.get("machine_id"), []),
+            (self.event_time(event), segment_idx, offset)
+        )
+
+    def _refresh(self):
+        """فهرسة ما أُضيف إلى الملفات منذ آخر قراءة (بما في ذلك من عمليات أخرى)"""
+        if not os.path.isdir(self.directory):
+            return
+        with file_lock(os.path.join(self.directory, "events"), shared=True):
+            self._refresh_locked()
+
+    def _refresh_locked(self):
+        paths = sorted(glob.glob(os.path.join(self.directory, "events-*.jsonl")))
+        
+        for segment_idx, path in enumerate(paths):
+            if segment_idx == len(self._segments):
+                self._segments.append({"path": path, "size": 0, "offsets": array.array("q")})
+            segment = self._segments[segment_idx]
+            
+            if os.path.getsize(path) <= segment["size"]:
+                continue
+            
+            with open(path, "rb") as f:
+                f.seek(segment["size"])
+                offset = segment["size"]
+                for line in f:
+                    # القراءة تحت القفل، فسطر غير مكتمل يعني كتابة انقطعت ويُقص في الإضافة التالية
+                    if not line.endswith(b"\n"):
+                        break
+                    self._index_event(json.loads(line), segment_idx, offset)
+                    offset += len(line)
+                segment["size"] = offset
+
+    def append(self, events):
+        """إضافة أحداث في نهاية آخر ملف بكتابة واحدة"""
+        if not events:
+            return []
+        
+        with self._lock, self._write_lock():
+            self._refresh_locked()
+            
+            if not self._segments or self._segments[-1]["size"] >= self.segment_bytes:
+                path = self._segment_path(len(self._segments) + 1)
+                open(path, "ab").close()
+                self._segments.append({"path": path, "size": 0, "offsets": array.array("q")})
+            
+            segment_idx = len(self._segments) - 1
+            segment = self._segments[segment_idx]
+            lines = [(json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8") for event in events]
+            
+            with open(segment["path"], "ab") as f:
+                f.truncate(segment["size"])
+                f.write(b"".join(lines))
+                f.flush()
+                os.fsync(f.fileno())
+            
+            self._refresh_locked()
+        
+        return events
+
+    @contextlib.contextmanager
+    def _write_lock(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with file_lock(os.path.join(self.directory, "events")):
+            yield
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return sum(len(segment["offsets"]) for segment in self._segments)
+
+    def _read_at(self, locations):
+        """قراءة أحداث من مواضعها [(segment_idx, offset), ...]"""
+        events = []
+        handles = {}
+        try:
+            for segment_idx, offset in locations:
+                f = handles.get(segment_idx)
+                if f is None:
+                    f = handles[segment_idx] = open(self._segments[segment_idx]["path"], "rb")
+                f.seek(offset)
+                events.append(json.loads(f.readline()))
+        finally:
+            for f in handles.values():
+                f.close()
+        return events
+
+    def event_at(self, position):
+        """الحدث رقم position بترتيب الإضافة"""
+        with self._lock:
+            self._refresh()
+            for segment_idx, segment in enumerate(self._segments):
+                if position < len(segment["offsets"]):
+                    return self._read_at([(segment_idx, segment["offsets"][position])])[0]
+                position -= len(segment["offsets"])
+        return None
+
+    def events_from(self, position=0):
+        """كل الأحداث بدءاً من موضع معين (للتصدير التزايدي)"""
+        with self._lock:
+            self._refresh()
+            events = []
+            for segment in self._segments:
+                count = len(segment["offsets"])
+                if position >= count:
+                    position -= count
+                    continue
+                with open(segment["path"], "rb") as f:
+                    f.seek(segment["offsets"][position])
+                    for line in f:
+                        if not line.endswith(b"\n"):
+                            break
+                        events.append(json.loads(line))
+                position = 0
+            return events
+
+    def query(self, machine_id=None, since=None, until=None, event_type=None):
+        """أحداث ماكينة و/أو فترة زمنية (since/until نصوص ISO لوقت الحدث) مرتبة بوقت الحدث"""
+        with self._lock:
+            self._refresh()
+            
+            if machine_id is not None:
+                entries = self._by_machine.get(machine_id, [])
+                lo = 0 if since is None else bisect.bisect_left(entries, (since,))
+                hi = len(entries) if until is None else bisect.bisect_right(entries, (until, float("inf")))
+                events = self._read_at([(segment_idx, offset) for _, segment_idx, offset in entries[lo:hi]])
+            else:
+                events = sorted((
+                    event for event in self.events_from(0)
+                    if (since is None or self.event_time(event) >= since)
+                    and (until is None or self.event_time(event) <= until)
+                ), key=self.event_time)
+        
+        if event_type is not None:
+            events = [event for event in events if event.get("event_type") == event_type]
+        return events
+
+@st.cache_resource
+def _history_log():
+    """سجل الصيانة المشترك على مستوى الخادم"""
+    return MaintenanceHistoryLog(HISTORY_DIR, APP_CONFIG["HISTORY_SEGMENT_BYTES"])
+
+def new_history_event(event_type, machine, maint=None, hours=None, event_date=None, previous=None, description="", technician=None):
+    """إنشاء حدث لسجل الصيانة"""
+    now = datetime.now()
+    previous = previous or {}
+    if technician is None:
+        technician = st.session_state.get("username", "System")
+    return {
+        "history_id": f"{now.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}",
+        "machine_id": machine["id"],
+        "maintenance_type": maint["type_name"] if maint else None,
+        "maintenance_type_id": maint["type_id"] if maint else None,
+        "date": (event_date or now).strftime("%d/%m/%Y"),
+        "hours": machine.get("total_hours", 0) if hours is None else hours,
+        "technician": technician,
+        "description": description,
+        "cost": None,
+        "parts_used": None,
+        "event_type": event_type,
+        "previous_date": previous.get("last_date"),
+        "previous_hours": previous.get("last_hours"),
+        "timestamp": now.isoformat()
+    }
+
+def log_history_events(events):
+    """إضافة أحداث إلى سجل الصيانة"""
+    try:
+        return _history_log().append(events)
+    except Exception as e:
+        st.error(f"❌ خطأ في حفظ سجل الصيانة: {e}")
+        return []
+
+def _history_sheet_spec():
+    """وصف ورقة Maintenance_History للمزامنة: الأحداث الجديدة فقط إذا كانت الورقة مطابقة لبداية السجل"""
+    log = _history_log()
+    cache = _excel_sheets_cache().get("Maintenance_History")
+    spec = {"key": "history_id", "columns": HISTORY_COLUMNS}
+
+    if cache is not None and cache["key_idx"] == 0 and cache["columns"] == tuple(HISTORY_COLUMNS):
+        exported = len(cache["rows"])
+        if exported == 0:
+            return {**spec, "records": log.events_from(0), "append": True}
+        last_event = log.event_at(exported - 1)
+        if last_event is not None and last_event["history_id"] == next(reversed(cache["rows"])):
+            return {**spec, "records": log.events_from(exported), "append": True}
+
+    return {**spec, "records": log.events_from(0)}
+
+# ===============================
+# 💾 كتابة آمنة للملفات
+# ===============================
+class StorageError(Exception):
+    """ملف بيانات موجود لكنه غير قابل للقراءة (لا يُستبدل بقيم افتراضية حتى لا يُكتب فوقه)"""
+
+def _is_error(error, error_class):
+    """مطابقة الاستثناء بالاسم: كل تشغيل للسكربت يعرّف الأصناف من جديد، والكائنات
+    المشتركة عبر cache_resource ترفع أصناف التشغيل الذي أنشأها"""
+    return type(error).__name__ == error_class.__name__
+
+@contextlib.contextmanager
+def file_lock(path, shared=False):
+    """قفل استشاري بين العمليات على ملف جانبي path.lock (مشترك للقراءة وحصري للكتابة)
+
+    القفل مرتبط بالملف المفتوح، فلا يُطلب مرة ثانية لنفس الملف داخل القفل.
+    """
+    with open(f"{path}.lock", "a+b") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+def _fsync_directory(directory):
+    """تثبيت عملية إعادة التسمية نفسها على القرص (غير متاح على ويندوز)"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def write_atomic(path, payload):
+    """كتابة الملف كاملاً أو عدم تغييره: ملف مؤقت في نفس المجلد + fsync ثم استبدال ذري"""
+    tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    _fsync_directory(os.path.dirname(os.path.abspath(path)))
+
+def write_json_atomic(path, data, indent=4):
+    """حفظ JSON بكتابة ذرية (الصيانات المضغوطة MaintenanceEntry تُكتب كقواميس)"""
+    write_atomic(path, json.dumps(data, indent=indent, ensure_ascii=False, default=dict).encode("utf-8"))
+
 # ===============================
 # 🔐 إدارة المستخدمين والجلسات
 # ===============================
@@ -192,10 +1088,10 @@ def load_users():
                 "permissions": ["all"]
             }
         }
-        with open(USERS_FILE, "w", encoding="utf-8") as f:
-            json.dump(default_users, f, indent=4, ensure_ascii=False)
+        with file_lock(USERS_FILE):
+            write_json_atomic(USERS_FILE, default_users)
         return default_users
-    
+
     try:
         with open(USERS_FILE, "r", encoding="utf-8") as f:
             return json.load(f)
@@ -212,89 +1108,1038 @@ def load_users():
 def save_users(users):
     """حفظ بيانات المستخدمين"""
     try:
-        with open(USERS_FILE, "w", encoding="utf-8") as f:
-            json.dump(users, f, indent=4, ensure_ascii=False)
+        with file_lock(USERS_FILE):
+            write_json_atomic(USERS_FILE, users)
         return True
     except:
         return False
 
-def load_state():
-    """تحميل حالة الجلسات"""
-    if not os.path.exists(STATE_FILE):
-        with open(STATE_FILE, "w", encoding="utf-8") as f:
-            json.dump({}, f, indent=4, ensure_ascii=False)
-        return {}
-    try:
-        with open(STATE_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except:
-        return {}
+class SessionRegistry:
+    """سجل الجلسات النشطة في SQLite مع نسخة في الذاكرة
 
-def save_state(state):
-    """حفظ حالة الجلسات"""
-    with open(STATE_FILE, "w", encoding="utf-8") as f:
-        json.dump(state, f, indent=4, ensure_ascii=False)
+    التحقق من الجلسة بحث في قاموس. الجلسات المنتهية تُزال من الذاكرة عبر كومة
+    مرتبة بوقت الانتهاء (ما انتهى فعلاً فقط)، ومن قاعدة البيانات داخل معاملة
+    الدخول التالية، والحد الأقصى للمستخدمين يُفحص ويُسجل في نفس المعاملة.
+    تعديلات العمليات الأخرى تُكتشف عبر PRAGMA data_version دون قراءة الجدول.
+    """
 
-def cleanup_sessions(state):
-    """تنظيف الجلسات المنتهية"""
-    now = datetime.now()
-    changed = False
-    for user, info in list(state.items()):
-        if info.get("active") and "login_time" in info:
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sessions (
+            session_id TEXT PRIMARY KEY,
+            username TEXT NOT NULL,
+            login_time TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires_at);
+    """
+
+    def __init__(self, path, duration, max_users):
+        self.path = path
+        self.duration = duration.total_seconds()
+        self.max_users = max_users
+        self._lock = threading.RLock()
+        self._conn = None
+        self._sessions = {}
+        self._expiry = []
+        self._data_version = None
+
+    def _connection(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(self.SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _sync(self, now):
+        """إعادة تحميل الجلسات فقط إذا عدلتها عملية أخرى، ثم إزالة ما انتهى من أعلى الكومة"""
+        conn = self._connection()
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version != self._data_version:
+            self._data_version = data_version
+            rows = conn.execute("SELECT session_id, username, expires_at FROM sessions WHERE expires_at > ?", (now,))
+            self._sessions = {session_id: (username, expires_at) for session_id, username, expires_at in rows}
+            self._expiry = [(expires_at, session_id) for session_id, (_, expires_at) in self._sessions.items()]
+            heapq.heapify(self._expiry)
+        
+        while self._expiry and self._expiry[0][0] <= now:
+            expires_at, session_id = heapq.heappop(self._expiry)
+            if self._sessions.get(session_id, (None, None))[1] == expires_at:
+                del self._sessions[session_id]
+
+    def is_active(self, session_id):
+        """هل الجلسة مسجلة ولم تنتهِ بعد"""
+        with self._lock:
+            self._sync(time.time())
+            return session_id in self._sessions
+
+    def active_users(self):
+        """أسماء المستخدمين الذين لديهم جلسة نشطة"""
+        with self._lock:
+            self._sync(time.time())
+            return sorted({username for username, _ in self._sessions.values()})
+
+    def open(self, username):
+        """تسجيل جلسة جديدة؛ تعيد معرف الجلسة أو None إذا اكتمل عدد المستخدمين النشطين
+
+        المستخدم الذي لديه جلسة نشطة يمكنه فتح جلسة أخرى دون أن يُحسب مرتين.
+        """
+        now = time.time()
+        session_id = uuid.uuid4().hex
+        
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
             try:
-                login_time = datetime.fromisoformat(info["login_time"])
-                if now - login_time > SESSION_DURATION:
-                    info["active"] = False
-                    info.pop("login_time", None)
-                    changed = True
+                conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,))
+                others = conn.execute(
+                    "SELECT COUNT(DISTINCT username) FROM sessions WHERE username != ?", (username,)
+                ).fetchone()[0]
+                if others >= self.max_users:
+                    conn.execute("ROLLBACK")
+                    return None
+                conn.execute(
+                    "INSERT INTO sessions (session_id, username, login_time, expires_at) VALUES (?, ?, ?, ?)",
+                    (session_id, username, datetime.now().isoformat(), now + self.duration)
+                )
+                conn.execute("COMMIT")
             except:
-                info["active"] = False
-                changed = True
-    if changed:
-        save_state(state)
-    return state
+                conn.execute("ROLLBACK")
+                raise
+            
+            # تعديلاتنا لا تغير data_version لهذا الاتصال فتُضاف للذاكرة مباشرة
+            self._sync(now)
+            self._sessions[session_id] = (username, now + self.duration)
+            heapq.heappush(self._expiry, (now + self.duration, session_id))
+        
+        return session_id
 
-# ===============================
+    def close(self, session_id):
+        """إنهاء جلسة (تسجيل الخروج)"""
+        if not session_id:
+            return
+        with self._lock:
+            self._connection().execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._sessions.pop(session_id, None)
+
+@st.cache_resource
+def _session_registry():
+    """سجل الجلسات المشترك على مستوى الخادم"""
+    return SessionRegistry(SESSIONS_DB_FILE, SESSION_DURATION, MAX_ACTIVE_USERS)
+
+def end_session():
+    """تسجيل الخروج: إزالة الجلسة من السجل ومسح حالة المتصفح"""
+    _session_registry().close(st.session_state.get("session_id"))
+    for key in list(st.session_state.keys()):
+        del st.session_state[key]
+
+# ===============================
 # 🏭 إدارة بيانات الماكينات
 # ===============================
-def load_machines_data():
-    """تحميل بيانات الماكينات من JSON"""
-    if not os.path.exists(MACHINES_FILE):
-        default_data = {
-            "machines": [],
-            "maintenance_types": APP_CONFIG["DEFAULT_MAINTENANCE_TYPES"],
-            "settings": {
-                "warning_days": APP_CONFIG["WARNING_DAYS_BEFORE"],
-                "critical_days": APP_CONFIG["CRITICAL_DAYS_BEFORE"]
-            }
+def _default_machines_data():
+    """البيانات الافتراضية عند غياب ملف الماكينات"""
+    return {
+        "machines": [],
+        "maintenance_types": APP_CONFIG["DEFAULT_MAINTENANCE_TYPES"],
+        "settings": {
+            "warning_days": APP_CONFIG["WARNING_DAYS_BEFORE"],
+            "critical_days": APP_CONFIG["CRITICAL_DAYS_BEFORE"]
         }
-        with open(MACHINES_FILE, "w", encoding="utf-8") as f:
-            json.dump(default_data, f, indent=4, ensure_ascii=False)
-        return default_data
-    
+    }
+
+class ConflictError(Exception):
+    """تعديل متزامن لنفس الحقول في ماكينة من جلستين لا يمكن دمجه"""
+
+_MISSING = object()
+
+def _merge_fields(base, ours, theirs, skip=()):
+    """دمج ثلاثي لقاموس مسطح: ما غيرناه عن الأساس يُطبق فوق المخزن (None عند التعارض)"""
+    merged = dict(theirs)
+    for key in list(ours) + [key for key in base if key not in ours]:
+        if key in skip:
+            continue
+        mine, original, stored = ours.get(key, _MISSING), base.get(key, _MISSING), theirs.get(key, _MISSING)
+        if mine == original or mine == stored:
+            continue
+        if stored != original:
+            return None
+        if mine is _MISSING:
+            merged.pop(key, None)
+        else:
+            merged[key] = mine
+    return merged
+
+def merge_machine(base, ours, theirs):
+    """دمج تعديلاتنا على ماكينة مع نسخة حفظتها جلسة أخرى على مستوى الحقول
+
+    base: الماكينة كما قرأناها، ours: بعد تعديلنا، theirs: المخزنة الآن.
+    الصيانات تُطابق بـ type_id وتُدمج حقلاً حقلاً. تعيد None إذا غيّر الطرفان
+    نفس الحقل بقيمتين مختلفتين أو حذف أحدهما صيانة عدّلها الآخر.
+    """
+    merged = _merge_fields(base, ours, theirs, skip=("next_maintenance", "revision", "updated_at"))
+    if merged is None:
+        return None
+    if "updated_at" in ours or "updated_at" in theirs:
+        merged["updated_at"] = max(str(ours.get("updated_at") or ""), str(theirs.get("updated_at") or "")) or None
+
+    by_type = lambda machine: {maint["type_id"]: maint for maint in machine.get("next_maintenance", [])}
+    base_schedule, our_schedule, their_schedule = by_type(base), by_type(ours), by_type(theirs)
+    schedule = []
+    for type_id in list(their_schedule) + [t for t in our_schedule if t not in their_schedule]:
+        original, mine, stored = base_schedule.get(type_id), our_schedule.get(type_id), their_schedule.get(type_id)
+        if mine == original:
+            entry = stored
+        elif stored == original or stored == mine:
+            entry = mine
+        elif original is None or mine is None or stored is None:
+            return None
+        else:
+            entry = _merge_fields(original, mine, stored)
+            if entry is None:
+                return None
+        if entry is not None:
+            schedule.append(entry)
+    if "next_maintenance" in theirs or "next_maintenance" in ours:
+        merged["next_maintenance"] = schedule
+    return merged
+
+def resolve_machine_writes(machines, revisions, load_stored, bases=None):
+    """مقارنة وتبديل (compare-and-swap) لرقم مراجعة كل ماكينة قبل الكتابة
+
+    revisions: {machine_id: المراجعة المخزنة}؛ الماكينة بنفس المراجعة تُكتب كما هي،
+    وغير ذلك تُدمج مع المخزنة (load_stored) إذا توفر أساسها في bases وإلا ConflictError.
+    تعيد الماكينات كما ستُحفظ برقم مراجعة جديد.
+    """
+    bases = bases or {}
+    resolved = []
+    for machine in machines:
+        expected = machine.get("revision", 0)
+        stored_revision = revisions.get(machine["id"])
+        
+        if (stored_revision or 0) != expected or (stored_revision is None and expected):
+            base = bases.get(machine["id"])
+            stored = load_stored(machine["id"]) if stored_revision is not None else None
+            merged = None
+            if base is not None and base.get("revision", 0) == expected and stored is not None:
+                merged = merge_machine(base, machine, stored)
+            if merged is None:
+                raise ConflictError(f"الماكينة '{machine.get('name', machine['id'])}' عُدلت من جلسة أخرى بنفس الحقول")
+            machine = merged
+        
+        machine = dict(machine)
+        machine["revision"] = (stored_revision or 0) + 1
+        resolved.append(machine)
+    return resolved
+
+class JsonMachinesStorage:
+    """تخزين بيانات الماكينات في ملف JSON واحد (صيغة الاستيراد/التصدير والتخزين القديم)
+
+    حفظ مجموعة ماكينات يُلحق سطراً بسجل كتابة مسبقة (path.journal) مع fsync بدلاً
+    من إعادة كتابة الملف، والتحميل يعيد تطبيق السجل فوق الملف. عند تجاوز السجل
+    الحجم المحدد يُدمج في ملف جديد يُكتب ذرياً. السطر الأول في السجل بصمة الملف
+    الذي بُني عليه، فسجل متبقٍ من قبل آخر كتابة كاملة لا يُطبق أبداً.
+    """
+
+    def __init__(self, path, journal_max_bytes=None):
+        self.path = path
+        self.journal_path = f"{path}.journal"
+        self.journal_max_bytes = journal_max_bytes or APP_CONFIG["JSON_JOURNAL_MAX_BYTES"]
+        self._snapshot_digest = (None, None)
+        self._journal_size = (None, 0)
+        self._revisions = (None, {})
+
+    def signature(self):
+        if not os.path.exists(self.path):
+            self.save(_default_machines_data())
+        return self._state_signature()
+
+    def _state_signature(self):
+        return (_file_signature(self.path), _file_signature(self.journal_path))
+
+    def _read_snapshot(self):
+        """(البيانات, بصمة المحتوى) لملف البيانات؛ الملف التالف يرفع StorageError"""
+        signature = _file_signature(self.path)
+        try:
+            with open(self.path, "rb") as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return _default_machines_data(), None
+        
+        digest = hashlib.sha1(raw).hexdigest()
+        self._snapshot_digest = (signature, digest)
+        try:
+            return json.loads(raw), digest
+        except ValueError as e:
+            raise StorageError(f"ملف البيانات {self.path} تالف ({e})")
+
+    def _current_digest(self):
+        """بصمة ملف البيانات الحالي (تُحسب فقط إذا تغير الملف)"""
+        signature = _file_signature(self.path)
+        if signature is None:
+            return None
+        if self._snapshot_digest[0] != signature:
+            with open(self.path, "rb") as f:
+                self._snapshot_digest = (signature, hashlib.sha1(f.read()).hexdigest())
+        return self._snapshot_digest[1]
+
+    def _read_journal(self, digest):
+        """دفعات السجل المبنية على ملف البيانات الحالي وحجم الجزء السليم منه
+
+        السطر الأخير غير المكتمل يعني كتابة انقطعت فيُهمل ويُقص في الإضافة التالية.
+        """
+        try:
+            with open(self.journal_path, "rb") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return [], 0
+        
+        batches = []
+        size = 0
+        for number, line in enumerate(lines):
+            if not line.endswith(b"\n"):
+                break
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            if number == 0 and record.get("snapshot") != digest:
+                return [], 0
+            if number > 0:
+                batches.append(record["machines"])
+            size += len(line)
+        return batches, size
+
+    @staticmethod
+    def _apply(data, batches):
+        positions = {existing["id"]: idx for idx, existing in enumerate(data["machines"])}
+        for machines in batches:
+            for machine in machines:
+                if machine["id"] in positions:
+                    data["machines"][positions[machine["id"]]] = machine
+                else:
+                    positions[machine["id"]] = len(data["machines"])
+                    data["machines"].append(machine)
+        return data
+
+    def _load_locked(self):
+        data, digest = self._read_snapshot()
+        batches, size = self._read_journal(digest)
+        self._journal_size = (_file_signature(self.journal_path), size)
+        data = self._apply(data, batches)
+        self._revisions = (self._state_signature(), {machine["id"]: machine.get("revision", 0) for machine in data["machines"]})
+        return data
+
+    def load(self):
+        with file_lock(self.path, shared=True):
+            return self._load_locked()
+
+    def _save_locked(self, data):
+        write_json_atomic(self.path, data)
+        # السجل مبني على الملف السابق ولم يعد صالحاً (بصمته لا تطابق حتى لو بقي)
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self._journal_size = (None, 0)
+
+    def save(self, data):
+        with file_lock(self.path):
+            self._save_locked(data)
+            self._revisions = (None, {})
+
+    def save_catalog(self, maintenance_types, settings):
+        """حفظ أنواع الصيانة والإعدادات فوق أحدث نسخة من الماكينات"""
+        with file_lock(self.path):
+            data = self._load_locked()
+            data["maintenance_types"] = maintenance_types
+            data["settings"] = settings
+            self._save_locked(data)
+            self._revisions = (None, {})
+
+    def save_machine(self, machine):
+        return self.save_machines([machine])
+
+    def save_machines(self, machines, bases=None):
+        """إضافة دفعة للسجل بعد التحقق من أرقام المراجعة؛ تعيد الماكينات كما حُفظت"""
+        with file_lock(self.path):
+            if not os.path.exists(self.path):
+                self._save_locked(_default_machines_data())
+            
+            # أرقام المراجعة من آخر قراءة أو كتابة منا ما لم يكتب أحد بعدها
+            signature, revisions = self._revisions
+            stored = {}
+            if signature != self._state_signature() or any(
+                revisions.get(machine["id"], 0) != machine.get("revision", 0) for machine in machines
+            ):
+                stored = {machine["id"]: machine for machine in self._load_locked()["machines"]}
+                revisions = self._revisions[1]
+            machines = resolve_machine_writes(machines, revisions, stored.get, bases)
+            digest = self._current_digest()
+            
+            # الحجم السليم معروف إذا لم يكتب أحد في السجل منذ آخر قراءة أو إضافة منا
+            journal_signature, size = self._journal_size
+            if journal_signature is None or journal_signature != _file_signature(self.journal_path):
+                _, size = self._read_journal(digest)
+            
+            lines = [] if size else [json.dumps({"snapshot": digest}) + "\n"]
+            lines.append(json.dumps({"machines": machines}, ensure_ascii=False) + "\n")
+            with open(self.journal_path, "ab") as f:
+                f.truncate(size)
+                f.write("".join(lines).encode("utf-8"))
+                f.flush()
+                os.fsync(f.fileno())
+                size = f.tell()
+            self._journal_size = (_file_signature(self.journal_path), size)
+            revisions.update((machine["id"], machine["revision"]) for machine in machines)
+            self._revisions = (self._state_signature(), revisions)
+            
+            if size > self.journal_max_bytes:
+                self._save_locked(self._load_locked())
+                self._revisions = (self._state_signature(), revisions)
+        
+        return machines
+
+class SqliteMachinesStorage:
+    """تخزين بيانات الماكينات في SQLite بجداول منفصلة وتحديثات على مستوى الصف"""
+
+    MACHINE_COLUMNS = [
+        "id", "name", "model", "serial_number", "location", "installation_date",
+        "total_hours", "status", "notes", "created_at", "updated_at"
+    ]
+    SCHEDULE_COLUMNS = [
+        "type_id", "type_name", "interval", "unit",
+        "last_date", "last_hours", "next_date", "next_hours"
+    ]
+    TYPE_COLUMNS = ["id", "name", "unit", "default_interval"]
+
+    # الأعمدة الرقمية بدون نوع معلن حتى تعود القيم الصحيحة int والكسرية float كما حُفظت
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS machines (
+            id TEXT PRIMARY KEY,
+            name TEXT, model TEXT, serial_number TEXT, location TEXT,
+            installation_date TEXT, total_hours, status TEXT, notes TEXT,
+            created_at TEXT, updated_at TEXT,
+            extra TEXT
+        );
+        CREATE TABLE IF NOT EXISTS maintenance_schedule (
+            machine_id TEXT NOT NULL REFERENCES machines(id) ON DELETE CASCADE,
+            type_id TEXT NOT NULL,
+            type_name TEXT, interval, unit TEXT,
+            last_date TEXT, last_hours, next_date TEXT, next_hours,
+            next_due TEXT,
+            extra TEXT,
+            PRIMARY KEY (machine_id, type_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_schedule_machine ON maintenance_schedule(machine_id);
+        CREATE INDEX IF NOT EXISTS idx_schedule_type ON maintenance_schedule(type_id);
+        CREATE INDEX IF NOT EXISTS idx_schedule_next_due ON maintenance_schedule(next_due);
+        CREATE INDEX IF NOT EXISTS idx_schedule_next_hours ON maintenance_schedule(next_hours);
+        CREATE TABLE IF NOT EXISTS maintenance_types (
+            id TEXT PRIMARY KEY,
+            name TEXT, unit TEXT, default_interval,
+            extra TEXT
+        );
+        CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value);
+        INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.executescript(self.SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _transaction(self, work):
+        """تنفيذ دالة داخل معاملة واحدة مع رفع رقم الإصدار"""
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                work(conn)
+                conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+                conn.execute("COMMIT")
+            except:
+                conn.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def _split(record, columns):
+        """فصل الأعمدة المعروفة عن باقي المفاتيح (تُحفظ كـ JSON في عمود extra)"""
+        values = [record.get(c) for c in columns]
+        extra = {k: v for k, v in record.items() if k not in columns and k != "next_maintenance"}
+        return values, (json.dumps(extra, ensure_ascii=False) if extra else None)
+
+    @staticmethod
+    def _join(columns, row, extra):
+        record = dict(zip(columns, row))
+        if extra:
+            record.update(json.loads(extra))
+        return record
+
+    @staticmethod
+    def _next_due(next_date):
+        """التاريخ التالي بصيغة ISO حتى يعمل فهرس الترتيب"""
+        try:
+            return datetime.strptime(next_date, "%d/%m/%Y").date().isoformat()
+        except (TypeError, ValueError):
+            return None
+
+    def signature(self):
+        with self._lock:
+            row = self._connection().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return (_file_signature(self.path), row[0] if row else 0)
+
+    def load(self):
+        with self._lock:
+            conn = self._connection()
+            machines = []
+            by_id = {}
+            for row in conn.execute(f"SELECT {', '.join(self.MACHINE_COLUMNS)}, extra FROM machines ORDER BY rowid"):
+                machine = self._join(self.MACHINE_COLUMNS, row[:-1], row[-1])
+                machine["next_maintenance"] = []
+                machines.append(machine)
+                by_id[machine["id"]] = machine
+            
+            for row in conn.execute(f"SELECT machine_id, {', '.join(self.SCHEDULE_COLUMNS)}, extra FROM maintenance_schedule ORDER BY rowid"):
+                machine = by_id.get(row[0])
+                if machine is not None:
+                    machine["next_maintenance"].append(self._join(self.SCHEDULE_COLUMNS, row[1:-1], row[-1]))
+            
+            types = [
+                self._join(self.TYPE_COLUMNS, row[:-1], row[-1])
+                for row in conn.execute(f"SELECT {', '.join(self.TYPE_COLUMNS)}, extra FROM maintenance_types ORDER BY rowid")
+            ]
+            settings = {key: json.loads(value) for key, value in conn.execute("SELECT key, value FROM settings ORDER BY rowid")}
+        
+        data = _default_machines_data()
+        data["machines"] = machines
+        if types:
+            data["maintenance_types"] = types
+        if settings:
+            data["settings"] = settings
+        return data
+
+    def _upsert_machine(self, conn, machine):
+        values, extra = self._split(machine, self.MACHINE_COLUMNS)
+        updates = ", ".join(f"{c} = excluded.{c}" for c in self.MACHINE_COLUMNS[1:] + ["extra"])
+        conn.execute(
+            f"INSERT INTO machines ({', '.join(self.MACHINE_COLUMNS)}, extra) "
+            f"VALUES ({', '.join('?' * (len(self.MACHINE_COLUMNS) + 1))}) "
+            f"ON CONFLICT(id) DO UPDATE SET {updates}",
+            values + [extra]
+        )
+        
+        schedule = machine.get("next_maintenance", [])
+        type_ids = [maint["type_id"] for maint in schedule]
+        conn.execute(
+            f"DELETE FROM maintenance_schedule WHERE machine_id = ? AND type_id NOT IN ({', '.join('?' * len(type_ids))})",
+            [machine["id"]] + type_ids
+        )
+        
+        updates = ", ".join(f"{c} = excluded.{c}" for c in self.SCHEDULE_COLUMNS[1:] + ["next_due", "extra"])
+        for maint in schedule:
+            values, extra = self._split(maint, self.SCHEDULE_COLUMNS)
+            conn.execute(
+                f"INSERT INTO maintenance_schedule (machine_id, {', '.join(self.SCHEDULE_COLUMNS)}, next_due, extra) "
+                f"VALUES ({', '.join('?' * (len(self.SCHEDULE_COLUMNS) + 3))}) "
+                f"ON CONFLICT(machine_id, type_id) DO UPDATE SET {updates}",
+                [machine["id"]] + values + [self._next_due(maint.get("next_date")), extra]
+            )
+
+    def save(self, data):
+        def work(conn):
+            machine_ids = [machine["id"] for machine in data["machines"]]
+            conn.execute(f"DELETE FROM machines WHERE id NOT IN ({', '.join('?' * len(machine_ids))})", machine_ids)
+            for machine in data["machines"]:
+                self._upsert_machine(conn, machine)
+            
+            self._write_catalog(conn, data["maintenance_types"], data.get("settings", {}))
+        
+        self._transaction(work)
+
+    def _write_catalog(self, conn, maintenance_types, settings):
+        type_ids = [t["id"] for t in maintenance_types]
+        conn.execute(f"DELETE FROM maintenance_types WHERE id NOT IN ({', '.join('?' * len(type_ids))})", type_ids)
+        updates = ", ".join(f"{c} = excluded.{c}" for c in self.TYPE_COLUMNS[1:] + ["extra"])
+        for maint_type in maintenance_types:
+            values, extra = self._split(maint_type, self.TYPE_COLUMNS)
+            conn.execute(
+                f"INSERT INTO maintenance_types ({', '.join(self.TYPE_COLUMNS)}, extra) "
+                f"VALUES ({', '.join('?' * (len(self.TYPE_COLUMNS) + 1))}) "
+                f"ON CONFLICT(id) DO UPDATE SET {updates}",
+                values + [extra]
+            )
+        
+        conn.execute("DELETE FROM settings")
+        conn.executemany(
+            "INSERT INTO settings (key, value) VALUES (?, ?)",
+            [(key, json.dumps(value, ensure_ascii=False)) for key, value in settings.items()]
+        )
+
+    def save_catalog(self, maintenance_types, settings):
+        """حفظ أنواع الصيانة والإعدادات فقط دون لمس الماكينات"""
+        self._transaction(lambda conn: self._write_catalog(conn, maintenance_types, settings))
+
+    def _load_machine(self, conn, machine_id):
+        """ماكينة واحدة مع جدول صيانتها كما هي مخزنة الآن"""
+        row = conn.execute(f"SELECT {', '.join(self.MACHINE_COLUMNS)}, extra FROM machines WHERE id = ?", (machine_id,)).fetchone()
+        if row is None:
+            return None
+        machine = self._join(self.MACHINE_COLUMNS, row[:-1], row[-1])
+        machine["next_maintenance"] = [
+            self._join(self.SCHEDULE_COLUMNS, schedule_row[:-1], schedule_row[-1])
+            for schedule_row in conn.execute(
+                f"SELECT {', '.join(self.SCHEDULE_COLUMNS)}, extra FROM maintenance_schedule WHERE machine_id = ? ORDER BY rowid",
+                (machine_id,)
+            )
+        ]
+        return machine
+
+    def save_machine(self, machine):
+        return self.save_machines([machine])
+
+    def save_machines(self, machines, bases=None):
+        """كتابة الماكينات بعد التحقق من أرقام المراجعة داخل نفس المعاملة؛ تعيد الماكينات كما حُفظت"""
+        resolved = []
+        
+        def work(conn):
+            ids = [machine["id"] for machine in machines]
+            revisions = {}
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                for machine_id, extra in conn.execute(
+                    f"SELECT id, extra FROM machines WHERE id IN ({', '.join('?' * len(chunk))})", chunk
+                ):
+                    revisions[machine_id] = json.loads(extra).get("revision", 0) if extra else 0
+            
+            resolved[:] = resolve_machine_writes(
+                machines, revisions, lambda machine_id: self._load_machine(conn, machine_id), bases
+            )
+            for machine in resolved:
+                self._upsert_machine(conn, machine)
+        
+        self._transaction(work)
+        return resolved
+
+    def is_empty(self):
+        with self._lock:
+            conn = self._connection()
+            return not any(
+                conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone()
+                for table in ("machines", "maintenance_types", "settings")
+            )
+
+def migrate_json_to_sqlite(json_path=MACHINES_FILE, db_path=MACHINES_DB_FILE, force=False):
+    """ترحيل ملف machines_data.json إلى قاعدة SQLite (مرة واحدة)
+
+    الترحيل يستبدل محتوى القاعدة بالكامل، فإذا كانت تحتوي بيانات يرفض بـ StorageError
+    يصف ما سيُستبدل ويُحذف، إلا مع force.
+    """
+    source = JsonMachinesStorage(json_path)
+    target = SqliteMachinesStorage(db_path)
+    data = source.load()
+
+    if not force and not target.is_empty():
+        existing = target.load()
+        incoming = {machine["id"] for machine in data["machines"]}
+        replaced = sum(machine["id"] in incoming for machine in existing["machines"])
+        raise StorageError(
+            f"القاعدة {db_path} تحتوي بيانات: {len(existing['machines'])} ماكينة "
+            f"({replaced} ستُستبدل و{len(existing['machines']) - replaced} ستُحذف)، "
+            f"{len(existing['maintenance_types'])} نوع صيانة و{len(existing['settings'])} إعداد. "
+            f"استخدم --force للكتابة فوقها"
+        )
+
+    target.save(data)
+    return len(data["machines"])
+
+def _create_machines_storage():
+    """إنشاء محرك التخزين حسب الإعدادات"""
+    if APP_CONFIG["STORAGE_BACKEND"] == "json":
+        return JsonMachinesStorage(MACHINES_FILE)
+
+    storage = SqliteMachinesStorage(MACHINES_DB_FILE)
+    # أول تشغيل بعد التحويل: استيراد ملف JSON القديم تلقائياً
+    if storage.is_empty() and os.path.exists(MACHINES_FILE):
+        storage.save(JsonMachinesStorage(MACHINES_FILE).load())
+    return storage
+
+class RWLock:
+    """قفل قراءة/كتابة: عدة قراء معاً أو كاتب واحد
+
+    يُعاد الدخول فيه من نفس الخيط (قراءة داخل قراءة أو كتابة، وكتابة داخل كتابة).
+    الكاتب المنتظر يمنع دخول قراء جدد حتى لا ينتظر للأبد. لا ترقية من قراءة
+    إلى كتابة: يُترك قفل القراءة أولاً ثم يُعاد الفحص تحت قفل الكتابة.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = {}
+        self._writer = None
+        self._writer_depth = 0
+        self._waiting_writers = 0
+
+    @contextlib.contextmanager
+    def read(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer != me and me not in self._readers:
+                while self._writer is not None or self._waiting_writers:
+                    self._cond.wait()
+            self._readers[me] = self._readers.get(me, 0) + 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers[me] -= 1
+                if not self._readers[me]:
+                    del self._readers[me]
+                    self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def write(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer != me:
+                if me in self._readers:
+                    raise RuntimeError("لا يمكن طلب قفل الكتابة أثناء حجز قفل القراءة")
+                self._waiting_writers += 1
+                try:
+                    while self._writer is not None or self._readers:
+                        self._cond.wait()
+                finally:
+                    self._waiting_writers -= 1
+                self._writer = me
+            self._writer_depth += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer_depth -= 1
+                if not self._writer_depth:
+                    self._writer = None
+                    self._cond.notify_all()
+
+@st.cache_resource
+def _machines_store():
+    """مخزن مشترك على مستوى العملية لبيانات الماكينات (يبقى بين إعادة التشغيل والتبويبات)
+
+    القراءة تحت lock.read() والتعديل تحت lock.write(). alerts و stats لقطات
+    منشورة تُستبدل كاملة مع كل تغيير، فتقرؤها الجلسات كما هي.
+    """
+    return {
+        "lock": RWLock(),
+        "backend": _create_machines_storage(),
+        "signature": None,
+        "data": None,
+        "version": 0,
+        "due_index": None,
+        "alerts": None,
+        "stats": None,
+        "totals": None,
+        "machine_index": None
+    }
+
+def _file_signature(path):
+    """بصمة رخيصة للملف (inode + وقت التعديل + الحجم) للتحقق من صلاحية الكاش"""
     try:
-        with open(MACHINES_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except:
-        return {
-            "machines": [],
-            "maintenance_types": APP_CONFIG["DEFAULT_MAINTENANCE_TYPES"],
-            "settings": {
-                "warning_days": APP_CONFIG["WARNING_DAYS_BEFORE"],
-                "critical_days": APP_CONFIG["CRITICAL_DAYS_BEFORE"]
-            }
-        }
+        info = os.stat(path)
+    except OSError:
+        return None
+    return (info.st_ino, info.st_mtime_ns, info.st_size)
+
+def invalidate_machines_cache():
+    """إبطال الكاش المشترك لبيانات الماكينات"""
+    store = _machines_store()
+    with store["lock"].write():
+        store["data"] = None
+        store["signature"] = None
+
+class MachineIndex:
+    """فهارس قاموسية فوق بيانات الماكينات المشتركة (بحث بزمن ثابت بدلاً من المرور على القائمة)
+
+    by_id / by_serial: ماكينة واحدة. by_name / by_location / by_status: {اسم أو مكان أو حالة: {معرف: None}}.
+    maintenance: {(machine_id, type_id): الصيانة}، by_type: {type_id: {machine_id: None}}.
+    types: {type_id: نوع الصيانة}. position: موضع كل ماكينة في القائمة.
+    """
+
+    def __init__(self):
+        self.by_id = {}
+        self.by_serial = {}
+        self.by_name = {}
+        self.by_location = {}
+        self.by_status = {}
+        self.by_type = {}
+        self.maintenance = {}
+        self.types = {}
+        self.position = {}
+        self.version = None
+
+    def rebuild(self, machines_data, version):
+        """بناء الفهارس كاملة"""
+        self.__init__()
+        for idx, machine in enumerate(machines_data["machines"]):
+            self.position[machine["id"]] = idx
+            self._add(machine)
+        self.types = {t["id"]: t for t in machines_data["maintenance_types"]}
+        self.version = version
+
+    def _add(self, machine):
+        machine_id = machine["id"]
+        self.by_id[machine_id] = machine
+        if machine.get("serial_number"):
+            self.by_serial[str(machine["serial_number"]).strip()] = machine
+        self.by_name.setdefault(machine["name"], {})[machine_id] = None
+        self.by_location.setdefault(machine.get("location", "غير محدد"), {})[machine_id] = None
+        self.by_status.setdefault(machine.get("status", "inactive"), {})[machine_id] = None
+        for maint in machine.get("next_maintenance", []):
+            self.maintenance[(machine_id, maint["type_id"])] = maint
+            self.by_type.setdefault(maint["type_id"], {})[machine_id] = None
+
+    def _discard(self, machine_id):
+        machine = self.by_id.pop(machine_id, None)
+        if machine is None:
+            return
+        serial = str(machine.get("serial_number") or "").strip()
+        if serial and self.by_serial.get(serial) is machine:
+            del self.by_serial[serial]
+        for group, value in (
+            (self.by_name, machine["name"]),
+            (self.by_location, machine.get("location", "غير محدد")),
+            (self.by_status, machine.get("status", "inactive"))
+        ):
+            members = group.get(value, {})
+            members.pop(machine_id, None)
+            if not members:
+                group.pop(value, None)
+        for maint in machine.get("next_maintenance", []):
+            self.maintenance.pop((machine_id, maint["type_id"]), None)
+            members = self.by_type.get(maint["type_id"], {})
+            members.pop(machine_id, None)
+            if not members:
+                self.by_type.pop(maint["type_id"], None)
+
+    def replace(self, machine):
+        """تحديث الفهارس لماكينة عُدلت أو أضيفت"""
+        self._discard(machine["id"])
+        self._add(machine)
+
+    def ids_named(self, names):
+        """معرفات الماكينات بأسماء محددة"""
+        return {machine_id for name in names for machine_id in self.by_name.get(name, {})}
+
+    def type_ids_named(self, names):
+        """معرفات أنواع الصيانة بأسماء محددة"""
+        names = set(names)
+        return {type_id for type_id, maint_type in self.types.items() if maint_type["name"] in names}
+
+    def type_names(self):
+        """أسماء أنواع الصيانة بدون تكرار وبترتيب ثابت"""
+        return list(dict.fromkeys(maint_type["name"] for maint_type in self.types.values()))
+
+def machine_index():
+    """فهارس الماكينات للبيانات الحالية (تُبنى مرة لكل إصدار ثم تُحدث مع كل حفظ)"""
+    store = _machines_store()
+    data = load_machines_data()
+
+    with store["lock"].read():
+        index = store["machine_index"]
+        if index is not None and index.version == store["version"]:
+            return index
+
+    with store["lock"].write():
+        index = store["machine_index"]
+        if index is None or index.version != store["version"]:
+            index = MachineIndex()
+            index.rebuild(data, store["version"])
+            store["machine_index"] = index
+        return index
+
+def load_machines_data(for_update=False):
+    """تحميل بيانات الماكينات عبر الكاش المشترك
+
+    القيمة المرجعة بدون for_update مشتركة بين كل الجلسات وللقراءة فقط،
+    ومن يريد التعديل ثم الحفظ يطلب نسخة مستقلة بـ for_update=True.
+    """
+    store = _machines_store()
+
+    # المسار المعتاد: البيانات في الكاش صالحة وتُقرأ مع الجلسات الأخرى في نفس الوقت
+    with store["lock"].read():
+        data = store["data"]
+        if data is not None and store["signature"] == store["backend"].signature():
+            return copy.deepcopy(data) if for_update else data
+
+    with store["lock"].write():
+        signature = store["backend"].signature()
+        
+        if store["data"] is None or store["signature"] != signature:
+            try:
+                loaded = store["backend"].load()
+            except Exception as e:
+                # خارج تشغيل السكربت (المجدول الخلفي) لا توجد صفحة للعرض: يُرفع الخطأ لمن استدعى
+                if not _is_error(e, StorageError) or get_script_run_ctx(suppress_warning=True) is None:
+                    raise
+                # لا نعرض أسطولاً فارغاً حتى لا يُحفظ فوق البيانات الأصلية
+                st.error(f"❌ {e}. أصلح الملف أو استرجع نسخة احتياطية ثم أعد التحميل")
+                st.stop()
+            store["data"] = loaded
+            fill_calendar_due_dates(store["data"]["machines"])
+            compact_schedules(store["data"]["machines"])
+            store["signature"] = signature
+            store["version"] += 1
+        
+        data = store["data"]
+        return copy.deepcopy(data) if for_update else data
+
+def machines_data_version():
+    """رقم إصدار بيانات الماكينات في الكاش المشترك (يزيد مع كل حفظ أو تغيير خارجي)"""
+    store = _machines_store()
+    load_machines_data()
+    with store["lock"].read():
+        return store["version"]
+
+def get_machine(machine_id, for_update=False):
+    """جلب ماكينة واحدة (نسخة مستقلة عند for_update)"""
+    machine = machine_index().by_id.get(machine_id)
+    if machine is not None and for_update:
+        machine = _copy_machine(machine)
+    return machine
+
+def edit_base(machine_id, type_id=None):
+    """الماكينة كما عُرضت عند بدء تعديلها في هذه الجلسة (أساس الدمج عند الحفظ)
+
+    تُؤخذ نسخة جديدة إذا لم توجد أو لم تكن فيها الصيانة type_id.
+    """
+    key = f"edit_base_{machine_id}"
+    base = st.session_state.get(key)
+    if base is None or (type_id is not None and all(m["type_id"] != type_id for m in base.get("next_maintenance", []))):
+        base = st.session_state[key] = get_machine(machine_id, for_update=True)
+    return base
+
+def save_catalog(maintenance_types, settings):
+    """حفظ أنواع الصيانة والإعدادات دون إعادة كتابة الماكينات (لا تمحو تعديلات الجلسات الأخرى)"""
+    try:
+        _machines_store()["backend"].save_catalog(maintenance_types, settings)
+        invalidate_machines_cache()
+        return True
+    except Exception as e:
+        invalidate_machines_cache()
+        st.error(f"❌ خطأ في حفظ بيانات الماكينات: {e}")
+        return False
 
 def save_machines_data(data):
-    """حفظ بيانات الماكينات في JSON"""
+    """حفظ بيانات الماكينات كاملة (استعادة نسخة أو حذف الكل: تستبدل كل ما حفظته الجلسات الأخرى)"""
     try:
-        with open(MACHINES_FILE, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
+        _machines_store()["backend"].save(data)
+        invalidate_machines_cache()
         return True
     except Exception as e:
+        invalidate_machines_cache()
         st.error(f"❌ خطأ في حفظ بيانات الماكينات: {e}")
         return False
 
+def _copy_record(record):
+    """نسخة مستقلة من سجل مسطح (القيم المركبة فقط تُنسخ بعمق)"""
+    return {key: copy.deepcopy(value) if isinstance(value, (dict, list)) else value for key, value in record.items()}
+
+def _copy_machine(machine):
+    """نسخة مستقلة من ماكينة مع جدول صيانتها (أسرع كثيراً من deepcopy للبنية المعروفة)"""
+    copied = _copy_record({key: value for key, value in machine.items() if key != "next_maintenance"})
+    if "next_maintenance" in machine:
+        copied["next_maintenance"] = [_copy_record(maint) for maint in machine["next_maintenance"]]
+    return copied
+
+def save_machine(machine):
+    """حفظ ماكينة واحدة مع جدول صيانتها في معاملة واحدة وتحديث الكاش المشترك بدون إعادة تحميل"""
+    return save_machines([machine])
+
+def save_machines(machines, bases=None):
+    """حفظ مجموعة ماكينات في معاملة واحدة وتحديث الكاش والفهرس لها فقط
+
+    كل ماكينة تحمل رقم المراجعة الذي قُرئت به (revision). إذا حفظت جلسة أخرى
+    نفس الماكينة بعدها تُدمج التعديلات على مستوى الحقول مع أساسها (bases، أو
+    النسخة في الكاش بنفس المراجعة)، ويُرفض الحفظ كله إذا تعارض نفس الحقل.
+    """
+    if not machines:
+        return True
+
+    store = _machines_store()
+
+    with store["lock"].write():
+        lookup = store["machine_index"]
+        if store["data"] is not None and (lookup is None or lookup.version != store["version"]):
+            lookup = MachineIndex()
+            lookup.rebuild(store["data"], store["version"])
+        
+        if bases is None:
+            # أساس الدمج: نسخة الكاش التي بدأ منها المستدعي (نفس رقم المراجعة)
+            cached_by_id = lookup.by_id if store["data"] is not None else {}
+            bases = {
+                machine["id"]: cached_by_id[machine["id"]]
+                for machine in machines
+                if machine["id"] in cached_by_id and cached_by_id[machine["id"]].get("revision", 0) == machine.get("revision", 0)
+            }
+        
+        try:
+            cache_valid = store["data"] is not None and store["signature"] == store["backend"].signature()
+            saved = store["backend"].save_machines(machines, bases)
+        except Exception as e:
+            store["data"] = None
+            if _is_error(e, ConflictError):
+                st.error(f"⚠️ لم يتم الحفظ: {e}. تم تحميل أحدث البيانات، أعد المحاولة")
+            else:
+                st.error(f"❌ خطأ في حفظ بيانات الماكينات: {e}")
+            return False
+        
+        if not cache_valid:
+            store["data"] = None
+            return True
+        
+        stored_machines = compact_schedules([_copy_machine(machine) for machine in saved])
+        cached = store["data"]["machines"]
+        # العدادات الجارية للإجماليات: تُعدل بطرح النسخة القديمة وإضافة الجديدة
+        totals = store["totals"]
+        if totals is not None and totals["version"] != store["version"]:
+            totals = store["totals"] = None
+        
+        for stored in stored_machines:
+            position = lookup.position.get(stored["id"])
+            if totals is not None:
+                if position is not None:
+                    _count_machine(totals, cached[position], -1)
+                _count_machine(totals, stored, 1)
+            if position is not None:
+                cached[position] = stored
+            else:
+                lookup.position[stored["id"]] = len(cached)
+                cached.append(stored)
+            lookup.replace(stored)
+        
+        store["signature"] = store["backend"].signature()
+        store["version"] += 1
+        lookup.version = store["version"]
+        store["machine_index"] = lookup
+        if totals is not None:
+            totals["version"] = store["version"]
+        
+        # تحديث فهرس الاستحقاق لهذه الماكينات فقط (حساب واحد لكل صياناتها)
+        index = store["due_index"]
+        if index is not None and index.version == store["version"] - 1 and index.as_of == date.today():
+            removed = index.update_machines(stored_machines)
+            index.version = store["version"]
+            _publish_saved_machines(store, store["data"], index, removed, stored_machines)
+
+    return True
+
 def initialize_excel_file():
     """تهيئة ملف Excel إذا كان فارغاً"""
     if not os.path.exists(APP_CONFIG["LOCAL_FILE"]) or os.path.getsize(APP_CONFIG["LOCAL_FILE"]) == 0:
@@ -310,10 +2155,7 @@ def initialize_excel_file():
             "status", "technician", "notes"
         ])
         
-        df_history = pd.DataFrame(columns=[
-            "history_id", "machine_id", "maintenance_type", "date", 
-            "hours", "technician", "description", "cost", "parts_used"
-        ])
+        df_history = pd.DataFrame(columns=HISTORY_COLUMNS)
         
         with pd.ExcelWriter(APP_CONFIG["LOCAL_FILE"], engine='openpyxl') as writer:
             df_machines.to_excel(writer, sheet_name='Machines', index=False)
@@ -325,159 +2167,1457 @@ def initialize_excel_file():
 # ===============================
 # 📊 دوال حساب المؤقتات
 # ===============================
+DAY_NS = 86_400 * 10**9
+_FIRST_SAFE_DAY = np.datetime64("1677-09-22")
+_LAST_SAFE_DAY = np.datetime64("2262-04-10")
+
+def add_intervals(epochs, intervals, unit_kinds):
+    """إضافة فترات الصيانة إلى مصفوفة تواريخ epoch (نانوثانية) دفعة واحدة
+
+    الأيام والأسابيع بالمدة الفعلية، والشهور والسنوات بالتقويم: نفس اليوم من
+    الشهر الهدف أو آخر يوم فيه (31/01 + شهر = 28 أو 29/02، و29/02 + سنة = 28/02).
+    فترات الشهور والسنوات الكسرية تُقرب لأقرب عدد صحيح. النتيجة NO_DATE للتاريخ
+    الفارغ أو الوحدة غير الزمنية أو الفترة غير الصالحة.
+    """
+    epochs = np.asarray(epochs, dtype=np.int64)
+    intervals = np.asarray(intervals, dtype=float)
+    unit_kinds = np.asarray(unit_kinds, dtype=np.int8)
+    result = np.full(len(epochs), NO_DATE, dtype=np.int64)
+    valid = (epochs != NO_DATE) & np.isfinite(intervals)
+
+    # أيام وأسابيع: إزاحة ثابتة بالنانوثانية
+    fixed = valid & ((unit_kinds == MaintenanceUnit.DAYS) | (unit_kinds == MaintenanceUnit.WEEKS))
+    offset = intervals * np.where(unit_kinds == MaintenanceUnit.WEEKS, 7 * DAY_NS, DAY_NS)
+    fixed &= np.abs(epochs.astype(float) + np.where(fixed, offset, 0)) < 2**63 - 2**16
+    result[fixed] = epochs[fixed] + np.rint(offset[fixed]).astype(np.int64)
+
+    # شهور وسنوات: الشهر الهدف ثم نفس اليوم محدوداً بطول ذلك الشهر
+    months = np.rint(intervals) * np.where(unit_kinds == MaintenanceUnit.YEARS, 12, 1)
+    calendar = valid & ((unit_kinds == MaintenanceUnit.MONTHS) | (unit_kinds == MaintenanceUnit.YEARS)) & (np.abs(months) < 12 * 600)
+    stamps = epochs[calendar].view("datetime64[ns]")
+    days = stamps.astype("datetime64[D]")
+    month_start = stamps.astype("datetime64[M]")
+    target = month_start + months[calendar].astype(np.int64)
+    target_day = target.astype("datetime64[D]")
+    month_length = (target + 1).astype("datetime64[D]") - target_day
+    day_offset = np.minimum(days - month_start.astype("datetime64[D]"), month_length - np.timedelta64(1, "D"))
+    shifted_day = target_day + day_offset
+    in_range = (shifted_day >= _FIRST_SAFE_DAY) & (shifted_day <= _LAST_SAFE_DAY)
+    shifted = (shifted_day.astype("datetime64[ns]") + (stamps - days)).view(np.int64)
+    result[calendar] = np.where(in_range, shifted, NO_DATE)
+
+    return result
+
 def calculate_next_date(last_date_str, interval, unit):
     """حساب التاريخ التالي للصيانة"""
-    if not last_date_str or pd.isna(last_date_str):
-        return None
-    
     try:
-        last_date = pd.to_datetime(last_date_str, dayfirst=True)
-        
-        if unit == "أيام":
-            next_date = last_date + timedelta(days=interval)
-        elif unit == "أسابيع":
-            next_date = last_date + timedelta(weeks=interval)
-        elif unit == "شهور":
-            next_date = last_date + timedelta(days=interval*30)  # تقريبي
-        elif unit == "سنوات":
-            next_date = last_date + timedelta(days=interval*365)  # تقريبي
-        else:
-            return None
-        
-        return next_date.strftime("%d/%m/%Y")
-    except:
+        interval = float(interval)
+    except (TypeError, ValueError):
         return None
 
+    next_date = add_intervals([_cached_date(last_date_str)], [interval], [MaintenanceUnit.from_label(unit)])[0]
+    return None if next_date == NO_DATE else _format_epoch_date(next_date)
+
+def fill_calendar_due_dates(machines):
+    """حساب الاستحقاق الزمني المفقود (next_date) لكل صيانات الأسطول دفعة واحدة
+
+    يشمل الصيانات المحفوظة بوحدة لم تكن مدعومة (مثل "أشهر")، ويُحسب من آخر
+    صيانة أو من تاريخ تركيب الماكينة كما عند إضافتها. تعيد عدد الصيانات المعدلة.
+    """
+    pending = []
+    for machine in machines:
+        for maint in machine.get("next_maintenance", []):
+            if not maint.get("next_date") and MaintenanceUnit.from_label(maint.get("unit")).is_calendar:
+                pending.append((maint, maint.get("last_date") or machine.get("installation_date")))
+
+    if not pending:
+        return 0
+
+    intervals = pd.to_numeric(pd.Series([maint.get("interval") for maint, _ in pending], dtype=object), errors="coerce")
+    due = add_intervals(
+        parse_dates([base for _, base in pending]),
+        intervals.to_numpy(dtype=float),
+        [MaintenanceUnit.from_label(maint["unit"]) for maint, _ in pending]
+    )
+
+    filled = 0
+    for (maint, _), epoch in zip(pending, due.tolist()):
+        if epoch != NO_DATE:
+            maint["next_date"] = _format_epoch_date(epoch)
+            filled += 1
+    return filled
+
 def calculate_next_hours(last_hours, interval):
     """حساب عدد الساعات التالي للصيانة"""
     if pd.isna(last_hours) or last_hours == "":
         return None
-    
+
     try:
         return float(last_hours) + float(interval)
     except:
         return None
 
-def calculate_remaining_time(next_date_str, next_hours, current_hours=None):
-    """حساب الوقت المتبقي للصيانة"""
-    remaining = {
-        "days": None,
-        "hours": None,
-        "status": "normal",
-        "percentage": 100
-    }
-    
-    # حساب الوقت المتبقي حسب التاريخ
-    if next_date_str and pd.notna(next_date_str):
-        try:
-            next_date = pd.to_datetime(next_date_str, dayfirst=True)
-            today = datetime.now()
+DATE_FORMAT = "%d/%m/%Y"
+NO_DATE = np.iinfo(np.int64).min
+
+@st.cache_resource
+def _date_cache():
+    """نتائج تحليل نصوص التواريخ مشتركة بين الجلسات وإعادة التشغيل (LRU محدود العدد)"""
+    return {"lock": threading.Lock(), "parsed": OrderedDict(), "hits": 0, "misses": 0}
+
+def _parse_date_text(value):
+    """تحويل نص تاريخ إلى epoch بالنانوثانية: مسار سريع للصيغة القياسية ثم تحليل pandas المرن
+
+    السنوات خارج مدى النانوثانية (حوالي 1678–2262) تُرفض كتاريخ غير صالح.
+    """
+    try:
+        parsed = datetime.strptime(value, DATE_FORMAT)
+    except (TypeError, ValueError):
+        parsed = None
+    if parsed is not None:
+        # np.datetime64 لا يرفع خطأ خارج المدى بل يلتف إلى تاريخ آخر (01/02/2300 ← 1715)
+        if not _FIRST_SAFE_DAY <= np.datetime64(parsed.date()) <= _LAST_SAFE_DAY:
+            return NO_DATE
+        return int(np.datetime64(parsed, "ns").astype(np.int64))
+    try:
+        # as_unit يرفع خطأ خارج المدى بدلاً من الالتفاف، وNaT يتحول إلى NO_DATE مباشرة لأنهما نفس القيمة
+        return int(np.datetime64(pd.to_datetime(value, dayfirst=True).as_unit("ns"), "ns").astype(np.int64))
+    except:
+        return NO_DATE
+
+def _cached_date(value):
+    """epoch لقيمة تاريخ واحدة من الكاش المشترك (NO_DATE للفارغ أو غير الصالح)"""
+    if not value or not pd.notna(value):
+        return NO_DATE
+
+    cache = _date_cache()
+    with cache["lock"]:
+        epoch = cache["parsed"].get(value)
+        if epoch is not None:
+            cache["parsed"].move_to_end(value)
+            cache["hits"] += 1
+            return epoch
+
+    epoch = _parse_date_text(value)
+    with cache["lock"]:
+        cache["misses"] += 1
+        cache["parsed"][value] = epoch
+        while len(cache["parsed"]) > APP_CONFIG["DATE_CACHE_MAX_ENTRIES"]:
+            cache["parsed"].popitem(last=False)
+    return epoch
+
+def parse_dates(values):
+    """تحويل عمود كامل من التواريخ إلى مصفوفة epoch بالنانوثانية (NO_DATE للفارغ أو غير الصالح)
+
+    كل قيمة مختلفة تُطلب من الكاش المشترك مرة واحدة فقط في الدفعة.
+    """
+    seen = {}
+    epochs = []
+    for value in values:
+        epoch = seen.get(value)
+        if epoch is None:
+            epoch = seen[value] = _cached_date(value)
+        epochs.append(epoch)
+    return np.array(epochs, dtype=np.int64)
+
+def parse_date(value):
+    """تحويل قيمة تاريخ واحدة إلى Timestamp أو None"""
+    epoch = _cached_date(value)
+    return None if epoch == NO_DATE else pd.Timestamp(epoch)
+
+def _truthy_numbers(values):
+    """تحويل القيم إلى أرقام مع قناع يطابق شرط (القيمة and pd.notna(القيمة)) وقابليتها للتحويل"""
+    objects = np.empty(len(values), dtype=object)
+    objects[:] = list(values)
+    numbers = pd.to_numeric(pd.Series(objects, dtype=object), errors="coerce").to_numpy(dtype=float)
+    valid = objects.astype(bool) & ~np.isnan(numbers)
+    return numbers, valid
+
+class MaintenanceUnit(enum.IntEnum):
+    """وحدة فترة الصيانة كرقم صغير بدلاً من النص العربي"""
+    HOURS = 0
+    DAYS = 1
+    WEEKS = 2
+    MONTHS = 3
+    YEARS = 4
+    OTHER = 9
+
+    @classmethod
+    def from_label(cls, label):
+        return UNIT_LABELS.get(label, cls.OTHER)
+
+    @property
+    def is_calendar(self):
+        return self in (MaintenanceUnit.DAYS, MaintenanceUnit.WEEKS, MaintenanceUnit.MONTHS, MaintenanceUnit.YEARS)
+
+UNIT_LABELS = {
+    "ساعات": MaintenanceUnit.HOURS,
+    "ساعة": MaintenanceUnit.HOURS,
+    "أيام": MaintenanceUnit.DAYS,
+    "يوم": MaintenanceUnit.DAYS,
+    "أسابيع": MaintenanceUnit.WEEKS,
+    "شهور": MaintenanceUnit.MONTHS,
+    "أشهر": MaintenanceUnit.MONTHS,
+    "سنوات": MaintenanceUnit.YEARS
+}
+
+UNIT_TEXTS = tuple(UNIT_LABELS)
+_UNIT_CODES = {label: code for code, label in enumerate(UNIT_TEXTS)}
+_KEY_ORDERS = {}
+
+@functools.lru_cache(maxsize=65536)
+def _epoch_text(epoch):
+    return _format_epoch_date(epoch)
+
+class MaintenanceEntry(Mapping):
+    """صيانة واحدة في الكاش المشترك بتمثيل مضغوط (slots) بدلاً من قاموس
+
+    التواريخ بالصيغة القياسية تُحفظ epoch بالنانوثانية، والوحدة المعروفة رقم صغير في
+    UNIT_TEXTS، والنصوص وترتيب المفاتيح مشتركة بين الصيانات. القيم التي لا تعود لنصها
+    الأصلي حرفياً تبقى كما هي (والقيم الخام الملتبسة في extra)، فتُقرأ الصيانة
+    (maint["next_date"]) وتُحفظ بصيغة JSON الحالية دون تغيير. للقراءة فقط: copy.deepcopy
+    و _copy_machine تعيد قواميس عادية قابلة للتعديل.
+    """
+
+    FIELDS = ("type_id", "type_name", "interval", "unit", "last_date", "last_hours", "next_date", "next_hours")
+    DATE_FIELDS = ("last_date", "next_date")
+    __slots__ = FIELDS + ("_keys", "_extra")
+
+    @classmethod
+    def from_dict(cls, maint, dates=None):
+        """نسخة مضغوطة من صيانة بصيغة JSON؛ dates: {نص التاريخ: القيمة المخزنة} مشترك في الدفعة"""
+        dates = {} if dates is None else dates
+        self = cls.__new__(cls)
+        keys = tuple(maint)
+        self._keys = _KEY_ORDERS.setdefault(keys, keys)
+        extra = {key: maint[key] for key in keys if key not in _ENTRY_FIELDS}
+        get = maint.get
+        type_id, type_name = get("type_id"), get("type_name")
+        self.type_id = sys.intern(type_id) if type(type_id) is str else type_id
+        self.type_name = sys.intern(type_name) if type(type_name) is str else type_name
+        self.interval, self.last_hours, self.next_hours = get("interval"), get("last_hours"), get("next_hours")
+        
+        # الأعداد الصحيحة في الوحدة والتواريخ تعني قيمة مضغوطة، فالقيمة الخام منها تبقى في extra
+        unit = get("unit")
+        if type(unit) is int:
+            extra["unit"], unit = unit, None
+        self.unit = _UNIT_CODES.get(unit, unit) if type(unit) is str else unit
+        for field in cls.DATE_FIELDS:
+            value = get(field)
+            if type(value) is int:
+                extra[field], value = value, None
+            elif type(value) is str and value:
+                stored = dates.get(value)
+                if stored is None:
+                    epoch = _cached_date(value)
+                    stored = dates[value] = epoch if epoch != NO_DATE and _epoch_text(epoch) == value else value
+                value = stored
+            setattr(self, field, value)
+        self._extra = extra or None
+        return self
+
+    def get(self, key, default=None):
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        if key not in _ENTRY_FIELDS or key not in self._keys:
+            return default
+        value = getattr(self, key)
+        if type(value) is int:
+            if key == "unit":
+                return UNIT_TEXTS[value]
+            if key in self.DATE_FIELDS:
+                return _epoch_text(value)
+        return value
+
+    def __getitem__(self, key):
+        if key not in self._keys:
+            raise KeyError(key)
+        return self.get(key)
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __repr__(self):
+        return f"MaintenanceEntry({dict(self)!r})"
+
+    def __deepcopy__(self, memo):
+        return _copy_record(self)
+
+_ENTRY_FIELDS = frozenset(MaintenanceEntry.FIELDS)
+
+def compact_schedules(machines):
+    """استبدال جداول صيانة الماكينات (في مكانها) بصيانات MaintenanceEntry للكاش المشترك"""
+    dates = {}
+    for machine in machines:
+        schedule = machine.get("next_maintenance")
+        if isinstance(schedule, list):
+            machine["next_maintenance"] = [
+                MaintenanceEntry.from_dict(maint, dates) if isinstance(maint, dict) else maint
+                for maint in schedule
+            ]
+    return machines
+
+# القراءة المباشرة من slots تطابق الصيانات بالسلوك لا بالصنف: الكاش يبقى عبر إعادة
+# التشغيل التي تعيد تعريف MaintenanceEntry، والصيانة بقيم خام (extra) تُقرأ بـ get
+def _is_plain_entry(maint):
+    return getattr(maint, "_extra", True) is None
+
+def schedule_values(entries, field):
+    """قيم حقل غير تاريخي في مجموعة صيانات كما في JSON (None للمفقود)"""
+    if field == "unit":
+        return [
+            (UNIT_TEXTS[maint.unit] if type(maint.unit) is int else maint.unit) if _is_plain_entry(maint) else maint.get(field)
+            for maint in entries
+        ]
+    return [getattr(maint, field) if _is_plain_entry(maint) else maint.get(field) for maint in entries]
+
+def schedule_dates(entries, field):
+    """عمود epoch لحقل تاريخ في مجموعة صيانات: المحفوظ عدداً في MaintenanceEntry يُؤخذ بدون تحليل"""
+    epochs = np.empty(len(entries), dtype=np.int64)
+    pending = []
+    for row, maint in enumerate(entries):
+        value = getattr(maint, field) if _is_plain_entry(maint) else None
+        if type(value) is int:
+            epochs[row] = value
+        else:
+            pending.append(row)
+    if pending:
+        epochs[pending] = parse_dates([entries[row].get(field) for row in pending])
+    return epochs
+
+class ScheduleColumns:
+    """أعمدة جداول صيانة الأسطول (struct-of-arrays) للحساب المتجه
+
+    تُبنى من صيانات الكاش المشترك (MaintenanceEntry تُقرأ قيمها المضغوطة مباشرة) أو من قواميس
+    JSON: التواريخ أعداد صحيحة (نانوثانية منذ epoch، NO_DATE للفارغ)، والساعات float64،
+    والوحدات وأنواع الصيانة أكواد.
+    """
+
+    __slots__ = (
+        "machine_ids", "total_hours", "total_hours_valid", "machine_row", "slot",
+        "type_code", "type_ids", "unit_kind", "next_date", "next_hours", "next_hours_valid"
+    )
+
+    @classmethod
+    def from_machines(cls, machines):
+        """بناء الأعمدة من قائمة الماكينات (صيغة JSON)"""
+        self = cls.__new__(cls)
+        
+        # جمع القيم الخام لكل عمود في مرور واحد ثم تحويل كل عمود دفعة واحدة
+        total_hours, machine_row, slot, entries = [], [], [], []
+        for machine_pos, machine in enumerate(machines):
+            total_hours.append(machine.get("total_hours", 0))
+            schedule = machine.get("next_maintenance", [])
+            machine_row.extend([machine_pos] * len(schedule))
+            slot.extend(range(len(schedule)))
+            entries.extend(schedule)
+        
+        self.machine_ids = [machine["id"] for machine in machines]
+        self.total_hours, self.total_hours_valid = _truthy_numbers(total_hours)
+        self.machine_row = np.array(machine_row, dtype=np.int32)
+        self.slot = np.array(slot, dtype=np.int16)
+        
+        type_table = {}
+        self.type_code = np.array([type_table.setdefault(type_id, len(type_table)) for type_id in schedule_values(entries, "type_id")], dtype=np.int16)
+        self.type_ids = list(type_table)
+        unit_table = {}
+        unit_code = np.array([unit_table.setdefault(unit, len(unit_table)) for unit in schedule_values(entries, "unit")], dtype=np.int8)
+        self.unit_kind = np.array([MaintenanceUnit.from_label(label) for label in unit_table] or [0], dtype=np.int8)[unit_code]
+        
+        # الصلاحية بنفس قواعد الحساب الأصلية (الصفر أو النص غير الرقمي = غير موجودة)
+        self.next_hours, self.next_hours_valid = _truthy_numbers(schedule_values(entries, "next_hours"))
+        self.next_date = schedule_dates(entries, "next_date")
+        return self
+
+    def __len__(self):
+        return len(self.machine_row)
+
+    def remaining(self, now=None):
+        """الوقت المتبقي لكل الصفوف مباشرة من الأعمدة (بدون تحليل نصوص)"""
+        current = self.total_hours[self.machine_row]
+        current_valid = self.total_hours_valid[self.machine_row]
+        return _remaining_frame(self.next_date, self.next_hours, self.next_hours_valid, current, current_valid, now)
+
+def _format_epoch_date(value):
+    """تنسيق تاريخ epoch (نانوثانية) بصيغة يوم/شهر/سنة"""
+    return pd.Timestamp(value).strftime("%d/%m/%Y")
+
+def calculate_remaining_batch(next_dates, next_hours, current_hours, now=None):
+    """حساب الوقت المتبقي لمجموعة صيانات دفعة واحدة
+
+    نفس قواعد الحساب للصيانة الواحدة لكن على مصفوفات كاملة، وتعيد DataFrame
+    بالأعمدة days و hours و status و percentage.
+    """
+    next_numbers, next_valid = _truthy_numbers(next_hours)
+    current_numbers, current_valid = _truthy_numbers(current_hours)
+    due = parse_dates(next_dates)
+    return _remaining_frame(due, next_numbers, next_valid, current_numbers, current_valid, now)
+
+def _remaining_frame(due, next_numbers, next_valid, current_numbers, current_valid, now=None):
+    """محرك الحساب المتجه: due بالنانوثانية (NO_DATE للفارغ) والساعات كأرقام مع أقنعة الصلاحية"""
+    now = datetime.now() if now is None else now
+    count = len(due)
+    critical_days = APP_CONFIG["CRITICAL_DAYS_BEFORE"]
+    warning_days = APP_CONFIG["WARNING_DAYS_BEFORE"]
+
+    status = np.full(count, "normal", dtype=object)
+    percentage = np.full(count, 100.0)
+
+    # حساب الوقت المتبقي حسب التاريخ (أيام كاملة مقربة للأسفل مثل timedelta.days)
+    has_date = due != NO_DATE
+    now_ns = np.datetime64(now, "ns").astype("int64")
+    delta_ns = np.where(has_date, due, now_ns) - now_ns
+    days = np.floor_divide(delta_ns, 86_400_000_000_000)
+
+    overdue = has_date & (days < 0)
+    critical = has_date & ~overdue & (days <= critical_days)
+    warning = has_date & ~overdue & ~critical & (days <= warning_days)
+    normal = has_date & (days > warning_days)
+
+    status[overdue] = "overdue"
+    percentage[overdue] = 0
+    status[critical] = "critical"
+    percentage[critical] = np.maximum(0, 100 * days[critical] / critical_days)
+    status[warning] = "warning"
+    percentage[warning] = np.maximum(0, 100 * days[warning] / warning_days)
+    percentage[normal] = np.maximum(0, 100 * (1 - (days[normal] / 365)))
+
+    days = np.abs(days)
+
+    # حساب الوقت المتبقي حسب الساعات
+    has_hours = next_valid & current_valid
+    hours = next_numbers - current_numbers
+
+    over_hours = has_hours & (hours < 0)
+    status[over_hours] = "overdue"
+
+    # إذا لم يكن هناك تاريخ (أو المتبقي 0 يوم)، نستخدم الساعات لتحديد الحالة
+    by_hours = has_hours & (hours >= 0) & (~has_date | (days == 0))
+    h_critical = by_hours & (hours <= 50)
+    h_warning = by_hours & ~h_critical & (hours <= 100)
+    h_normal = by_hours & (hours > 100)
+
+    status[h_critical] = "critical"
+    percentage[h_critical] = np.maximum(0, 100 * hours[h_critical] / 50)
+    status[h_warning] = "warning"
+    percentage[h_warning] = np.maximum(0, 100 * hours[h_warning] / 100)
+    status[h_normal] = "normal"
+    percentage[h_normal] = np.maximum(0, 100 * (1 - (hours[h_normal] / 1000)))
+
+    hours = np.abs(hours)
+
+    return pd.DataFrame({
+        "days": pd.Series([int(d) if ok else None for d, ok in zip(days, has_date)], dtype=object),
+        "hours": pd.Series([float(h) if ok else None for h, ok in zip(hours, has_hours)], dtype=object),
+        "status": status,
+        "percentage": percentage
+    })
+
+def calculate_remaining_time(next_date_str, next_hours, current_hours=None):
+    """حساب الوقت المتبقي للصيانة"""
+    return calculate_remaining_batch([next_date_str], [next_hours], [current_hours]).iloc[0].to_dict()
+
+STATUS_ORDER = {"overdue": 0, "critical": 1, "warning": 2, "normal": 3}
+
+class DueIndex:
+    """فهرس مرتب لصيانات الأسطول حسب الاستحقاق مع عدادات جاهزة لكل حالة
+
+    الترتيب: الحالة (الأكثر حراجة أولاً) ثم الأيام ثم الساعات المتبقية،
+    والتحديث يتم لكل ماكينة على حدة بدلاً من إعادة فحص الأسطول.
+    القيم محسوبة ليوم as_of، والانتقال ليوم جديد (advance) يعيد حساب الصيانات
+    التي عبرت حداً فقط: due_in هو الأيام المتبقية بإشارتها، و transitions كومة
+    (يوم العبور التالي، المفتاح) لكل صيانة بتاريخ.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.refs = {}
+        self.machine_keys = {}
+        self.by_status = {status: {} for status in STATUS_ORDER}
+        self.due_in = {}
+        self.transitions = []
+        self._transition_at = {}
+        self._order = []
+        self._sort_keys = {}
+        self.as_of = None
+        self.version = None
+
+    @staticmethod
+    def _sort_key(key, remaining):
+        status = remaining.get("status", "normal")
+        days = remaining.get("days")
+        hours = remaining.get("hours")
+        # المتأخر أكثر يأتي أولاً داخل حالة التأخير
+        if status == "overdue":
+            days = None if days is None else -days
+            hours = None if hours is None else -hours
+        return (
+            STATUS_ORDER.get(status, len(STATUS_ORDER)),
+            float("inf") if days is None else days,
+            float("inf") if hours is None else hours,
+            key
+        )
+
+    def _insert(self, key, remaining, machine, maint, due_in=None, keep_order=True):
+        self.entries[key] = remaining
+        self.refs[key] = (machine, maint)
+        self.by_status.setdefault(remaining.get("status", "normal"), {})[key] = None
+        sort_key = self._sort_key(key, remaining)
+        self._sort_keys[key] = sort_key
+        if keep_order:
+            bisect.insort(self._order, sort_key)
+        if due_in is not None:
+            self.due_in[key] = due_in
+            self._schedule_transition(key, due_in)
+
+    def _remove(self, key, keep_order=True):
+        remaining = self.entries.pop(key)
+        self.refs.pop(key, None)
+        self.by_status.get(remaining.get("status", "normal"), {}).pop(key, None)
+        sort_key = self._sort_keys.pop(key)
+        if keep_order:
+            del self._order[bisect.bisect_left(self._order, sort_key)]
+        # مدخل الكومة يبقى ويُتجاهل عند سحبه
+        self.due_in.pop(key, None)
+        self._transition_at.pop(key, None)
+
+    def _transition_day(self, due_in):
+        """اليوم (ordinal) الذي تعبر فيه الصيانة حد الحالة التالي: التحذير، الحرج، يوم الاستحقاق ثم التأخير"""
+        thresholds = (APP_CONFIG["WARNING_DAYS_BEFORE"], APP_CONFIG["CRITICAL_DAYS_BEFORE"], 0, -1)
+        crossed = [threshold for threshold in thresholds if threshold < due_in]
+        return self.as_of.toordinal() + due_in - max(crossed) if crossed else None
+
+    def _schedule_transition(self, key, due_in):
+        day = self._transition_day(due_in)
+        if day is not None:
+            self._transition_at[key] = day
+            heapq.heappush(self.transitions, (day, key))
+
+    @staticmethod
+    def _date_percentage(due_in):
+        """نسبة شريط التقدم حسب التاريخ (نفس قواعد _remaining_frame)"""
+        critical_days = APP_CONFIG["CRITICAL_DAYS_BEFORE"]
+        warning_days = APP_CONFIG["WARNING_DAYS_BEFORE"]
+        if due_in < 0:
+            return 0
+        if due_in <= critical_days:
+            return max(0, 100 * due_in / critical_days)
+        if due_in <= warning_days:
+            return max(0, 100 * due_in / warning_days)
+        return max(0, 100 * (1 - (due_in / 365)))
+
+    @staticmethod
+    def _compute(machines, now=None):
+        """حساب متجه لصيانات الماكينات: ((الماكينة، الصيانة)، المتبقي، الأيام بإشارتها أو None)"""
+        now = datetime.now() if now is None else now
+        columns = ScheduleColumns.from_machines(machines)
+        frame = columns.remaining(now)
+        pairs = [
+            (machines[machine_pos], machines[machine_pos]["next_maintenance"][slot])
+            for machine_pos, slot in zip(columns.machine_row.tolist(), columns.slot.tolist())
+        ]
+        has_date = columns.next_date != NO_DATE
+        now_ns = np.datetime64(now, "ns").astype("int64")
+        due_in = np.floor_divide(np.where(has_date, columns.next_date, now_ns) - now_ns, DAY_NS)
+        due_in = [int(days) if ok else None for days, ok in zip(due_in.tolist(), has_date.tolist())]
+        return zip(pairs, frame.to_dict("records"), due_in)
+
+    def rebuild(self, machines_data, version, as_of):
+        """بناء الفهرس كاملاً دفعة واحدة"""
+        self.__init__()
+        self.as_of = as_of
+        for (machine, maint), remaining, due_in in self._compute(machines_data["machines"]):
+            key = (machine["id"], maint["type_id"])
+            self.entries[key] = remaining
+            self.refs[key] = (machine, maint)
+            self.machine_keys.setdefault(machine["id"], []).append(key)
+            self.by_status.setdefault(remaining.get("status", "normal"), {})[key] = None
+            self._sort_keys[key] = self._sort_key(key, remaining)
+            if due_in is not None:
+                self.due_in[key] = due_in
+                day = self._transition_day(due_in)
+                if day is not None:
+                    self._transition_at[key] = day
+                    self.transitions.append((day, key))
+        heapq.heapify(self.transitions)
+        self._order = sorted(self._sort_keys.values())
+        self.version = version
+
+    def advance(self, as_of):
+        """نقل الفهرس ليوم جديد: الصيانات التي عبرت حداً منذ آخر تحديث يُعاد حسابها،
+        والباقي تُزاح أيامه المتبقية فقط لأن حالتها لم تتغير
+
+        تعيد مفاتيح الصيانات التي تغيرت حالتها.
+        """
+        elapsed = as_of.toordinal() - self.as_of.toordinal()
+        if elapsed <= 0:
+            return []
+        
+        crossed = {}
+        while self.transitions and self.transitions[0][0] <= as_of.toordinal():
+            day, key = heapq.heappop(self.transitions)
+            if self._transition_at.get(key) == day:
+                machine = self.refs[key][0]
+                crossed[machine["id"]] = machine
+        
+        for key, due_in in self.due_in.items():
+            if key[0] in crossed:
+                continue
+            due_in -= elapsed
+            self.due_in[key] = due_in
+            remaining = self.entries[key]
+            remaining["days"] = abs(due_in)
+            # حالة الساعات (بلا تاريخ أو في يوم الاستحقاق) لا تتأثر بمرور الأيام
+            remaining["percentage"] = self._date_percentage(due_in)
+            self._sort_keys[key] = self._sort_key(key, remaining)
+        
+        self.as_of = as_of
+        previous = {
+            key: self.entries[key].get("status", "normal")
+            for machine_id in crossed for key in self.machine_keys.get(machine_id, [])
+        }
+        self._order = sorted(self._sort_keys.values())
+        if crossed:
+            self.update_machines(list(crossed.values()))
+        return [key for key, status in previous.items() if key in self.entries and self.entries[key].get("status", "normal") != status]
+
+    def remove_machine(self, machine_id, keep_order=True):
+        for key in self.machine_keys.pop(machine_id, []):
+            self._remove(key, keep_order)
+
+    def update_machine(self, machine):
+        """إعادة حساب صيانات ماكينة واحدة بعد تعديلها"""
+        self.update_machines([machine])
+
+    def update_machines(self, machines):
+        """إعادة حساب صيانات عدة ماكينات في حساب متجه واحد
+
+        تعيد مفاتيح الترتيب القديمة للصيانات المحذوفة {المفتاح: مفتاح الترتيب} حتى
+        يحدّث من ينشر نسخاً مرتبة منها (التنبيهات) هذه الصيانات فقط.
+        """
+        # الدفعات الكبيرة: ترتيب القائمة مرة واحدة بدلاً من إدراج كل مفتاح بمفرده
+        keep_order = len(machines) <= 64
+        removed = {}
+        for machine in machines:
+            for key in self.machine_keys.get(machine["id"], []):
+                removed[key] = self._sort_keys[key]
+            self.remove_machine(machine["id"], keep_order)
+            self.machine_keys[machine["id"]] = []
+        for (machine_ref, maint), remaining, due_in in self._compute(machines):
+            key = (machine_ref["id"], maint["type_id"])
+            self.machine_keys[machine_ref["id"]].append(key)
+            self._insert(key, remaining, machine_ref, maint, due_in, keep_order)
+        if not keep_order:
+            self._order = sorted(self._sort_keys.values())
+        return removed
+
+    def counts(self):
+        """عدد الصيانات في كل حالة"""
+        return {status: len(keys) for status, keys in self.by_status.items()}
+
+    def keys_with_status(self, status):
+        """مفاتيح حالة واحدة مرتبة حسب الاستحقاق"""
+        rank = STATUS_ORDER.get(status, len(STATUS_ORDER))
+        lo = bisect.bisect_left(self._order, (rank,))
+        hi = bisect.bisect_left(self._order, (rank + 1,))
+        return [sort_key[-1] for sort_key in self._order[lo:hi]]
+
+    def next_due(self, limit=None, statuses=None):
+        """أقرب الصيانات استحقاقاً (اختيارياً لحالات محددة)"""
+        if statuses:
+            ranks = sorted(STATUS_ORDER.get(s, len(STATUS_ORDER)) for s in set(statuses))
+            keys = []
+            for rank in ranks:
+                lo = bisect.bisect_left(self._order, (rank,))
+                hi = bisect.bisect_left(self._order, (rank + 1,))
+                keys.extend(sort_key[-1] for sort_key in self._order[lo:hi])
+                if limit is not None and len(keys) >= limit:
+                    break
+            return keys[:limit] if limit is not None else keys
+        
+        order = self._order if limit is None else self._order[:limit]
+        return [sort_key[-1] for sort_key in order]
+
+def due_index():
+    """فهرس الاستحقاق المشترك للبيانات الحالية (يُبنى مرة لكل إصدار/يوم ثم يُحدث تزايدياً)"""
+    store = _machines_store()
+    data = load_machines_data()
+    today = date.today()
+
+    with store["lock"].read():
+        index = store["due_index"]
+        if index is not None and index.version == store["version"] and index.as_of == today:
+            return index
+
+    with store["lock"].write():
+        index = store["due_index"]
+        if index is None or index.version != store["version"]:
+            index = DueIndex()
+            index.rebuild(data, store["version"], today)
+            store["due_index"] = index
+            _publish_fleet_state(store, data, index)
+        elif index.as_of != today:
+            # يوم جديد لنفس البيانات: يُعاد حساب ما عبر حداً فقط
+            _publish_fleet_state(store, data, index, index.advance(today))
+        return index
+
+ALERT_STATUSES = ("overdue", "critical", "warning")
+
+def _count_machine(totals, machine, sign):
+    """إضافة ماكينة إلى العدادات الجارية (sign=1) أو طرحها منها (sign=-1)"""
+    location = machine.get("location", "غير محدد")
+    count = totals["locations"].get(location, 0) + sign
+    if count:
+        totals["locations"][location] = count
+    else:
+        totals["locations"].pop(location, None)
+    totals["machines"] += sign
+    totals["active"] += sign * (machine.get("status", "inactive") == "active")
+    totals["total_hours"] += sign * machine.get("total_hours", 0)
+
+def _fleet_totals(machines_data, version):
+    """حساب العدادات الجارية من الأسطول كاملاً (عند إعادة التحميل أو إعادة البناء فقط)"""
+    totals = {"version": version, "machines": 0, "active": 0, "total_hours": 0, "locations": {}}
+    for machine in machines_data["machines"]:
+        _count_machine(totals, machine, 1)
+    return totals
+
+def _fleet_stats(store, machines_data, index):
+    """إجماليات الأسطول التي تعرضها اللوحات والتقارير
+
+    تُقرأ من العدادات الجارية وحالات الصيانات من عدادات الفهرس المحدثة، ولا يُمر
+    على الأسطول إلا إذا لم تطابق العدادات إصدار الفهرس.
+    """
+    totals = store["totals"]
+    if totals is None or totals["version"] != index.version:
+        totals = store["totals"] = _fleet_totals(machines_data, index.version)
+    return {
+        "machines": totals["machines"],
+        "active": totals["active"],
+        "total_hours": totals["total_hours"],
+        "avg_hours": totals["total_hours"] / totals["machines"] if totals["machines"] else 0,
+        "maintenance_types": len(machines_data["maintenance_types"]),
+        "locations": dict(totals["locations"]),
+        "status_counts": index.counts()
+    }
+
+def _alert_item(index, key):
+    machine, maint = index.refs[key]
+    remaining = index.entries[key]
+    return {
+        "key": key,
+        "machine": machine["name"],
+        "type": maint["type_name"],
+        "status": remaining.get("status", "normal"),
+        "days": remaining.get("days"),
+        "hours": remaining.get("hours")
+    }
+
+def _publish_alerts(store, index, items, order, changed):
+    # استبدال القائمة كاملة: القراء يأخذون المرجع بدون قفل
+    store["alerts"] = {
+        "as_of": index.as_of,
+        "version": index.version,
+        "items": items,
+        "order": order,
+        "changed": frozenset(key for key in changed if key in index.entries),
+        "published_at": datetime.now()
+    }
+
+def _publish_fleet_state(store, machines_data, index, changed=None):
+    """نشر التنبيهات والإجماليات الجاهزة من فهرس الاستحقاق (تُستدعى وقفل الكتابة محجوز)
+
+    تُحسب مرة لكل تغيير بدلاً من مرة لكل جلسة. changed: مفاتيح الصيانات التي
+    تغيرت حالتها مع مرور الوقت في هذا اليوم (تبقى من النشر السابق لنفس اليوم إذا لم تُمرر).
+    """
+    previous = store["alerts"]
+    if changed is None:
+        changed = previous["changed"] if previous is not None and previous["as_of"] == index.as_of else ()
+    keys = index.next_due(statuses=ALERT_STATUSES)
+    _publish_alerts(
+        store, index,
+        [_alert_item(index, key) for key in keys],
+        [index._sort_keys[key] for key in keys],
+        changed
+    )
+    store["stats"] = dict(_fleet_stats(store, machines_data, index), as_of=index.as_of, version=index.version)
+
+def _publish_saved_machines(store, machines_data, index, removed, machines):
+    """تحديث التنبيهات المنشورة بعد حفظ ماكينات (وقفل الكتابة محجوز)
+
+    removed: مفاتيح الترتيب القديمة التي أعادتها update_machines. تُحذف عناصرها من نسخة
+    القائمة وتُدرج الصيانات الجديدة في موضعها حسب الاستحقاق بدلاً من المرور على الأسطول.
+    الدفعات الكبيرة أو نشر لا يطابق الإصدار السابق يُعاد بناؤه كاملاً.
+    """
+    previous = store["alerts"]
+    if (
+        previous is None or len(machines) > 64
+        or previous["version"] != index.version - 1 or previous["as_of"] != index.as_of
+    ):
+        _publish_fleet_state(store, machines_data, index)
+        return
+
+    items, order = list(previous["items"]), list(previous["order"])
+    for sort_key in removed.values():
+        position = bisect.bisect_left(order, sort_key)
+        if position < len(order) and order[position] == sort_key:
+            del order[position]
+            del items[position]
+    for machine in machines:
+        for key in index.machine_keys.get(machine["id"], []):
+            if index.entries[key].get("status", "normal") in ALERT_STATUSES:
+                sort_key = index._sort_keys[key]
+                position = bisect.bisect_left(order, sort_key)
+                order.insert(position, sort_key)
+                items.insert(position, _alert_item(index, key))
+    _publish_alerts(store, index, items, order, previous["changed"])
+    store["stats"] = dict(_fleet_stats(store, machines_data, index), as_of=index.as_of, version=index.version)
+
+def _fleet_state(kind):
+    """لقطة منشورة (alerts أو stats) مطابقة لإصدار البيانات واليوم الحاليين"""
+    store = _machines_store()
+    index = due_index()
+    published = store[kind]
+    if published is None or published["version"] != index.version or published["as_of"] != index.as_of:
+        # نادراً (تغير بين القراءتين): إعادة الفحص والنشر تحت قفل الكتابة
+        with store["lock"].write():
+            data = load_machines_data()
+            index = due_index()
+            published = store[kind]
+            if published is None or published["version"] != index.version or published["as_of"] != index.as_of:
+                _publish_fleet_state(store, data, index)
+                published = store[kind]
+    return published
+
+def due_alerts():
+    """التنبيهات المنشورة (المتأخر ثم الحرج ثم التحذير) كما يحدثها المجدول الخلفي وعمليات الحفظ"""
+    return _fleet_state("alerts")
+
+def fleet_stats():
+    """إجماليات الأسطول المشتركة: عدد الماكينات والنشطة وساعات التشغيل والمواقع والحالات"""
+    return _fleet_state("stats")
+
+class DueScheduler:
+    """خيط خلفي واحد على مستوى الخادم يبقي فهرس الاستحقاق والتنبيهات محدثة مع مرور الوقت
+
+    يستيقظ كل interval_seconds (لالتقاط تغييرات الملفات من عمليات أخرى) وبعد منتصف
+    الليل مباشرة، فتنتقل الحالات إلى التحذير أو الحرج أو التأخير دون انتظار مستخدم.
+    """
+
+    def __init__(self, tick, interval_seconds):
+        self.tick = tick
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._status = {
+            "state": "idle",
+            "ticks": 0,
+            "last_tick_at": None,
+            "last_error": None
+        }
+
+    def start(self):
+        """تشغيل الخيط (مرة واحدة؛ الاستدعاءات التالية لا تفعل شيئاً ما دام يعمل)"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="due-scheduler", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=None):
+        """إيقاف الخيط (للاختبارات)"""
+        self._stop.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def status(self):
+        """نسخة من حالة المجدول للعرض في الواجهة"""
+        with self._lock:
+            return dict(self._status)
+
+    def seconds_until_next_tick(self, now=None):
+        now = datetime.now() if now is None else now
+        midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+        # ثانية بعد منتصف الليل حتى يكون date.today() قد تغير
+        return max(0.0, min(self.interval_seconds, (midnight - now).total_seconds() + 1))
+
+    def run_once(self):
+        """تحديث واحد (يُستدعى من الخيط، ومباشرة في الاختبارات)"""
+        try:
+            self.tick()
+            error = None
+        except Exception as e:
+            error = str(e)
+        with self._lock:
+            self._status["ticks"] += 1
+            self._status["last_tick_at"] = datetime.now().isoformat()
+            self._status["last_error"] = error
+            self._status["state"] = "error" if error else "running"
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.seconds_until_next_tick())
+        with self._lock:
+            self._status["state"] = "stopped"
+
+@st.cache_resource
+def _due_scheduler():
+    """مجدول واحد على مستوى الخادم (لا يتكرر مع الجلسات أو إعادة التشغيل)"""
+    scheduler = DueScheduler(due_alerts, APP_CONFIG["DUE_SCHEDULER_INTERVAL_SECONDS"])
+    scheduler.start()
+    return scheduler
+
+def fleet_remaining(machines_data=None):
+    """الوقت المتبقي لكل صيانات الأسطول محسوباً عند القراءة: {(machine_id, type_id): remaining}"""
+    if machines_data is None or machines_data is load_machines_data():
+        return due_index().entries
+
+    return {
+        (machine["id"], maint["type_id"]): remaining
+        for (machine, maint), remaining, _ in DueIndex._compute(machines_data["machines"])
+    }
+
+# ===============================
+# 📈 توقع الاستحقاق من معدل التشغيل
+# ===============================
+@st.cache_resource
+def _usage_readings():
+    """قراءات الساعات من سجل الصيانة كأعمدة تُستكمل تزايدياً (يوم epoch، ساعات، ماكينة)"""
+    return {"lock": threading.Lock(), "position": 0, "machine_ids": [], "days": array.array("q"), "hours": array.array("d")}
+
+def usage_readings():
+    """كل قراءات الساعات المسجلة (قراءات يدوية وإتمام صيانات): (معرفات الماكينات, الأيام, الساعات)"""
+    readings = _usage_readings()
+
+    with readings["lock"]:
+        events = _history_log().events_from(readings["position"])
+        readings["position"] += len(events)
+        events = [event for event in events if event.get("event_type") in ("hours", "completion")]
+        
+        if events:
+            days = parse_dates([event.get("date") for event in events])
+            hours = pd.to_numeric(pd.Series([event.get("hours") for event in events], dtype=object), errors="coerce").to_numpy(dtype=float)
+            valid = (days != NO_DATE) & np.isfinite(hours)
+            readings["machine_ids"].extend(event["machine_id"] for event, ok in zip(events, valid) if ok)
+            readings["days"].extend((days[valid] // DAY_NS).tolist())
+            readings["hours"].extend(hours[valid].tolist())
+        
+        return (
+            list(readings["machine_ids"]),
+            np.array(readings["days"], dtype=np.int64),
+            np.array(readings["hours"], dtype=float)
+        )
+
+def usage_rates(machine_ids, days, hours, as_of=None):
+    """معدل التشغيل (ساعة/يوم) لكل ماكينة بمتوسط مرجح أسياً للفترات بين القراءات
+
+    وزن كل فترة = طولها بالأيام × 0.5^(عمرها / نصف العمر)، والانحراف المعياري
+    المرجح للمعدلات يعطي نطاق الثقة. الفترات التي تنقص فيها الساعات (تصفير العداد)
+    أو تتجاوز أقصى معدل ممكن تُهمل. تعيد DataFrame مفهرساً بمعرف الماكينة.
+    """
+    as_of_day = pd.Timestamp(as_of or date.today()).value // DAY_NS
+    columns = ["rate", "rate_std", "intervals", "last_day", "last_hours"]
+    if not machine_ids:
+        return pd.DataFrame(columns=columns, index=pd.Index([], name="machine_id"))
+
+    # قراءة واحدة لكل ماكينة في اليوم (الأعلى) مرتبة بالماكينة ثم اليوم
+    frame = pd.DataFrame({"machine_id": machine_ids, "day": days, "hours": hours})
+    frame = frame.groupby(["machine_id", "day"], sort=True)["hours"].max().reset_index()
+
+    same_machine = frame["machine_id"].to_numpy()[1:] == frame["machine_id"].to_numpy()[:-1]
+    span = np.diff(frame["day"].to_numpy())
+    gained = np.diff(frame["hours"].to_numpy())
+    rate = np.divide(gained, span, out=np.full(len(span), np.nan), where=span > 0)
+    valid = same_machine & (gained >= 0) & (rate <= APP_CONFIG["USAGE_MAX_HOURS_PER_DAY"])
+
+    age = as_of_day - frame["day"].to_numpy()[1:]
+    weight = np.where(valid, span * 0.5 ** (np.maximum(age, 0) / APP_CONFIG["USAGE_RATE_HALFLIFE_DAYS"]), 0.0)
+    rate = np.where(valid, rate, 0.0)
+
+    machine_codes, machines = pd.factorize(frame["machine_id"], sort=True)
+    interval_codes = machine_codes[1:]
+    total_weight = np.bincount(interval_codes, weights=weight, minlength=len(machines))
+    mean = np.divide(np.bincount(interval_codes, weights=weight * rate, minlength=len(machines)), total_weight,
+                     out=np.full(len(machines), np.nan), where=total_weight > 0)
+    spread = np.bincount(interval_codes, weights=weight * (rate - mean[interval_codes]) ** 2, minlength=len(machines))
+    variance = np.divide(spread, total_weight, out=np.full(len(machines), np.nan), where=total_weight > 0)
+
+    last = frame.groupby("machine_id", sort=True).tail(1)
+    return pd.DataFrame({
+        "rate": mean,
+        "rate_std": np.sqrt(variance),
+        "intervals": np.bincount(interval_codes, weights=valid, minlength=len(machines)).astype(int),
+        "last_day": last["day"].to_numpy(),
+        "last_hours": last["hours"].to_numpy()
+    }, index=pd.Index(machines, name="machine_id"))
+
+def _forecast_due(machines_data, readings, as_of):
+    """الاستحقاق المتوقع لكل صيانات الأسطول كأعمدة
+
+    الصيانات الزمنية: تاريخها التالي كما هو. الصيانات بالساعات: آخر قراءة +
+    (الساعات المتبقية / معدل التشغيل)، ونطاق الثقة بمعدل ± انحراف معياري واحد.
+    التواريخ epoch بالنانوثانية (NO_DATE إذا تعذر التوقع).
+    """
+    columns = ScheduleColumns.from_machines(machines_data["machines"])
+    rates = usage_rates(*readings, as_of=as_of).reindex(columns.machine_ids)
+    today = pd.Timestamp(as_of).value // DAY_NS
+
+    per_row = lambda values: np.asarray(values, dtype=float)[columns.machine_row]
+    rate, rate_std = per_row(rates["rate"]), per_row(rates["rate_std"])
+    anchor = np.where(np.isnan(per_row(rates["last_day"])), today, per_row(rates["last_day"]))
+    current = np.where(columns.total_hours_valid, columns.total_hours, 0.0)[columns.machine_row]
+    remaining = np.maximum(columns.next_hours - current, 0.0)
+    usage_based = (columns.unit_kind == MaintenanceUnit.HOURS) & columns.next_hours_valid & (rate > 0)
+
+    def project(day_rate):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            offset = remaining / day_rate
+        ok = usage_based & np.isfinite(offset) & (offset < 36500)
+        return np.where(ok, (anchor + np.floor(np.where(ok, offset, 0))).astype(np.int64) * DAY_NS, NO_DATE)
+
+    projected = project(rate)
+    with np.errstate(invalid="ignore"):
+        latest = project(np.where(rate - rate_std > 0, rate - rate_std, np.nan))
+    earliest = project(rate + np.nan_to_num(rate_std))
+
+    # الصيانات الزمنية: التاريخ المخطط نفسه هو الاستحقاق
+    calendar = columns.next_date != NO_DATE
+    projected = np.where(calendar, columns.next_date, projected)
+    earliest = np.where(calendar, columns.next_date, earliest)
+    latest = np.where(calendar, columns.next_date, latest)
+
+    return pd.DataFrame({
+        "machine_id": np.array(columns.machine_ids, dtype=object)[columns.machine_row],
+        "type_id": np.array(columns.type_ids, dtype=object)[columns.type_code],
+        "basis": np.where(calendar, "date", np.where(projected != NO_DATE, "usage", "none")),
+        "rate": rate,
+        "projected": projected,
+        "earliest": earliest,
+        "latest": latest
+    })
+
+def usage_forecast():
+    """الاستحقاق المتوقع لكل الصيانات مع معدلات التشغيل (محفوظ لكل إصدار بيانات/يوم/حجم السجل)"""
+    return cached_report(
+        "usage_forecast",
+        lambda: _forecast_due(load_machines_data(), usage_readings(), date.today()),
+        len(_history_log())
+    )
+
+def forecast_lookup():
+    """{(machine_id, type_id): (الاستحقاق المتوقع, أبكر, أقصى, الأساس)} بتواريخ epoch"""
+    forecast = usage_forecast()
+    return cached_report(
+        "usage_forecast_lookup",
+        lambda: dict(zip(
+            zip(forecast["machine_id"], forecast["type_id"]),
+            zip(forecast["projected"].tolist(), forecast["earliest"].tolist(), forecast["latest"].tolist(), forecast["basis"])
+        )),
+        len(_history_log())
+    )
+
+def format_forecast(projected, earliest, latest):
+    """نص الاستحقاق المتوقع مع نطاقه"""
+    if projected == NO_DATE:
+        return "غير متاح"
+    text = _format_epoch_date(projected)
+    if earliest != latest:
+        text += f" ({_format_epoch_date(earliest)} - {_format_epoch_date(latest) if latest != NO_DATE else '؟'})"
+    return text
+
+def get_status_color(status):
+    """الحصول على لون الحالة"""
+    colors = APP_CONFIG["COLORS"]
+    return colors.get(status, "#6c757d")
+
+# ===============================
+# 📤 تصدير التقارير
+# ===============================
+REPORT_TYPES = ["تقرير الماكينات", "جدول الصيانة", "تقرير المؤقتات", "التقرير الشامل"]
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+def _timer_note(status):
+    """ملاحظة حالة المؤقت في تقرير المؤقتات"""
+    if status == "critical":
+        return "🔴 تحتاج صيانة عاجلة"
+    if status == "warning":
+        return "🟡 تحتاج صيانة قريباً"
+    if status == "normal":
+        return "🟢 تحت السيطرة"
+    return "⚫ متأخرة"
+
+def _report_sheets(report_type, machines_data, remaining_by_entry):
+    """أوراق التقرير: [(اسم الورقة, الأعمدة, مولد الصفوف)] تُقرأ الصفوف مباشرة من البيانات دون تجميعها"""
+    machines = machines_data["machines"]
+
+    def schedule(row):
+        for machine in machines:
+            for maint in machine.get("next_maintenance", []):
+                yield row(machine, maint, remaining_by_entry.get((machine["id"], maint["type_id"]), {}))
+
+    if report_type == "تقرير الماكينات":
+        columns = ["اسم الماكينة", "الموديل", "الرقم المسلسل", "المكان", "تاريخ التركيب", "ساعات التشغيل", "الحالة", "عدد أنواع الصيانة"]
+        rows = ((
+            machine["name"], machine.get("model", ""), machine.get("serial_number", ""), machine.get("location", ""),
+            machine.get("installation_date", ""), machine.get("total_hours", 0), machine.get("status", ""),
+            len(machine.get("next_maintenance", []))
+        ) for machine in machines)
+        return [("تقرير", columns, rows)]
+
+    if report_type == "جدول الصيانة":
+        columns = ["الماكينة", "نوع الصيانة", "آخر تاريخ", "التاريخ التالي", "الساعات التالية", "المتبقي (أيام)", "المتبقي (ساعات)", "الحالة", "الفترة"]
+        rows = schedule(lambda machine, maint, remaining: (
+            machine["name"], maint["type_name"], maint.get("last_date", ""), maint.get("next_date", ""),
+            maint.get("next_hours", ""), remaining.get("days", ""), remaining.get("hours", ""),
+            remaining.get("status", ""), f"{maint['interval']} {maint['unit']}"
+        ))
+        return [("تقرير", columns, rows)]
+
+    if report_type == "تقرير المؤقتات":
+        columns = ["الماكينة", "نوع الصيانة", "حالة المؤقت", "نسبة الإنجاز", "ملاحظات"]
+        rows = schedule(lambda machine, maint, remaining: (
+            machine["name"], maint["type_name"], remaining.get("status", ""),
+            f"{remaining.get('percentage', 0):.1f}%", _timer_note(remaining.get("status"))
+        ))
+        return [("تقرير", columns, rows)]
+
+    # التقرير الشامل
+    machine_rows = ((
+        machine["name"], machine.get("model", ""), machine.get("serial_number", ""),
+        machine.get("location", ""), machine.get("total_hours", 0), machine.get("status", "")
+    ) for machine in machines)
+    maint_rows = schedule(lambda machine, maint, remaining: (
+        machine["name"], maint["type_name"], maint.get("next_date", ""), remaining.get("status", "")
+    ))
+    stats_rows = [
+        ("عدد الماكينات", len(machines)),
+        ("إجمالي ساعات التشغيل", sum(m.get("total_hours", 0) for m in machines)),
+        ("عدد أنواع الصيانة", len(machines_data["maintenance_types"])),
+        ("تاريخ التقرير", datetime.now().strftime("%d/%m/%Y %H:%M"))
+    ]
+    return [
+        ("الماكينات", ["اسم الماكينة", "الموديل", "الرقم المسلسل", "المكان", "ساعات التشغيل", "الحالة"], machine_rows),
+        ("الصيانة", ["الماكينة", "نوع الصيانة", "التاريخ التالي", "الحالة"], maint_rows),
+        ("الإحصائيات", ["المعيار", "القيمة"], stats_rows)
+    ]
+
+def _report_cell(value):
+    """الخلايا الفارغة (نص فارغ أو NaN) تُكتب فارغة كما في pandas"""
+    if value == "" or (isinstance(value, float) and value != value):
+        return None
+    return value
+
+def _write_report_xlsx(path, sheets):
+    """كتابة التقرير بوضع write-only في openpyxl: كل صف يُكتب ثم يُترك"""
+    workbook = Workbook(write_only=True)
+    for name, columns, rows in sheets:
+        sheet = workbook.create_sheet(name)
+        sheet.append(columns)
+        for row in rows:
+            sheet.append([_report_cell(value) for value in row])
+    workbook.save(path)
+
+def _write_report_csv(path, sheets):
+    """كتابة التقرير CSV (UTF-8 مع BOM لفتحه في Excel) على دفعات عبر مخزن الملف"""
+    name, columns, rows = sheets[0]
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        writer.writerows(rows)
+
+class ReportCache:
+    """كاش LRU محدود الحجم لنتائج التقارير (DataFrames في الذاكرة وملفات التصدير على القرص)
+
+    المفتاح يبدأ بإصدار البيانات واليوم، فأي حفظ يجعل النتائج السابقة قديمة
+    فتُحذف عند أول طلب بالإصدار الجديد. عند تجاوز الحجم يُحذف الأقدم استخداماً.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._building = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _size_of(value):
+        if isinstance(value, pd.DataFrame):
+            return int(value.memory_usage(deep=True).sum())
+        if isinstance(value, (bytes, str)):
+            return len(value)
+        if isinstance(value, tuple):
+            return sum(ReportCache._size_of(item) for item in value)
+        return sys.getsizeof(value)
+
+    def _drop(self, key):
+        value, size, cleanup = self._entries.pop(key)
+        self.size -= size
+        if cleanup is not None:
+            cleanup()
+
+    def clear(self):
+        """حذف كل النتائج المحفوظة (مثلاً بعد استبدال الملف المحلي بنسخة GitHub)"""
+        with self._lock:
+            for key in list(self._entries):
+                self._drop(key)
+
+    def get_or_build(self, key, build, file_path=None):
+        """القيمة المحفوظة للمفتاح أو بناؤها مرة واحدة حتى مع الطلبات المتزامنة
+
+        مع file_path تكتب build الملف ويُحفظ المسار وحجمه (ويُحذف الملف عند الإخراج).
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key][0]
             
-            days_remaining = (next_date - today).days
+            # حذف نتائج الإصدارات السابقة
+            for stale_key in [k for k in self._entries if k[:2] != key[:2]]:
+                self._drop(stale_key)
             
-            if days_remaining < 0:
-                remaining["days"] = abs(days_remaining)
-                remaining["status"] = "overdue"
-                remaining["percentage"] = 0
-            else:
-                remaining["days"] = days_remaining
-                
-                # تحديد حالة المؤقت
-                if days_remaining <= APP_CONFIG["CRITICAL_DAYS_BEFORE"]:
-                    remaining["status"] = "critical"
-                    remaining["percentage"] = max(0, 100 * days_remaining / APP_CONFIG["CRITICAL_DAYS_BEFORE"])
-                elif days_remaining <= APP_CONFIG["WARNING_DAYS_BEFORE"]:
-                    remaining["status"] = "warning"
-                    remaining["percentage"] = max(0, 100 * days_remaining / APP_CONFIG["WARNING_DAYS_BEFORE"])
-                else:
-                    remaining["status"] = "normal"
-                    remaining["percentage"] = max(0, 100 * (1 - (days_remaining / 365)))
+            build_lock = self._building.setdefault(key, threading.Lock())
         
-        except:
-            pass
-    
-    # حساب الوقت المتبقي حسب الساعات
-    if next_hours and pd.notna(next_hours) and current_hours and pd.notna(current_hours):
-        try:
-            hours_remaining = float(next_hours) - float(current_hours)
+        with build_lock:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    return self._entries[key][0]
             
-            if hours_remaining < 0:
-                remaining["hours"] = abs(hours_remaining)
-                if remaining["status"] != "overdue":
-                    remaining["status"] = "overdue"
-            else:
-                remaining["hours"] = hours_remaining
-                
-                # إذا لم يكن هناك تاريخ، نستخدم الساعات لتحديد الحالة
-                if not remaining["days"]:
-                    if hours_remaining <= 50:
-                        remaining["status"] = "critical"
-                        remaining["percentage"] = max(0, 100 * hours_remaining / 50)
-                    elif hours_remaining <= 100:
-                        remaining["status"] = "warning"
-                        remaining["percentage"] = max(0, 100 * hours_remaining / 100)
-                    else:
-                        remaining["status"] = "normal"
-                        remaining["percentage"] = max(0, 100 * (1 - (hours_remaining / 1000)))
-        
-        except:
+            try:
+                if file_path is None:
+                    value = build()
+                    size, cleanup = self._size_of(value), None
+                else:
+                    tmp_path = f"{file_path}.tmp"
+                    build(tmp_path)
+                    os.replace(tmp_path, file_path)
+                    value, size = file_path, os.path.getsize(file_path)
+                    
+                    def cleanup():
+                        if os.path.exists(file_path):
+                            os.remove(file_path)
+            finally:
+                with self._lock:
+                    self._building.pop(key, None)
+            
+            with self._lock:
+                self._entries[key] = (value, size, cleanup)
+                self.size += size
+                while self.size > self.max_bytes and len(self._entries) > 1:
+                    self._drop(next(iter(self._entries)))
+            return value
+
+# اسم ملف التصدير: النوع ثم رقم العملية ثم بصمة المفتاح (وملفه المؤقت أثناء الكتابة)
+REPORT_FILE_PATTERN = re.compile(r"^.+-\d+-[0-9a-f]{16}\.(xlsx|csv)(\.tmp)?$")
+
+@st.cache_resource
+def _report_cache():
+    """كاش التقارير المشترك
+
+    كل عملية تكتب ملفاتها باسم يحمل رقمها فلا تحذف ملفات عملية أخرى ما زالت تعمل،
+    والمتبقي من عمليات سابقة (بنفس نمط الأسماء فقط) يُحذف بعد REPORT_FILE_MAX_AGE_SECONDS.
+    """
+    cutoff = time.time() - APP_CONFIG["REPORT_FILE_MAX_AGE_SECONDS"]
+    for path in glob.glob(os.path.join(REPORTS_DIR, "*")):
+        if not REPORT_FILE_PATTERN.match(os.path.basename(path)):
+            continue
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
             pass
-    
-    return remaining
+    return ReportCache(APP_CONFIG["REPORT_CACHE_MAX_BYTES"])
 
-def get_status_color(status):
-    """الحصول على لون الحالة"""
-    colors = APP_CONFIG["COLORS"]
-    return colors.get(status, "#6c757d")
+def cached_report(kind, build, *params):
+    """نتيجة تقرير محفوظة بمفتاح (إصدار البيانات, اليوم, النوع, المعاملات)"""
+    key = (machines_data_version(), date.today(), kind, params)
+    return _report_cache().get_or_build(key, build)
+
+def cached_report_file(kind, extension, write, *params):
+    """ملف تقرير على القرص محفوظ بنفس مفتاح cached_report؛ write(path) تكتب الملف"""
+    key = (machines_data_version(), date.today(), f"{kind}.{extension}", params)
+    os.makedirs(REPORTS_DIR, exist_ok=True)
+    digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:16]
+    file_path = os.path.join(REPORTS_DIR, f"{kind}-{os.getpid()}-{digest}.{extension}")
+    return _report_cache().get_or_build(key, write, file_path=file_path)
+
+def build_report_export(report_type, format_type):
+    """ملف التقرير على القرص (يُولد مرة لكل إصدار بيانات). تعيد (المسار, الامتداد, نوع MIME)"""
+    # التقرير الشامل متعدد الأوراق فهو Excel دائماً
+    if report_type == "التقرير الشامل":
+        format_type = "Excel"
+    extension, mime_type = ("xlsx", XLSX_MIME) if format_type == "Excel" else ("csv", "text/csv")
+
+    def write(path):
+        machines_data = load_machines_data()
+        sheets = _report_sheets(report_type, machines_data, fleet_remaining(machines_data))
+        if extension == "xlsx":
+            _write_report_xlsx(path, sheets)
+        else:
+            _write_report_csv(path, sheets)
+
+    return cached_report_file("export", extension, write, report_type, format_type), extension, mime_type
+
+def _deferred_file(path):
+    """قراءة الملف عند طلب التنزيل فقط (لا يبقى محتواه في ذاكرة الجلسة)"""
+    def read():
+        with open(path, "rb") as f:
+            return f.read()
+    return read
+
+# ===============================
+# 📡 وضع العرض المباشر
+# ===============================
+def live_version():
+    """عداد تغيّر رخيص للأجزاء الحية: (إصدار البيانات، اليوم الذي حُسبت له الحالات)"""
+    index = due_index()
+    return (index.version, index.as_of)
+
+def _live_body(render, rendered_version, *args):
+    # تغيرت البيانات منذ العرض الكامل: إعادة تشغيل واحدة تعيد الفلاتر والصفحات وكل الأجزاء
+    if live_version() != rendered_version:
+        st.rerun()
+    render(*args)
+    st.caption(f"📡 مباشر - آخر تحقق {datetime.now().strftime('%H:%M:%S')}")
+
+def live_section(render, *args):
+    """رسم جزء من الصفحة؛ في وضع العرض المباشر يصبح fragment يتحدث وحده كل LIVE_REFRESH_SECONDS
+
+    كل تحديث يقارن live_version بما عُرضت به الصفحة: بدون تغيير يُعاد رسم الجزء
+    وحده من اللقطات المنشورة، ومع التغيير تُعاد الصفحة مرة واحدة.
+    """
+    if not st.session_state.get("live_mode"):
+        return render(*args)
+    st.fragment(_live_body, run_every=APP_CONFIG["LIVE_REFRESH_SECONDS"])(render, live_version(), *args)
+
+def _timer_view(index, forecasts, key):
+    """بيانات بطاقة مؤقت واحدة من فهرس الاستحقاق"""
+    machine, maint = index.refs[key]
+    return {
+        "machine": machine["name"],
+        "type": maint["type_name"],
+        "remaining": index.entries[key],
+        "next_date": maint.get("next_date"),
+        "next_hours": maint.get("next_hours"),
+        "forecast": forecasts.get(key),
+        "machine_id": machine["id"],
+        "type_id": maint["type_id"]
+    }
+
+def _timer_card_html(timer):
+    """بطاقة المؤقت كاملة في كتلة HTML واحدة (للعرض المباشر بدون أدوات إدخال)"""
+    remaining = timer["remaining"]
+    color = get_status_color(remaining.get("status", "normal"))
+    lines = [
+        f'<div style="border: 2px solid {color}; border-radius: 10px; padding: 15px; margin: 10px 0;">',
+        f'<h4 style="color: {color}; margin: 0;">{escape(str(timer["machine"]))}</h4>',
+        f'<p style="margin: 5px 0;"><strong>{escape(str(timer["type"]))}</strong></p>'
+    ]
+
+    if remaining.get("days") is not None:
+        days = remaining["days"]
+        label = "متأخر" if days < 0 else "متبقي"
+        lines.append(f"<p style='color: {color};'><strong>{label}: {abs(days)} يوم</strong></p>")
+    elif remaining.get("hours") is not None:
+        hours = remaining["hours"]
+        label = "متأخر" if hours < 0 else "متبقي"
+        lines.append(f"<p style='color: {color};'><strong>{label}: {abs(hours):.0f} ساعة</strong></p>")
+
+    if timer["next_date"]:
+        lines.append(f"<p>التاريخ التالي: {escape(str(timer['next_date']))}</p>")
+    elif timer["forecast"] and timer["forecast"][3] == "usage":
+        lines.append(f"<p>الاستحقاق المتوقع: {format_forecast(*timer['forecast'][:3])}</p>")
+
+    if remaining.get("percentage") is not None:
+        width = min(100, max(0, remaining["percentage"]))
+        lines.append(
+            f'<div style="background: #e9ecef; border-radius: 4px; height: 8px;">'
+            f'<div style="background: {color}; width: {width:.0f}%; height: 8px; border-radius: 4px;"></div></div>'
+        )
+
+    lines.append("</div>")
+    return "".join(lines)
+
+def _live_timer_cards(page_keys):
+    """بطاقات الصفحة الظاهرة للقراءة فقط؛ البطاقة يُعاد بناؤها فقط إذا تغيرت بيانات صيانتها"""
+    index = due_index()
+    forecasts = forecast_lookup()
+    cached = st.session_state.get("live_timer_cards", {})
+    cards = {}
+
+    for key in page_keys:
+        if key not in index.entries:
+            continue
+        timer = _timer_view(index, forecasts, key)
+        signature = (timer["machine"], timer["type"], tuple(timer["remaining"].items()), timer["next_date"], timer["forecast"])
+        card = cached.get(key)
+        if card is None or card[0] != signature:
+            card = (signature, _timer_card_html(timer))
+        cards[key] = card
+
+    st.session_state["live_timer_cards"] = cards
+
+    cols_per_row = 3
+    card_list = list(cards.values())
+    for i in range(0, len(card_list), cols_per_row):
+        cols = st.columns(cols_per_row)
+        for col, (_, html) in zip(cols, card_list[i:i + cols_per_row]):
+            with col:
+                st.markdown(html, unsafe_allow_html=True)
 
 # ===============================
 # 🏭 واجهات إدارة الماكينات
 # ===============================
+def _dashboard_counters():
+    """عدادات لوحة القيادة من الإجماليات المنشورة"""
+    stats = fleet_stats()
+    status_counts = stats["status_counts"]
+    col1, col2, col3, col4 = st.columns(4)
+
+    with col1:
+        st.metric("🛠️ عدد الماكينات", stats["machines"])
+
+    with col2:
+        st.metric("✅ ماكينات نشطة", stats["active"])
+
+    with col3:
+        critical_count = status_counts["critical"]
+        st.metric("🔴 صيانة حرجة", critical_count, delta=f"{critical_count} تحتاج صيانة عاجلة")
+
+    with col4:
+        overdue_count = status_counts["overdue"]
+        st.metric("⏰ متأخرة", overdue_count, delta_color="inverse")
+
 def dashboard_ui():
     """لوحة القيادة الرئيسية"""
     st.header("🏭 لوحة القيادة")
-    
+
     # تحميل البيانات
     machines_data = load_machines_data()
-    
+
     if not machines_data["machines"]:
         st.info("ℹ️ لا توجد ماكينات مسجلة. قم بإضافة ماكينة جديدة من تبويب 'إضافة ماكينة'")
         return
-    
-    # عرض الإحصائيات العامة
-    col1, col2, col3, col4 = st.columns(4)
-    
-    with col1:
-        total_machines = len(machines_data["machines"])
-        st.metric("🛠️ عدد الماكينات", total_machines)
-    
-    with col2:
-        active_machines = sum(1 for m in machines_data["machines"] if m.get("status") == "active")
-        st.metric("✅ ماكينات نشطة", active_machines)
-    
-    with col3:
-        critical_count = 0
-        for machine in machines_data["machines"]:
-            if machine.get("next_maintenance"):
-                for maint in machine["next_maintenance"]:
-                    if maint.get("remaining", {}).get("status") == "critical":
-                        critical_count += 1
-        st.metric("🔴 صيانة حرجة", critical_count, delta=f"{critical_count} تحتاج صيانة عاجلة")
-    
-    with col4:
-        overdue_count = 0
-        for machine in machines_data["machines"]:
-            if machine.get("next_maintenance"):
-                for maint in machine["next_maintenance"]:
-                    if maint.get("remaining", {}).get("status") == "overdue":
-                        overdue_count += 1
-        st.metric("⏰ متأخرة", overdue_count, delta_color="inverse")
-    
+
+    remaining_by_entry = fleet_remaining(machines_data)
+
+    # عرض الإحصائيات العامة (تتحدث وحدها في وضع العرض المباشر)
+    live_section(_dashboard_counters)
+
     st.markdown("---")
-    
+
     # عرض الماكينات مع مؤقتات الصيانة
     st.subheader("⏰ مؤقتات الصيانة الحالية")
-    
+
     for machine in machines_data["machines"]:
         with st.expander(f"🛠️ {machine['name']} - {machine.get('model', 'غير محدد')}", expanded=False):
             col_info1, col_info2 = st.columns([2, 1])
@@ -496,7 +3636,7 @@ def dashboard_ui():
                 st.markdown("#### 📅 جدول الصيانة")
                 
                 for maint in machine["next_maintenance"]:
-                    remaining = maint.get("remaining", {})
+                    remaining = remaining_by_entry.get((machine["id"], maint["type_id"]), {})
                     status_color = get_status_color(remaining.get("status", "normal"))
                     
                     col_maint1, col_maint2, col_maint3 = st.columns([2, 2, 1])
@@ -531,9 +3671,9 @@ def dashboard_ui():
 def add_machine_ui():
     """إضافة ماكينة جديدة"""
     st.header("➕ إضافة ماكينة جديدة")
-    
+
     machines_data = load_machines_data()
-    
+
     with st.form("add_machine_form"):
         col1, col2 = st.columns(2)
         
@@ -588,7 +3728,7 @@ def add_machine_ui():
                 next_date = None
                 next_hours = None
                 
-                if maint["unit"] in ["أيام", "أسابيع", "شهور", "سنوات"]:
+                if MaintenanceUnit.from_label(maint["unit"]).is_calendar:
                     next_date = calculate_next_date(
                         installation_date.strftime("%d/%m/%Y"),
                         maint["interval"],
@@ -597,13 +3737,10 @@ def add_machine_ui():
                 else:
                     next_hours = calculate_next_hours(total_hours, maint["interval"])
                 
-                remaining = calculate_remaining_time(next_date, next_hours, total_hours)
-                
                 next_maintenance.append({
                     **maint,
                     "next_date": next_date,
-                    "next_hours": next_hours,
-                    "remaining": remaining
+                    "next_hours": next_hours
                 })
             
             # إنشاء كائن الماكينة
@@ -622,13 +3759,10 @@ def add_machine_ui():
                 "updated_at": datetime.now().isoformat()
             }
             
-            # إضافة الماكينة للبيانات
-            machines_data["machines"].append(new_machine)
-            
-            # حفظ في JSON
-            if save_machines_data(machines_data):
+            # حفظ الماكينة الجديدة
+            if save_machine(new_machine):
                 # تحديث ملف Excel
-                update_excel_with_machines(machines_data)
+                update_excel_with_machines(load_machines_data(), dirty=[new_machine["id"]])
                 st.success(f"✅ تم إضافة الماكينة '{machine_name}' بنجاح!")
                 st.balloons()
                 
@@ -638,106 +3772,383 @@ def add_machine_ui():
             else:
                 st.error("❌ فشل في حفظ الماكينة")
 
+def _reschedule(maint):
+    """إعادة حساب الاستحقاق التالي من آخر صيانة والفترة"""
+    if MaintenanceUnit.from_label(maint["unit"]).is_calendar:
+        maint["next_date"] = calculate_next_date(
+            maint.get("last_date"),
+            maint["interval"],
+            maint["unit"]
+        )
+    else:
+        maint["next_hours"] = calculate_next_hours(
+            maint.get("last_hours"),
+            maint["interval"]
+        )
+
+def _apply_completion(machine, maint):
+    """تسجيل إتمام صيانة على نسخة الماكينة في الذاكرة"""
+    # تسجيل التاريخ الحالي كآخر صيانة
+    maint["last_date"] = datetime.now().strftime("%d/%m/%Y")
+    maint["last_hours"] = machine.get("total_hours", 0)
+
+    # حساب الاستحقاق التالي
+    _reschedule(maint)
+
+    # تحديث وقت التعديل
+    machine["updated_at"] = datetime.now().isoformat()
+
+def _apply_interval(machine, maint, interval):
+    """تغيير فترة صيانة؛ الاستحقاق التالي يُعاد حسابه فقط إذا كانت هناك صيانة سابقة مسجلة"""
+    maint["interval"] = interval
+    is_date_based = MaintenanceUnit.from_label(maint["unit"]).is_calendar
+    if maint.get("last_date" if is_date_based else "last_hours") not in (None, ""):
+        _reschedule(maint)
+    machine["updated_at"] = datetime.now().isoformat()
+
+def apply_maintenance_operations(operations):
+    """تطبيق عمليات صيانة جماعية في الذاكرة ثم حفظها في معاملة واحدة
+
+    operations: [{"action": "complete" أو "interval", "machine_id", "type_id", "interval": للتعديل فقط}]
+    كل الماكينات المتأثرة تُحفظ معاً، ثم تحديث Excel ورفع واحد إلى GitHub.
+    تعيد عدد الصيانات التي طُبقت (0 إذا فشل الحفظ).
+    """
+    machines_by_id = machine_index().by_id
+    changed = {}
+    schedules = {}
+    history_events = []
+    applied = 0
+
+    for operation in operations:
+        machine_id = operation["machine_id"]
+        if machine_id not in changed:
+            if machine_id not in machines_by_id:
+                continue
+            changed[machine_id] = _copy_machine(machines_by_id[machine_id])
+            schedules[machine_id] = {m["type_id"]: m for m in changed[machine_id].get("next_maintenance", [])}
+        machine = changed[machine_id]
+        
+        maint = schedules[machine_id].get(operation["type_id"])
+        if maint is None:
+            continue
+        
+        if operation["action"] == "complete":
+            previous = {"last_date": maint.get("last_date"), "last_hours": maint.get("last_hours")}
+            _apply_completion(machine, maint)
+            history_events.append(new_history_event("completion", machine, maint, previous=previous))
+        elif operation["action"] == "interval":
+            _apply_interval(machine, maint, operation["interval"])
+        else:
+            continue
+        applied += 1
+
+    if not applied or not save_machines(list(changed.values())):
+        return 0
+
+    if history_events:
+        log_history_events(history_events)
+    update_excel_with_machines(load_machines_data(), dirty=changed)
+    return applied
+
+def record_maintenances(pairs):
+    """تسجيل إتمام عدة صيانات [(machine_id, type_id), ...] بحفظ واحد وإعادة تشغيل مرة واحدة"""
+    operations = [
+        {"action": "complete", "machine_id": machine_id, "type_id": maintenance_type_id}
+        for machine_id, maintenance_type_id in pairs
+    ]
+    if apply_maintenance_operations(operations):
+        st.success("✅ تم تسجيل الصيانة بنجاح!")
+        st.rerun()
+
 def record_maintenance(machine_id, maintenance_type_id):
     """تسجيل إتمام صيانة"""
-    machines_data = load_machines_data()
-    
-    # البحث عن الماكينة
-    for machine in machines_data["machines"]:
-        if machine["id"] == machine_id:
-            # البحث عن نوع الصيانة
-            for maint in machine.get("next_maintenance", []):
-                if maint["type_id"] == maintenance_type_id:
-                    # تسجيل التاريخ الحالي كآخر صيانة
-                    maint["last_date"] = datetime.now().strftime("%d/%m/%Y")
-                    maint["last_hours"] = machine.get("total_hours", 0)
-                    
-                    # حساب التاريخ التالي
-                    if maint["unit"] in ["أيام", "أسابيع", "شهور", "سنوات"]:
-                        maint["next_date"] = calculate_next_date(
-                            maint["last_date"],
-                            maint["interval"],
-                            maint["unit"]
-                        )
-                    else:
-                        maint["next_hours"] = calculate_next_hours(
-                            maint["last_hours"],
-                            maint["interval"]
-                        )
-                    
-                    # تحديث وقت التعديل
-                    machine["updated_at"] = datetime.now().isoformat()
-                    
-                    # حفظ التغييرات
-                    if save_machines_data(machines_data):
-                        update_excel_with_machines(machines_data)
-                        st.success("✅ تم تسجيل الصيانة بنجاح!")
-                        st.rerun()
-                    break
-            break
+    record_maintenances([(machine_id, maintenance_type_id)])
+
+HOURS_READING_COLUMNS = {
+    "machine": ["machine_id", "machine", "serial_number", "serial", "معرف الماكينة", "الرقم المسلسل"],
+    "hours": ["hours", "total_hours", "الساعات", "ساعات التشغيل"],
+    "timestamp": ["timestamp", "date", "التاريخ", "تاريخ التشغيل"]
+}
+
+def _normalize_readings(readings):
+    """توحيد القراءات (DataFrame أو قائمة tuples/dicts) إلى أعمدة machine/hours/timestamp"""
+    if isinstance(readings, pd.DataFrame):
+        frame = readings
+    elif readings and not isinstance(readings[0], dict):
+        frame = pd.DataFrame([list(r) for r in readings]).iloc[:, :3]
+        frame.columns = ["machine", "hours", "timestamp"][:frame.shape[1]]
+    else:
+        frame = pd.DataFrame(list(readings))
+
+    columns = {str(c).strip(): c for c in frame.columns}
+    normalized = pd.DataFrame(index=frame.index)
+    for target, aliases in HOURS_READING_COLUMNS.items():
+        # أكثر من عمود للماكينة (المعرف والرقم المسلسل): الأول غير الفارغ
+        values = None
+        for alias in aliases:
+            if alias in columns:
+                column = frame[columns[alias]].astype(object).where(frame[columns[alias]].notna(), None)
+                values = column if values is None else values.where(values.notna(), column)
+        if values is None and target != "timestamp":
+            raise ValueError(f"عمود مفقود: {aliases[0]}")
+        normalized[target] = values
+    return normalized
+
+def _parse_reading_times(values, default):
+    """تحويل أوقات القراءات (ISO أولاً ثم يوم/شهر/سنة)؛ الفارغ يأخذ القيمة الافتراضية"""
+    present = values.notna() & (values.astype(str).str.strip() != "")
+    parsed = pd.to_datetime(values.where(present), errors="coerce", format="ISO8601")
+    rest = present & parsed.isna()
+    if rest.any():
+        parsed[rest] = pd.to_datetime(values[rest], errors="coerce", dayfirst=True, format="mixed")
+    return parsed.where(present, default), present & parsed.isna()
+
+def ingest_hours_readings(readings):
+    """إدخال قراءات ساعات تشغيل لعدة ماكينات دفعة واحدة
+
+    readings: DataFrame أو قائمة (معرف الماكينة أو الرقم المسلسل, الساعات, الوقت).
+    التحقق متجه لكل الصفوف، ثم حفظ واحد لكل الماكينات المتأثرة وإعادة حساب
+    مؤقتاتها في حساب واحد، وتسجيل كل قراءة مقبولة في سجل الصيانة.
+    تعيد {"machines", "machine_ids", "accepted", "rejected": DataFrame (الصف, الماكينة, الساعات, السبب)}.
+    """
+    frame = _normalize_readings(readings).reset_index(drop=True)
+    machines = load_machines_data()["machines"]
+    lookup = machine_index()
+    now = pd.Timestamp(datetime.now())
+
+    # مطابقة المعرف أولاً ثم الرقم المسلسل
+    keys = frame["machine"].astype(str).str.strip()
+    position = keys.map(lookup.position).astype(float)
+    unmatched = position.isna()
+    position[unmatched] = keys[unmatched].map(
+        lambda key: lookup.position[lookup.by_serial[key]["id"]] if key in lookup.by_serial else np.nan
+    ).astype(float)
+
+    hours = pd.to_numeric(frame["hours"], errors="coerce")
+    timestamps, bad_time = _parse_reading_times(frame["timestamp"], now)
+    current_hours = np.array([float(m.get("total_hours", 0) or 0) for m in machines] + [np.nan])
+    current = current_hours[position.fillna(len(machines)).astype(int).to_numpy()]
+
+    reason = pd.Series(None, index=frame.index, dtype=object)
+    checks = [
+        (position.isna(), "ماكينة غير معروفة"),
+        (hours.isna() | ~np.isfinite(hours) | (hours < 0), "قيمة ساعات غير صالحة"),
+        (bad_time, "تاريخ غير صالح"),
+        (hours < current, "أقل من الساعات الحالية")
+    ]
+    for mask, message in checks:
+        reason = reason.where(reason.notna() | ~mask, message)
+
+    # داخل الدفعة: قراءات كل ماكينة يجب ألا تتناقص مع الوقت
+    valid = reason.isna()
+    ordered = pd.DataFrame({"position": position[valid], "time": timestamps[valid], "hours": hours[valid]})
+    ordered = ordered.sort_values(["position", "time"], kind="stable")
+    previous_max = ordered.groupby("position")["hours"].cummax().groupby(ordered["position"]).shift()
+    decreasing = ordered.index[(ordered["hours"] < previous_max).to_numpy()]
+    reason[decreasing] = "أقل من قراءة سابقة للماكينة"
+
+    accepted = ordered.drop(index=decreasing)
+    latest = accepted.groupby("position").tail(1)
+
+    updated = {}
+    for pos, reading_hours in zip(latest["position"].astype(int), latest["hours"]):
+        # نسخة سطحية تكفي: save_machines تنسخ الماكينة قبل وضعها في الكاش
+        machine = dict(machines[pos])
+        machine["total_hours"] = float(reading_hours)
+        machine["updated_at"] = now.isoformat()
+        updated[pos] = machine
+
+    rejected = pd.DataFrame({
+        "الصف": frame.index + 1,
+        "الماكينة": frame["machine"],
+        "الساعات": frame["hours"],
+        "السبب": reason
+    })[reason.notna()].reset_index(drop=True)
+
+    if updated and not save_machines(list(updated.values())):
+        return {"machines": 0, "machine_ids": [], "accepted": 0, "rejected": rejected}
+
+    technician = st.session_state.get("username", "System")
+    log_history_events([
+        new_history_event(
+            "hours", updated[pos], hours=float(reading_hours), event_date=time_value.to_pydatetime(),
+            description="إدخال جماعي", technician=technician
+        )
+        for pos, time_value, reading_hours in zip(accepted["position"].astype(int), accepted["time"], accepted["hours"])
+    ])
+
+    return {
+        "machines": len(updated),
+        "machine_ids": [machine["id"] for machine in updated.values()],
+        "accepted": len(accepted),
+        "rejected": rejected
+    }
+
+def _read_hours_file(uploaded_file):
+    """قراءة ملف القراءات المرفوع (CSV أو Excel)"""
+    if uploaded_file.name.lower().endswith(".csv"):
+        return pd.read_csv(uploaded_file, dtype=object, encoding="utf-8-sig")
+    return pd.read_excel(uploaded_file, dtype=object)
 
 def update_machine_hours_ui():
     """تحديث ساعات تشغيل الماكينة"""
     st.header("🕐 تحديث ساعات التشغيل")
-    
+
+    if st.button("⬅️ رجوع", key="close_update_hours"):
+        st.session_state["show_update_hours"] = False
+        st.rerun()
+
     machines_data = load_machines_data()
-    
+
     if not machines_data["machines"]:
         st.info("ℹ️ لا توجد ماكينات مسجلة")
         return
-    
-    # اختيار الماكينة
-    machine_options = {m["name"]: m["id"] for m in machines_data["machines"]}
-    selected_machine_name = st.selectbox("اختر الماكينة", list(machine_options.keys()))
-    machine_id = machine_options[selected_machine_name]
-    
-    # العثور على الماكينة
-    machine = next((m for m in machines_data["machines"] if m["id"] == machine_id), None)
-    
-    if machine:
-        current_hours = machine.get("total_hours", 0)
-        
-        col1, col2 = st.columns(2)
-        with col1:
-            new_hours = st.number_input(
-                "الساعات الجديدة",
-                min_value=float(current_hours),
-                value=float(current_hours) + 8.0,
-                step=1.0
-            )
+
+    hours_tabs = st.tabs(["🛠️ ماكينة واحدة", "📥 إدخال جماعي"])
+
+    with hours_tabs[0]:
+        # اختيار الماكينة
+        machine_options = {m["name"]: m["id"] for m in machines_data["machines"]}
+        selected_machine_name = st.selectbox("اختر الماكينة", list(machine_options.keys()))
+        machine_id = machine_options[selected_machine_name]
         
-        with col2:
-            operation_date = st.date_input("تاريخ التشغيل", datetime.now())
+        # العثور على الماكينة
+        machine = get_machine(machine_id)
         
-        if st.button("💾 تحديث الساعات", key="update_hours"):
-            # تحديث ساعات الماكينة
-            machine["total_hours"] = new_hours
-            machine["updated_at"] = datetime.now().isoformat()
+        if machine:
+            current_hours = machine.get("total_hours", 0)
             
-            # تحديث مؤقتات الصيانة بناءً على الساعات الجديدة
-            for maint in machine.get("next_maintenance", []):
-                if maint["unit"] == "ساعات":
-                    maint["remaining"] = calculate_remaining_time(
-                        maint.get("next_date"),
-                        maint.get("next_hours"),
-                        new_hours
-                    )
+            col1, col2 = st.columns(2)
+            with col1:
+                new_hours = st.number_input(
+                    "الساعات الجديدة",
+                    min_value=float(current_hours),
+                    value=float(current_hours) + 8.0,
+                    step=1.0
+                )
             
-            # حفظ التغييرات
-            if save_machines_data(machines_data):
-                update_excel_with_machines(machines_data)
-                st.success(f"✅ تم تحديث ساعات الماكينة إلى {new_hours} ساعة")
-                st.rerun()
+            with col2:
+                operation_date = st.date_input("تاريخ التشغيل", datetime.now())
+            
+            if st.button("💾 تحديث الساعات", key="update_hours"):
+                machine = get_machine(machine_id, for_update=True)
+                
+                # تحديث ساعات الماكينة
+                machine["total_hours"] = new_hours
+                machine["updated_at"] = datetime.now().isoformat()
+                
+                # حفظ التغييرات
+                if save_machine(machine):
+                    log_history_events([new_history_event("hours", machine, hours=new_hours, event_date=operation_date)])
+                    update_excel_with_machines(load_machines_data(), dirty=[machine["id"]])
+                    st.success(f"✅ تم تحديث ساعات الماكينة إلى {new_hours} ساعة")
+                    st.rerun()
+
+    with hours_tabs[1]:
+        st.markdown("ملف CSV أو Excel بالأعمدة: **machine_id** أو **serial_number**، **hours**، و **timestamp** (اختياري)")
+        
+        uploaded_file = st.file_uploader("ملف القراءات", type=["csv", "xlsx"], key="hours_readings_file")
+        
+        if uploaded_file is not None and st.button("📥 إدخال القراءات", key="ingest_hours", type="primary"):
+            try:
+                result = ingest_hours_readings(_read_hours_file(uploaded_file))
+            except ValueError as e:
+                st.error(f"❌ {e}")
+            else:
+                if result["machines"]:
+                    update_excel_with_machines(load_machines_data(), dirty=result["machine_ids"])
+                    st.success(f"✅ تم إدخال {result['accepted']} قراءة لـ {result['machines']} ماكينة")
+                
+                if not result["rejected"].empty:
+                    st.warning(f"⚠️ تم رفض {len(result['rejected'])} صف")
+                    st.dataframe(result["rejected"], use_container_width=True, hide_index=True)
+
+def _maintenance_table(status_filter=()):
+    """جدول الصيانة الشامل لكل الماكينات (أو المطابق لفلتر الحالة فقط)
+
+    تقرأ البيانات بنفسها حتى لا يُحفظ في الكاش جدول أقدم من إصدار مفتاحه.
+    """
+    if status_filter:
+        all_maintenance = cached_report("maintenance_table", _maintenance_table)
+        return all_maintenance[all_maintenance["الحالة"].isin(status_filter)]
+
+    machines_data = load_machines_data()
+    remaining_by_entry = fleet_remaining(machines_data)
+    all_maintenance = []
+
+    for machine in machines_data["machines"]:
+        for maint in machine.get("next_maintenance", []):
+            remaining = remaining_by_entry.get((machine["id"], maint["type_id"]), {})
+            
+            all_maintenance.append({
+                "الماكينة": machine["name"],
+                "نوع الصيانة": maint["type_name"],
+                "آخر تاريخ": maint.get("last_date", "غير مسجل"),
+                "التاريخ التالي": maint.get("next_date", "غير محدد"),
+                "الساعات التالية": maint.get("next_hours", "غير محدد"),
+                "المتبقي (أيام)": remaining.get("days", "-"),
+                "المتبقي (ساعات)": remaining.get("hours", "-"),
+                "الحالة": remaining.get("status", "normal"),
+                "معرف الماكينة": machine["id"],
+                "معرف الصيانة": maint["type_id"]
+            })
+
+    return pd.DataFrame(all_maintenance)
+
+def _monthly_maintenance(year, month, include_projected=True):
+    """الصيانات المستحقة في شهر محدد مع توزيعها حسب النوع
+
+    تشمل الصيانات بالساعات المتوقع بلوغها خلال الشهر حسب معدل التشغيل،
+    والجدول مرتب حسب تاريخ الاستحقاق.
+    """
+    machines_data = load_machines_data()
+    remaining_by_entry = fleet_remaining(machines_data)
+    forecast = usage_forecast()
+    monthly_maintenance = []
+
+    # حدود الشهر كـ epoch ثم مقارنة عمود الاستحقاق المحسوب مرة واحدة
+    month_start = pd.Timestamp(year, month, 1)
+    month_end = month_start + pd.offsets.MonthBegin(1)
+    entries = [(machine, maint) for machine in machines_data["machines"] for maint in machine.get("next_maintenance", [])]
+    if len(forecast) != len(entries):
+        # البيانات تغيرت بعد حساب التوقع المحفوظ
+        forecast = _forecast_due(machines_data, usage_readings(), date.today())
+    due = forecast["projected"].to_numpy()
+    in_month = (due >= month_start.value) & (due < month_end.value)
+    if not include_projected:
+        in_month &= forecast["basis"].to_numpy() == "date"
+
+    for position in np.flatnonzero(in_month)[np.argsort(due[in_month], kind="stable")]:
+        machine, maint = entries[position]
+        usage_based = forecast["basis"].iat[position] == "usage"
+        monthly_maintenance.append({
+            "الماكينة": machine["name"],
+            "نوع الصيانة": maint["type_name"],
+            "التاريخ المخطط": _format_epoch_date(due[position]) if usage_based else maint["next_date"],
+            "الأساس": "معدل التشغيل (متوقع)" if usage_based else "تاريخ",
+            "النطاق المتوقع": format_forecast(due[position], forecast["earliest"].iat[position], forecast["latest"].iat[position]) if usage_based else "",
+            "الحالة": remaining_by_entry.get((machine["id"], maint["type_id"]), {}).get("status", "normal"),
+            "المكان": machine.get("location", "غير محدد")
+        })
+
+    monthly_df = pd.DataFrame(monthly_maintenance)
+    type_counts = monthly_df["نوع الصيانة"].value_counts() if monthly_maintenance else pd.Series(dtype=int)
+    return monthly_df, type_counts
+
+def _write_maintenance_table(path, status_filter):
+    """تصدير جدول الصيانة المفلتر إلى Excel"""
+    df = cached_report("maintenance_table", lambda: _maintenance_table(status_filter), status_filter)
+    _write_report_xlsx(path, [("جدول_الصيانة", list(df.columns), df.itertuples(index=False))])
 
 def maintenance_management_ui():
     """إدارة جدول الصيانة"""
     st.header("📊 إدارة الصيانة")
-    
+
     machines_data = load_machines_data()
-    
+
     # تبويبات للإدارة
     maint_tabs = st.tabs(["📅 عرض جميع المؤقتات", "⚙️ تعديل جدول الصيانة", "➕ إضافة نوع صيانة جديد"])
-    
+
     with maint_tabs[0]:
         st.subheader("📅 جدول الصيانة الشامل")
         
@@ -745,39 +4156,22 @@ def maintenance_management_ui():
             st.info("ℹ️ لا توجد ماكينات مسجلة")
             return
         
-        # إنشاء جدول شامل للصيانة
-        all_maintenance = []
-        
-        for machine in machines_data["machines"]:
-            for maint in machine.get("next_maintenance", []):
-                remaining = maint.get("remaining", {})
-                
-                all_maintenance.append({
-                    "الماكينة": machine["name"],
-                    "نوع الصيانة": maint["type_name"],
-                    "آخر تاريخ": maint.get("last_date", "غير مسجل"),
-                    "التاريخ التالي": maint.get("next_date", "غير محدد"),
-                    "الساعات التالية": maint.get("next_hours", "غير محدد"),
-                    "المتبقي (أيام)": remaining.get("days", "-"),
-                    "المتبقي (ساعات)": remaining.get("hours", "-"),
-                    "الحالة": remaining.get("status", "normal"),
-                    "معرف الماكينة": machine["id"],
-                    "معرف الصيانة": maint["type_id"]
-                })
+        # جدول شامل للصيانة (يُبنى مرة لكل إصدار بيانات ولكل فلتر)
+        all_maintenance = cached_report("maintenance_table", _maintenance_table)
         
-        if all_maintenance:
-            # تحويل إلى DataFrame
-            df = pd.DataFrame(all_maintenance)
-            
+        if not all_maintenance.empty:
             # فلترة حسب الحالة
             status_filter = st.multiselect(
                 "فلترة حسب الحالة",
                 ["normal", "warning", "critical", "overdue"],
                 default=["critical", "warning", "overdue"]
             )
+            status_filter = tuple(status_filter)
             
             if status_filter:
-                df = df[df["الحالة"].isin(status_filter)]
+                df = cached_report("maintenance_table", lambda: _maintenance_table(status_filter), status_filter)
+            else:
+                df = all_maintenance
             
             # تلوين الصفوف حسب الحالة
             def color_status(val):
@@ -789,25 +4183,64 @@ def maintenance_management_ui():
                 }
                 return color_map.get(val, "")
             
-            styled_df = df.style.applymap(color_status, subset=["الحالة"])
+            styled_df = df.style.map(color_status, subset=["الحالة"])
             
-            st.dataframe(styled_df, use_container_width=True, height=400)
+            table_state = st.dataframe(
+                styled_df,
+                use_container_width=True,
+                height=400,
+                on_select="rerun",
+                selection_mode="multi-row",
+                # التحديد يخص هذه النسخة من الجدول: يبدأ فارغاً بعد أي حفظ أو تغيير للفلتر
+                # حتى لا تشير أرقام الصفوف القديمة إلى صيانات أخرى
+                key=f"maintenance_table_select_{machines_data_version()}_{'_'.join(status_filter)}"
+            )
+            
+            # عمليات جماعية على الصفوف المحددة (حفظ واحد لكل العملية)
+            selected_rows = [row for row in table_state.selection.rows if row < len(df)]
+            if selected_rows:
+                selected = df.iloc[selected_rows]
+                targets = list(zip(selected["معرف الماكينة"], selected["معرف الصيانة"]))
+                st.markdown(f"**✔️ تم تحديد {len(targets)} صيانة**")
+                
+                col1, col2, col3 = st.columns([1, 1, 1])
+                
+                with col1:
+                    if st.button("✅ تسجيل إتمام المحدد", key="bulk_complete", type="primary"):
+                        record_maintenances(targets)
+                
+                with col2:
+                    bulk_interval = st.number_input("الفترة الجديدة (بوحدة كل صيانة)", min_value=1, value=100, key="bulk_interval")
+                
+                with col3:
+                    if st.button("✏️ تطبيق الفترة على المحدد", key="bulk_interval_apply"):
+                        operations = [
+                            {"action": "interval", "machine_id": machine_id, "type_id": type_id, "interval": bulk_interval}
+                            for machine_id, type_id in targets
+                        ]
+                        if apply_maintenance_operations(operations):
+                            st.success(f"✅ تم تحديث الفترة لـ {len(targets)} صيانة")
+                            st.rerun()
             
             # خيارات التصدير
             if st.button("📥 تصدير إلى Excel"):
-                buffer = io.BytesIO()
-                with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-                    df.to_excel(writer, sheet_name='جدول_الصيانة', index=False)
-                
+                st.session_state["maintenance_table_export"] = status_filter
+            
+            if st.session_state.get("maintenance_table_export") == status_filter:
+                file_path = cached_report_file(
+                    "maintenance_table", "xlsx",
+                    lambda path: _write_maintenance_table(path, status_filter),
+                    status_filter
+                )
                 st.download_button(
                     label="💾 تنزيل الملف",
-                    data=buffer.getvalue(),
+                    data=_deferred_file(file_path),
                     file_name=f"جدول_الصيانة_{datetime.now().strftime('%Y%m%d')}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                    mime=XLSX_MIME
                 )
         else:
             st.info("ℹ️ لا توجد صيانة مجدولة")
-    
+
     with maint_tabs[1]:
         st.subheader("⚙️ تعديل جدول الصيانة")
         
@@ -821,9 +4254,10 @@ def maintenance_management_ui():
         machine_id = machine_options[selected_machine]
         
         # العثور على الماكينة
-        machine = next((m for m in machines_data["machines"] if m["id"] == machine_id), None)
+        machine = get_machine(machine_id)
         
         if machine and machine.get("next_maintenance"):
+            edit_base(machine_id)
             st.markdown(f"#### تعديل صيانة: {machine['name']}")
             
             for maint in machine["next_maintenance"]:
@@ -852,33 +4286,30 @@ def maintenance_management_ui():
                         )
                     
                     if st.button("💾 حفظ التعديلات", key=f"save_{machine_id}_{maint['type_id']}"):
+                        # التعديل يُطبق على النسخة التي عُرضت حتى تُدمج مع ما حفظته جلسة أخرى بعدها
+                        base = edit_base(machine_id, maint["type_id"])
+                        machine = _copy_machine(base)
+                        maint = next(t for t in machine["next_maintenance"] if t["type_id"] == maint["type_id"])
+                        
                         # تحديث البيانات
                         maint["last_date"] = new_last_date if new_last_date else None
                         maint["last_hours"] = new_last_hours
                         maint["interval"] = new_interval
                         
                         # إعادة حساب التواريخ التالية
-                        if maint["unit"] in ["أيام", "أسابيع", "شهور", "سنوات"]:
-                            maint["next_date"] = calculate_next_date(
-                                new_last_date,
-                                new_interval,
-                                maint["unit"]
-                            )
-                        else:
-                            maint["next_hours"] = calculate_next_hours(
-                                new_last_hours,
-                                new_interval
-                            )
+                        _reschedule(maint)
                         
                         # تحديث وقت التعديل
                         machine["updated_at"] = datetime.now().isoformat()
                         
                         # حفظ التغييرات
-                        if save_machines_data(machines_data):
-                            update_excel_with_machines(machines_data)
+                        saved = save_machines([machine], bases={machine_id: base})
+                        st.session_state.pop(f"edit_base_{machine_id}", None)
+                        if saved:
+                            update_excel_with_machines(load_machines_data(), dirty=[machine_id])
                             st.success(f"✅ تم تحديث {maint['type_name']}")
                             st.rerun()
-    
+
     with maint_tabs[2]:
         st.subheader("➕ إضافة نوع صيانة جديد")
         
@@ -912,192 +4343,247 @@ def maintenance_management_ui():
                     "default_interval": default_interval
                 }
                 
+                machines_data = load_machines_data(for_update=True)
                 machines_data["maintenance_types"].append(new_type)
                 
-                if save_machines_data(machines_data):
-                    update_excel_with_machines(machines_data)
+                if save_catalog(machines_data["maintenance_types"], machines_data["settings"]):
+                    update_excel_with_machines(load_machines_data())
                     st.success(f"✅ تم إضافة نوع الصيانة '{type_name}' بنجاح")
                     st.rerun()
 
+def _turn_timers_page(step, total_pages):
+    """الانتقال للصفحة السابقة أو التالية من المؤقتات في حدود عدد الصفحات"""
+    page = st.session_state.get("timers_page", 0) + step
+    st.session_state["timers_page"] = max(0, min(page, total_pages - 1))
+
+def _timers_page_form(all_timers):
+    """بطاقات الصفحة في أعمدة داخل نموذج واحد حتى يكون التسجيل دفعة واحدة"""
+    # الاختيارات تُمسح بعد الإرسال حتى لا يُسجل الإتمام مرة ثانية بإرسال متكرر
+    with st.form("timers_page_form", clear_on_submit=True):
+        selected = []
+        cols_per_row = 3
+        for i in range(0, len(all_timers), cols_per_row):
+            cols = st.columns(cols_per_row)
+            
+            for j in range(cols_per_row):
+                idx = i + j
+                if idx < len(all_timers):
+                    timer = all_timers[idx]
+                    remaining = timer["remaining"]
+                    status = remaining.get("status", "normal")
+                    color = get_status_color(status)
+                    
+                    with cols[j]:
+                        # بطاقة المؤقت
+                        with st.container():
+                            st.markdown(f"""
+                            <div style="border: 2px solid {color}; border-radius: 10px; padding: 15px; margin: 10px 0;">
+                                <h4 style="color: {color}; margin: 0;">{timer['machine']}</h4>
+                                <p style="margin: 5px 0;"><strong>{timer['type']}</strong></p>
+                            """, unsafe_allow_html=True)
+                            
+                            # عرض الوقت المتبقي
+                            if remaining.get("days") is not None:
+                                days = remaining["days"]
+                                if days < 0:
+                                    st.markdown(f"<p style='color: {color};'><strong>متأخر: {abs(days)} يوم</strong></p>", unsafe_allow_html=True)
+                                else:
+                                    st.markdown(f"<p style='color: {color};'><strong>متبقي: {days} يوم</strong></p>", unsafe_allow_html=True)
+                            
+                            elif remaining.get("hours") is not None:
+                                hours = remaining["hours"]
+                                if hours < 0:
+                                    st.markdown(f"<p style='color: {color};'><strong>متأخر: {abs(hours):.0f} ساعة</strong></p>", unsafe_allow_html=True)
+                                else:
+                                    st.markdown(f"<p style='color: {color};'><strong>متبقي: {hours:.0f} ساعة</strong></p>", unsafe_allow_html=True)
+                            
+                            # التاريخ التالي
+                            if timer["next_date"]:
+                                st.markdown(f"<p>التاريخ التالي: {timer['next_date']}</p>", unsafe_allow_html=True)
+                            elif timer["forecast"] and timer["forecast"][3] == "usage":
+                                st.markdown(f"<p>الاستحقاق المتوقع: {format_forecast(*timer['forecast'][:3])}</p>", unsafe_allow_html=True)
+                            
+                            # شريط التقدم
+                            if remaining.get("percentage") is not None:
+                                st.progress(remaining["percentage"] / 100)
+                            
+                            st.markdown("</div>", unsafe_allow_html=True)
+                            
+                            # تحديد المؤقت للتسجيل الجماعي
+                            if st.checkbox("✅ تمت الصيانة", key=f"done_timer_{timer['machine_id']}_{timer['type_id']}"):
+                                selected.append((timer["machine_id"], timer["type_id"]))
+        
+        if st.form_submit_button("💾 تسجيل الصيانات المحددة", type="primary"):
+            if selected:
+                # record_maintenances تعيد التشغيل مباشرة، فتُمسح الاختيارات قبلها
+                for machine_id, type_id in selected:
+                    st.session_state.pop(f"done_timer_{machine_id}_{type_id}", None)
+                record_maintenances(selected)
+            else:
+                st.warning("⚠️ لم يتم تحديد أي مؤقت")
+
 def timers_dashboard_ui():
     """لوحة المؤقتات التنازلية"""
     st.header("⏰ المؤقتات التنازلية")
-    
+
     machines_data = load_machines_data()
-    
+
     if not machines_data["machines"]:
         st.info("ℹ️ لا توجد ماكينات مسجلة")
         return
-    
+
     # فلترة المؤقتات
     st.subheader("🔍 فلترة المؤقتات")
-    
+
     filter_col1, filter_col2, filter_col3 = st.columns(3)
-    
+
     with filter_col1:
         machine_filter = st.multiselect(
             "الماكينات",
             [m["name"] for m in machines_data["machines"]],
             default=None
         )
-    
+
     with filter_col2:
         status_filter = st.multiselect(
             "الحالة",
             ["normal", "warning", "critical", "overdue"],
             default=["critical", "warning"]
         )
-    
+
     with filter_col3:
         type_filter = st.multiselect(
             "نوع الصيانة",
-            list(set([t["name"] for t in machines_data["maintenance_types"]]))
+            machine_index().type_names()
         )
-    
+
     st.markdown("---")
-    
-    # جمع جميع المؤقتات
-    all_timers = []
-    
-    for machine in machines_data["machines"]:
-        if machine_filter and machine["name"] not in machine_filter:
+
+    # التحكم في الترتيب وحجم الصفحة
+    sort_col, horizon_col, size_col = st.columns(3)
+
+    with sort_col:
+        sort_by = st.selectbox("الترتيب", ["الأكثر حراجة", "الاستحقاق المتوقع", "اسم الماكينة", "نوع الصيانة"], key="timers_sort")
+
+    with horizon_col:
+        horizon = st.selectbox("الاستحقاق المتوقع خلال", ["الكل", "7 أيام", "30 يوم", "90 يوم"], key="timers_horizon")
+
+    with size_col:
+        page_size = st.selectbox("عدد المؤقتات في الصفحة", [12, 24, 48, 96], key="timers_page_size")
+
+    # جمع مفاتيح المؤقتات المطابقة فقط من فهرس الاستحقاق (مرتبة: الأكثر حراجة ثم الأقرب استحقاقاً)
+    index = due_index()
+    lookup = machine_index()
+    machine_ids = lookup.ids_named(machine_filter) if machine_filter else None
+    type_names = set(type_filter)
+    forecasts = forecast_lookup()
+    horizon_days = {"7 أيام": 7, "30 يوم": 30, "90 يوم": 90}.get(horizon)
+    due_limit = (pd.Timestamp(date.today()).value + horizon_days * DAY_NS) if horizon_days else None
+    matched_keys = []
+
+    for key in index.next_due(statuses=status_filter):
+        if machine_ids is not None and key[0] not in machine_ids:
             continue
         
-        for maint in machine.get("next_maintenance", []):
-            if type_filter and maint["type_name"] not in type_filter:
-                continue
-            
-            remaining = maint.get("remaining", {})
-            
-            if status_filter and remaining.get("status") not in status_filter:
-                continue
-            
-            all_timers.append({
-                "machine": machine["name"],
-                "type": maint["type_name"],
-                "remaining": remaining,
-                "next_date": maint.get("next_date"),
-                "next_hours": maint.get("next_hours"),
-                "machine_id": machine["id"],
-                "type_id": maint["type_id"]
-            })
-    
+        if type_names and index.refs[key][1]["type_name"] not in type_names:
+            continue
+        
+        if due_limit is not None and not (NO_DATE < forecasts.get(key, (NO_DATE,))[0] < due_limit):
+            continue
+        
+        matched_keys.append(key)
+
     # عرض المؤقتات
-    if not all_timers:
+    if not matched_keys:
         st.info("ℹ️ لا توجد مؤقتات مطابقة للفلتر")
         return
-    
-    # ترتيب المؤقتات (الأكثر حراجة أولاً)
-    status_order = {"overdue": 0, "critical": 1, "warning": 2, "normal": 3}
-    all_timers.sort(key=lambda x: status_order.get(x["remaining"].get("status", "normal"), 4))
-    
-    # عرض المؤقتات في أعمدة
-    cols_per_row = 3
-    for i in range(0, len(all_timers), cols_per_row):
-        cols = st.columns(cols_per_row)
-        
-        for j in range(cols_per_row):
-            idx = i + j
-            if idx < len(all_timers):
-                timer = all_timers[idx]
-                remaining = timer["remaining"]
-                status = remaining.get("status", "normal")
-                color = get_status_color(status)
-                
-                with cols[j]:
-                    # بطاقة المؤقت
-                    with st.container():
-                        st.markdown(f"""
-                        <div style="border: 2px solid {color}; border-radius: 10px; padding: 15px; margin: 10px 0;">
-                            <h4 style="color: {color}; margin: 0;">{timer['machine']}</h4>
-                            <p style="margin: 5px 0;"><strong>{timer['type']}</strong></p>
-                        """, unsafe_allow_html=True)
-                        
-                        # عرض الوقت المتبقي
-                        if remaining.get("days") is not None:
-                            days = remaining["days"]
-                            if days < 0:
-                                st.markdown(f"<p style='color: {color};'><strong>متأخر: {abs(days)} يوم</strong></p>", unsafe_allow_html=True)
-                            else:
-                                st.markdown(f"<p style='color: {color};'><strong>متبقي: {days} يوم</strong></p>", unsafe_allow_html=True)
-                        
-                        elif remaining.get("hours") is not None:
-                            hours = remaining["hours"]
-                            if hours < 0:
-                                st.markdown(f"<p style='color: {color};'><strong>متأخر: {abs(hours):.0f} ساعة</strong></p>", unsafe_allow_html=True)
-                            else:
-                                st.markdown(f"<p style='color: {color};'><strong>متبقي: {hours:.0f} ساعة</strong></p>", unsafe_allow_html=True)
-                        
-                        # التاريخ التالي
-                        if timer["next_date"]:
-                            st.markdown(f"<p>التاريخ التالي: {timer['next_date']}</p>", unsafe_allow_html=True)
-                        
-                        # شريط التقدم
-                        if remaining.get("percentage") is not None:
-                            st.progress(remaining["percentage"] / 100)
-                        
-                        st.markdown("</div>", unsafe_allow_html=True)
-                        
-                        # زر تسجيل الإنجاز
-                        if st.button("✅ تمت الصيانة", key=f"done_timer_{timer['machine_id']}_{timer['type_id']}"):
-                            record_maintenance(timer["machine_id"], timer["type_id"])
-    
+
+    if sort_by == "الاستحقاق المتوقع":
+        # ما لا يمكن توقعه يأتي في النهاية
+        matched_keys.sort(key=lambda k: (forecasts.get(k, (NO_DATE,))[0] == NO_DATE, forecasts.get(k, (NO_DATE,))[0]))
+    elif sort_by == "اسم الماكينة":
+        matched_keys.sort(key=lambda k: index.refs[k][0]["name"])
+    elif sort_by == "نوع الصيانة":
+        matched_keys.sort(key=lambda k: index.refs[k][1]["type_name"])
+
+    # مؤشر الصفحة يعود للبداية عند تغيير الفلاتر أو الترتيب
+    view_signature = (tuple(machine_filter), tuple(status_filter), tuple(type_filter), sort_by, horizon, page_size)
+    if st.session_state.get("timers_view") != view_signature:
+        st.session_state["timers_view"] = view_signature
+        st.session_state["timers_page"] = 0
+
+    total_pages = (len(matched_keys) + page_size - 1) // page_size
+    page = st.session_state["timers_page"] = min(st.session_state.get("timers_page", 0), total_pages - 1)
+
+    nav_prev, nav_label, nav_next = st.columns([1, 2, 1])
+
+    # تغيير الصفحة في callback قبل إعادة التشغيل حتى يُرسم الزران بحالة الصفحة الجديدة
+    with nav_prev:
+        st.button("◀ السابق", key="timers_prev", disabled=page == 0, on_click=_turn_timers_page, args=(-1, total_pages))
+
+    with nav_next:
+        st.button("التالي ▶", key="timers_next", disabled=page >= total_pages - 1, on_click=_turn_timers_page, args=(1, total_pages))
+
+    with nav_label:
+        st.markdown(f"**الصفحة {page + 1} من {total_pages}** ({len(matched_keys)} مؤقت)")
+
+    # تجهيز الصفحة الظاهرة فقط
+    page_keys = matched_keys[page * page_size:(page + 1) * page_size]
+
+    if st.session_state.get("live_mode"):
+        # شاشات العرض: بطاقات للقراءة فقط تتحدث وحدها دون إعادة تشغيل الصفحة
+        live_section(_live_timer_cards, page_keys)
+    else:
+        _timers_page_form([_timer_view(index, forecasts, key) for key in page_keys])
+
     # إحصائيات المؤقتات
     st.markdown("---")
     st.subheader("📊 إحصائيات المؤقتات")
-    
+
     status_counts = {"normal": 0, "warning": 0, "critical": 0, "overdue": 0}
-    for timer in all_timers:
-        status = timer["remaining"].get("status", "normal")
+    for key in matched_keys:
+        status = index.entries[key].get("status", "normal")
         status_counts[status] = status_counts.get(status, 0) + 1
-    
+
     # عرض جدول الإحصائيات
     stats_df = pd.DataFrame({
         "الحالة": list(status_counts.keys()),
         "العدد": list(status_counts.values()),
-        "النسبة": [f"{(count/len(all_timers)*100):.1f}%" for count in status_counts.values()]
+        "النسبة": [f"{(count/len(matched_keys)*100):.1f}%" for count in status_counts.values()]
     })
-    
+
     st.dataframe(stats_df, use_container_width=True)
 
 def reports_ui():
     """التقارير والإحصائيات"""
     st.header("📈 التقارير والإحصائيات")
-    
+
     machines_data = load_machines_data()
-    
+
     if not machines_data["machines"]:
         st.info("ℹ️ لا توجد بيانات لتوليد التقارير")
         return
-    
+
     # تبويبات التقارير
-    report_tabs = st.tabs(["📊 إحصائيات عامة", "📅 تقرير الصيانة", "📉 تحليل الأداء", "📄 تصدير التقارير"])
-    
+    report_tabs = st.tabs(["📊 إحصائيات عامة", "📅 تقرير الصيانة", "📉 تحليل الأداء", "📄 تصدير التقارير", "📜 سجل الصيانة"])
+
     with report_tabs[0]:
         st.subheader("📊 إحصائيات النظام")
         
         # إحصائيات عامة
         col1, col2 = st.columns(2)
         
+        # الإجماليات محسوبة مرة للخادم كله ومنشورة لكل الجلسات
+        stats = fleet_stats()
+        
         with col1:
-            # حساب إجمالي ساعات التشغيل
-            total_hours = sum(m.get("total_hours", 0) for m in machines_data["machines"])
-            st.metric("🕐 إجمالي ساعات التشغيل", f"{total_hours:,} ساعة")
-            
-            # متوسط ساعات التشغيل
-            avg_hours = total_hours / len(machines_data["machines"]) if machines_data["machines"] else 0
-            st.metric("📊 متوسط الساعات", f"{avg_hours:,.0f} ساعة")
-            
-            # عدد أنواع الصيانة
-            maint_types_count = len(machines_data["maintenance_types"])
-            st.metric("⚙️ أنواع الصيانة", maint_types_count)
+            st.metric("🕐 إجمالي ساعات التشغيل", f"{stats['total_hours']:,} ساعة")
+            st.metric("📊 متوسط الساعات", f"{stats['avg_hours']:,.0f} ساعة")
+            st.metric("⚙️ أنواع الصيانة", stats["maintenance_types"])
         
         with col2:
             # توزيع الماكينات حسب الموقع
-            locations = {}
-            for machine in machines_data["machines"]:
-                loc = machine.get("location", "غير محدد")
-                locations[loc] = locations.get(loc, 0) + 1
+            locations = stats["locations"]
             
             st.markdown("#### 🗺️ توزيع الماكينات حسب الموقع")
             for loc, count in locations.items():
@@ -1105,10 +4591,7 @@ def reports_ui():
         
         # مخطط أعمدة بسيط لتوزيع الماكينات
         if machines_data["machines"]:
-            location_counts = {}
-            for machine in machines_data["machines"]:
-                loc = machine.get("location", "غير محدد")
-                location_counts[loc] = location_counts.get(loc, 0) + 1
+            location_counts = stats["locations"]
             
             # عرض كجدول
             location_df = pd.DataFrame({
@@ -1117,7 +4600,7 @@ def reports_ui():
             })
             
             st.dataframe(location_df, use_container_width=True)
-    
+
     with report_tabs[1]:
         st.subheader("📅 تقرير الصيانة الشهري")
         
@@ -1125,33 +4608,16 @@ def reports_ui():
         current_year = datetime.now().year
         year = st.selectbox("السنة", range(current_year-5, current_year+1), index=5)
         month = st.selectbox("الشهر", range(1, 13), index=datetime.now().month-1)
+        include_projected = st.checkbox("تضمين الصيانات بالساعات المتوقعة حسب معدل التشغيل", value=True, key="monthly_projected")
         
         # جمع بيانات الصيانة للشهر المحدد
-        monthly_maintenance = []
+        monthly_df, type_counts = cached_report(
+            "monthly",
+            lambda: _monthly_maintenance(year, month, include_projected),
+            year, month, include_projected, len(_history_log())
+        )
         
-        for machine in machines_data["machines"]:
-            for maint in machine.get("next_maintenance", []):
-                next_date = maint.get("next_date")
-                if next_date:
-                    try:
-                        maint_date = pd.to_datetime(next_date, dayfirst=True)
-                        if maint_date.year == year and maint_date.month == month:
-                            monthly_maintenance.append({
-                                "الماكينة": machine["name"],
-                                "نوع الصيانة": maint["type_name"],
-                                "التاريخ المخطط": next_date,
-                                "الحالة": maint.get("remaining", {}).get("status", "normal"),
-                                "المكان": machine.get("location", "غير محدد")
-                            })
-                    except:
-                        pass
-        
-        if monthly_maintenance:
-            monthly_df = pd.DataFrame(monthly_maintenance)
-            
-            # توزيع الصيانة حسب النوع
-            type_counts = monthly_df["نوع الصيانة"].value_counts()
-            
+        if not monthly_df.empty:
             col1, col2 = st.columns([2, 1])
             
             with col1:
@@ -1163,24 +4629,15 @@ def reports_ui():
                     st.markdown(f"**{type_name}:** {count}")
         else:
             st.info(f"ℹ️ لا توجد صيانة مجدولة لشهر {month}/{year}")
-    
+
     with report_tabs[2]:
         st.subheader("📉 تحليل أداء الصيانة")
         
         # حساب نسبة التزام الصيانة
-        total_scheduled = 0
-        total_on_time = 0
-        total_delayed = 0
-        
-        for machine in machines_data["machines"]:
-            for maint in machine.get("next_maintenance", []):
-                total_scheduled += 1
-                status = maint.get("remaining", {}).get("status", "normal")
-                
-                if status == "overdue":
-                    total_delayed += 1
-                else:
-                    total_on_time += 1
+        status_counts = fleet_stats()["status_counts"]
+        total_scheduled = sum(status_counts.values())
+        total_delayed = status_counts["overdue"]
+        total_on_time = total_scheduled - total_delayed
         
         if total_scheduled > 0:
             on_time_percentage = (total_on_time / total_scheduled) * 100
@@ -1196,216 +4653,185 @@ def reports_ui():
             
             with col3:
                 st.metric("⏰ متأخر", f"{delayed_percentage:.1f}%")
-    
+
     with report_tabs[3]:
         st.subheader("📄 تصدير التقارير")
         
         col1, col2 = st.columns(2)
         
         with col1:
-            report_type = st.selectbox(
-                "نوع التقرير",
-                ["تقرير الماكينات", "جدول الصيانة", "تقرير المؤقتات", "التقرير الشامل"]
-            )
+            report_type = st.selectbox("نوع التقرير", REPORT_TYPES)
         
         with col2:
             format_type = st.radio("التنسيق", ["Excel", "CSV"])
         
         if st.button("🚀 إنشاء وتصدير التقرير", type="primary"):
             with st.spinner("جاري إنشاء التقرير..."):
-                # إنشاء DataFrame بناءً على نوع التقرير
-                if report_type == "تقرير الماكينات":
-                    data = []
-                    for machine in machines_data["machines"]:
-                        data.append({
-                            "اسم الماكينة": machine["name"],
-                            "الموديل": machine.get("model", ""),
-                            "الرقم المسلسل": machine.get("serial_number", ""),
-                            "المكان": machine.get("location", ""),
-                            "تاريخ التركيب": machine.get("installation_date", ""),
-                            "ساعات التشغيل": machine.get("total_hours", 0),
-                            "الحالة": machine.get("status", ""),
-                            "عدد أنواع الصيانة": len(machine.get("next_maintenance", []))
-                        })
-                    
-                    df = pd.DataFrame(data)
-                
-                elif report_type == "جدول الصيانة":
-                    data = []
-                    for machine in machines_data["machines"]:
-                        for maint in machine.get("next_maintenance", []):
-                            remaining = maint.get("remaining", {})
-                            data.append({
-                                "الماكينة": machine["name"],
-                                "نوع الصيانة": maint["type_name"],
-                                "آخر تاريخ": maint.get("last_date", ""),
-                                "التاريخ التالي": maint.get("next_date", ""),
-                                "الساعات التالية": maint.get("next_hours", ""),
-                                "المتبقي (أيام)": remaining.get("days", ""),
-                                "المتبقي (ساعات)": remaining.get("hours", ""),
-                                "الحالة": remaining.get("status", ""),
-                                "الفترة": f"{maint['interval']} {maint['unit']}"
-                            })
-                    
-                    df = pd.DataFrame(data)
-                
-                elif report_type == "تقرير المؤقتات":
-                    data = []
-                    for machine in machines_data["machines"]:
-                        for maint in machine.get("next_maintenance", []):
-                            remaining = maint.get("remaining", {})
-                            data.append({
-                                "الماكينة": machine["name"],
-                                "نوع الصيانة": maint["type_name"],
-                                "حالة المؤقت": remaining.get("status", ""),
-                                "نسبة الإنجاز": f"{remaining.get('percentage', 0):.1f}%",
-                                "ملاحظات": "🔴 تحتاج صيانة عاجلة" if remaining.get("status") == "critical" else
-                                          "🟡 تحتاج صيانة قريباً" if remaining.get("status") == "warning" else
-                                          "🟢 تحت السيطرة" if remaining.get("status") == "normal" else
-                                          "⚫ متأخرة"
-                            })
-                    
-                    df = pd.DataFrame(data)
-                
-                else:  # التقرير الشامل
-                    # سيتضمن جميع البيانات
-                    df_machines = pd.DataFrame([{
-                        "اسم الماكينة": m["name"],
-                        "الموديل": m.get("model", ""),
-                        "الرقم المسلسل": m.get("serial_number", ""),
-                        "المكان": m.get("location", ""),
-                        "ساعات التشغيل": m.get("total_hours", 0),
-                        "الحالة": m.get("status", "")
-                    } for m in machines_data["machines"]])
-                    
-                    # إنشاء ملف Excel متعدد الأوراق
-                    buffer = io.BytesIO()
-                    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-                        # ورقة الماكينات
-                        df_machines.to_excel(writer, sheet_name='الماكينات', index=False)
-                        
-                        # ورقة الصيانة
-                        maint_data = []
-                        for machine in machines_data["machines"]:
-                            for maint in machine.get("next_maintenance", []):
-                                maint_data.append({
-                                    "الماكينة": machine["name"],
-                                    "نوع الصيانة": maint["type_name"],
-                                    "التاريخ التالي": maint.get("next_date", ""),
-                                    "الحالة": maint.get("remaining", {}).get("status", "")
-                                })
-                        
-                        maint_df = pd.DataFrame(maint_data)
-                        maint_df.to_excel(writer, sheet_name='الصيانة', index=False)
-                        
-                        # ورقة الإحصائيات
-                        stats_data = {
-                            "المعيار": ["عدد الماكينات", "إجمالي ساعات التشغيل", "عدد أنواع الصيانة", "تاريخ التقرير"],
-                            "القيمة": [
-                                len(machines_data["machines"]),
-                                sum(m.get("total_hours", 0) for m in machines_data["machines"]),
-                                len(machines_data["maintenance_types"]),
-                                datetime.now().strftime("%d/%m/%Y %H:%M")
-                            ]
-                        }
-                        
-                        stats_df = pd.DataFrame(stats_data)
-                        stats_df.to_excel(writer, sheet_name='الإحصائيات', index=False)
-                    
-                    file_data = buffer.getvalue()
-                    file_name = f"التقرير_الشامل_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx"
-                    mime_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                
-                if report_type != "التقرير الشامل":
-                    if format_type == "Excel":
-                        buffer = io.BytesIO()
-                        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-                            df.to_excel(writer, index=False, sheet_name='تقرير')
-                        file_data = buffer.getvalue()
-                        file_name = f"{report_type}_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx"
-                        mime_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                    
-                    elif format_type == "CSV":
-                        file_data = df.to_csv(index=False, encoding='utf-8-sig')
-                        file_name = f"{report_type}_{datetime.now().strftime('%Y%m%d_%H%M')}.csv"
-                        mime_type = "text/csv"
-                
-                # زر التحميل
-                st.download_button(
-                    label="📥 تنزيل التقرير",
-                    data=file_data,
-                    file_name=file_name,
-                    mime=mime_type
-                )
-                
-                st.success("✅ تم إنشاء التقرير بنجاح!")
+                build_report_export(report_type, format_type)
+            st.session_state["report_export"] = (report_type, format_type)
+            st.success("✅ تم إنشاء التقرير بنجاح!")
+        
+        # زر التحميل يبقى ظاهراً؛ الملف يُقرأ من القرص عند الضغط فقط ويُعاد توليده إذا تغيرت البيانات
+        if st.session_state.get("report_export") == (report_type, format_type):
+            file_path, extension, mime_type = build_report_export(report_type, format_type)
+            file_label = report_type.replace(" ", "_") if report_type == "التقرير الشامل" else report_type
+            st.download_button(
+                label="📥 تنزيل التقرير",
+                data=_deferred_file(file_path),
+                file_name=f"{file_label}_{datetime.now().strftime('%Y%m%d_%H%M')}.{extension}",
+                mime=mime_type
+            )
 
-def update_excel_with_machines(machines_data):
-    """تحديث ملف Excel ببيانات الماكينات"""
-    try:
-        # إنشاء DataFrames
-        machines_list = []
-        maintenance_list = []
+    with report_tabs[4]:
+        st.subheader("📜 سجل الصيانة")
+        
+        col1, col2, col3 = st.columns(3)
+        
+        with col1:
+            history_machines = {"كل الماكينات": None}
+            history_machines.update({m["name"]: m["id"] for m in machines_data["machines"]})
+            history_machine = st.selectbox("الماكينة", list(history_machines.keys()), key="history_machine")
+        
+        with col2:
+            history_from = st.date_input("من تاريخ", value=date.today() - timedelta(days=30), key="history_from")
+        
+        with col3:
+            history_to = st.date_input("إلى تاريخ", value=date.today(), key="history_to")
         
-        for machine in machines_data["machines"]:
-            # بيانات الماكينة الأساسية
-            machines_list.append({
+        history_types = {"الكل": None, "إتمام صيانة": "completion", "قراءة ساعات": "hours"}
+        history_type = st.radio("نوع الحدث", list(history_types.keys()), horizontal=True, key="history_type")
+        
+        events = _history_log().query(
+            machine_id=history_machines[history_machine],
+            since=datetime.combine(history_from, datetime.min.time()).isoformat(),
+            until=datetime.combine(history_to, datetime.max.time()).isoformat(),
+            event_type=history_types[history_type]
+        )
+        
+        if events:
+            machines_by_id = machine_index().by_id
+            history_df = pd.DataFrame([{
+                "الوقت": event["timestamp"][:16].replace("T", " "),
+                "الماكينة": machines_by_id[event["machine_id"]]["name"] if event["machine_id"] in machines_by_id else event["machine_id"],
+                "الحدث": "إتمام صيانة" if event["event_type"] == "completion" else "قراءة ساعات",
+                "نوع الصيانة": event.get("maintenance_type") or "",
+                "التاريخ": event.get("date", ""),
+                "الساعات": event.get("hours", ""),
+                "التاريخ السابق": event.get("previous_date") or "",
+                "الساعات السابقة": event.get("previous_hours") if event.get("previous_hours") is not None else "",
+                "الفني": event.get("technician", "")
+            } for event in reversed(events)])
+            
+            st.dataframe(history_df, use_container_width=True, hide_index=True)
+            st.caption(f"عدد الأحداث: {len(events)}")
+        else:
+            st.info("📭 لا توجد أحداث في الفترة المحددة")
+
+def _excel_machine_records(machines, remaining_by_entry):
+    """صفوف ورقتي Machines و Maintenance_Schedule لمجموعة ماكينات"""
+    machines_list = []
+    maintenance_list = []
+    for machine in machines:
+        # بيانات الماكينة الأساسية
+        machines_list.append({
+            "machine_id": machine["id"],
+            "name": machine["name"],
+            "model": machine.get("model", ""),
+            "serial_number": machine.get("serial_number", ""),
+            "location": machine.get("location", ""),
+            "installation_date": machine.get("installation_date", ""),
+            "total_hours": machine.get("total_hours", 0),
+            "status": machine.get("status", "active"),
+            "notes": machine.get("notes", ""),
+            "created_at": machine.get("created_at", ""),
+            "updated_at": machine.get("updated_at", "")
+        })
+        
+        # بيانات الصيانة
+        for maint in machine.get("next_maintenance", []):
+            maintenance_list.append({
+                "maintenance_id": f"{machine['id']}_{maint['type_id']}",
                 "machine_id": machine["id"],
-                "name": machine["name"],
-                "model": machine.get("model", ""),
-                "serial_number": machine.get("serial_number", ""),
-                "location": machine.get("location", ""),
-                "installation_date": machine.get("installation_date", ""),
-                "total_hours": machine.get("total_hours", 0),
-                "status": machine.get("status", "active"),
-                "notes": machine.get("notes", ""),
-                "created_at": machine.get("created_at", ""),
+                "machine_name": machine["name"],
+                "maintenance_type": maint["type_name"],
+                "maintenance_type_id": maint["type_id"],
+                "last_date": maint.get("last_date", ""),
+                "last_hours": maint.get("last_hours", 0),
+                "next_date": maint.get("next_date", ""),
+                "next_hours": maint.get("next_hours", 0),
+                "interval": maint["interval"],
+                "interval_unit": maint["unit"],
+                "status": remaining_by_entry.get((machine["id"], maint["type_id"]), {}).get("status", "normal"),
+                "remaining_days": remaining_by_entry.get((machine["id"], maint["type_id"]), {}).get("days", 0),
+                "remaining_hours": remaining_by_entry.get((machine["id"], maint["type_id"]), {}).get("hours", 0),
                 "updated_at": machine.get("updated_at", "")
             })
-            
-            # بيانات الصيانة
-            for maint in machine.get("next_maintenance", []):
-                maintenance_list.append({
-                    "maintenance_id": f"{machine['id']}_{maint['type_id']}",
-                    "machine_id": machine["id"],
-                    "machine_name": machine["name"],
-                    "maintenance_type": maint["type_name"],
-                    "maintenance_type_id": maint["type_id"],
-                    "last_date": maint.get("last_date", ""),
-                    "last_hours": maint.get("last_hours", 0),
-                    "next_date": maint.get("next_date", ""),
-                    "next_hours": maint.get("next_hours", 0),
-                    "interval": maint["interval"],
-                    "interval_unit": maint["unit"],
-                    "status": maint.get("remaining", {}).get("status", "normal"),
-                    "remaining_days": maint.get("remaining", {}).get("days", 0),
-                    "remaining_hours": maint.get("remaining", {}).get("hours", 0),
-                    "updated_at": machine.get("updated_at", "")
-                })
-        
-        # إنشاء DataFrames
-        df_machines = pd.DataFrame(machines_list)
-        df_maintenance = pd.DataFrame(maintenance_list)
+    return machines_list, maintenance_list
+
+def update_excel_with_machines(machines_data, dirty=None):
+    """تحديث ملف Excel ببيانات الماكينات (الصفوف المتغيرة فقط)
+
+    dirty: معرفات الماكينات التي حُفظت للتو كما تعرفها save_machines. تُبنى صفوف هذه
+    الماكينات فقط وتُستبدل في الأوراق بمفتاحيها (machine_id و maintenance_id)، ولا يُبنى
+    شيء إذا كانت فارغة. None (استعادة نسخة، حذف الكل، تغيير الأنواع): مزامنة الأسطول كاملاً.
+    """
+    if dirty is not None:
+        dirty = set(dirty)
+        if not dirty:
+            return True
+    
+    try:
+        all_records = functools.lru_cache(maxsize=None)(
+            lambda: _excel_machine_records(machines_data["machines"], fleet_remaining(machines_data))
+        )
         
-        # أنواع الصيانة
-        df_types = pd.DataFrame(machines_data["maintenance_types"])
+        if dirty is not None:
+            # صفوف الماكينات المحفوظة فقط؛ الورقة التي لا تطابق بنيتها تُبنى كاملة من all_records.
+            # المتبقي من الفهرس المشترك إن كانت هذه بيانات الكاش، وإلا يُحسب لهذه الماكينات وحدها
+            dirty_machines = [machine for machine in machines_data["machines"] if machine["id"] in dirty]
+            shared = machines_data is load_machines_data()
+            machines_list, maintenance_list = _excel_machine_records(
+                dirty_machines, fleet_remaining(machines_data if shared else {"machines": dirty_machines})
+            )
+            sheets = {
+                "Machines": {
+                    "key": "machine_id", "columns": MACHINES_SHEET_COLUMNS, "records": machines_list,
+                    "owner": "machine_id", "owners": dirty, "full": lambda: all_records()[0]
+                },
+                "Maintenance_Schedule": {
+                    "key": "maintenance_id", "columns": MAINTENANCE_SHEET_COLUMNS, "records": maintenance_list,
+                    "owner": "machine_id", "owners": dirty, "full": lambda: all_records()[1]
+                }
+            }
+        else:
+            machines_list, maintenance_list = all_records()
+            
+            # أنواع الصيانة
+            types_columns = []
+            for maint_type in machines_data["maintenance_types"]:
+                for column in maint_type:
+                    if column not in types_columns:
+                        types_columns.append(column)
+            
+            sheets = {
+                "Machines": {"key": "machine_id", "columns": MACHINES_SHEET_COLUMNS, "records": machines_list},
+                "Maintenance_Schedule": {"key": "maintenance_id", "columns": MAINTENANCE_SHEET_COLUMNS, "records": maintenance_list},
+                "Maintenance_Types": {"key": "id", "columns": types_columns, "records": machines_data["maintenance_types"]}
+            }
         
-        # حفظ في ملف Excel
-        sheets_dict = {
-            "Machines": df_machines,
-            "Maintenance_Schedule": df_maintenance,
-            "Maintenance_Types": df_types
-        }
+        # حفظ في ملف Excel (سجل الصيانة يُلحق بالأحداث الجديدة فقط)
+        with _excel_sync_state()["lock"]:
+            changed = sync_excel_sheets({**sheets, "Maintenance_History": _history_sheet_spec()})
         
-        # استخدام دالة الحفظ المشتركة
-        username = st.session_state.get("username", "System")
-        save_local_excel_and_push(
-            sheets_dict,
-            f"تحديث بيانات الصيانة بواسطة {username} - {datetime.now().strftime('%d/%m/%Y %H:%M')}"
-        )
+        if changed:
+            st.info("✅ تم الحفظ المحلي بنجاح")
+            username = st.session_state.get("username", "System")
+            queue_github_push(
+                f"تحديث بيانات الصيانة بواسطة {username} - {datetime.now().strftime('%d/%m/%Y %H:%M')}"
+            )
         
         return True
-    
+
     except Exception as e:
         st.error(f"❌ خطأ في تحديث ملف Excel: {e}")
         return False
@@ -1413,15 +4839,15 @@ def update_excel_with_machines(machines_data):
 def settings_ui():
     """إعدادات النظام"""
     st.header("⚙️ إعدادات النظام")
-    
+
     machines_data = load_machines_data()
     settings = machines_data.get("settings", {})
-    
+
     # قسم إعدادات المؤقتات
     st.subheader("⚙️ إعدادات المؤقتات")
-    
+
     col1, col2 = st.columns(2)
-    
+
     with col1:
         warning_days = st.number_input(
             "الأيام للإشعار التحذيري",
@@ -1429,7 +4855,7 @@ def settings_ui():
             value=settings.get("warning_days", APP_CONFIG["WARNING_DAYS_BEFORE"]),
             help="عدد الأيام قبل موعد الصيانة لتغيير الحالة إلى تحذير"
         )
-    
+
     with col2:
         critical_days = st.number_input(
             "الأيام للإشعار الحرج",
@@ -1437,61 +4863,63 @@ def settings_ui():
             value=settings.get("critical_days", APP_CONFIG["CRITICAL_DAYS_BEFORE"]),
             help="عدد الأيام قبل موعد الصيانة لتغيير الحالة إلى حرج"
         )
-    
+
     # زر حفظ الإعدادات
     if st.button("💾 حفظ الإعدادات", key="save_settings", type="primary"):
-        machines_data["settings"] = {
+        machines_data = load_machines_data()
+        settings = {
             "warning_days": warning_days,
             "critical_days": critical_days
         }
         
-        if save_machines_data(machines_data):
+        if save_catalog(machines_data["maintenance_types"], settings):
             st.success("✅ تم حفظ الإعدادات بنجاح!")
             st.rerun()
-    
+
     st.markdown("---")
-    
+
     # قسم إدارة البيانات
     st.subheader("🔄 إدارة البيانات")
-    
+
     col_data1, col_data2 = st.columns(2)
-    
+
     with col_data1:
         if st.button("🔄 تحديث جميع المؤقتات", key="refresh_all_timers"):
-            # إعادة حساب جميع المؤقتات
+            # المؤقتات تُحسب عند القراءة؛ نزيل اللقطات القديمة المحفوظة ونعيد الحساب
+            machines_data = load_machines_data(for_update=True)
+            changed = []
             for machine in machines_data["machines"]:
-                for maint in machine.get("next_maintenance", []):
-                    maint["remaining"] = calculate_remaining_time(
-                        maint.get("next_date"),
-                        maint.get("next_hours"),
-                        machine.get("total_hours", 0)
-                    )
+                if any("remaining" in maint for maint in machine.get("next_maintenance", [])):
+                    for maint in machine["next_maintenance"]:
+                        maint.pop("remaining", None)
+                    changed.append(machine)
             
-            if save_machines_data(machines_data):
-                update_excel_with_machines(machines_data)
+            if save_machines(changed):
+                update_excel_with_machines(load_machines_data(), dirty=[machine["id"] for machine in changed])
                 st.success("✅ تم تحديث جميع المؤقتات!")
                 st.rerun()
-    
+
     with col_data2:
         if st.button("🗑️ حذف جميع البيانات", key="delete_all_data"):
             if st.checkbox("أؤكد أنني أريد حذف جميع البيانات", key="confirm_delete_all"):
+                machines_data = load_machines_data(for_update=True)
                 machines_data["machines"] = []
                 if save_machines_data(machines_data):
                     update_excel_with_machines(machines_data)
                     st.warning("⚠️ تم حذف جميع البيانات بنجاح!")
                     st.rerun()
-    
+
     st.markdown("---")
-    
+
     # قسم النسخ الاحتياطي
     st.subheader("💾 النسخ الاحتياطي")
-    
+
     col_backup1, col_backup2 = st.columns(2)
-    
+
     with col_backup1:
         if st.button("📥 تنزيل نسخة احتياطية", key="backup_download"):
             # تنزيل ملف JSON
-            backup_data = json.dumps(machines_data, indent=4, ensure_ascii=False)
+            backup_data = json.dumps(machines_data, indent=4, ensure_ascii=False, default=dict)
             
             st.download_button(
                 label="💾 تحميل ملف النسخ الاحتياطي",
@@ -1499,7 +4927,7 @@ def settings_ui():
                 file_name=f"maintenance_backup_{datetime.now().strftime('%Y%m%d_%H%M')}.json",
                 mime="application/json"
             )
-    
+
     with col_backup2:
         uploaded_file = st.file_uploader("استعادة من نسخة احتياطية", type=["json"])
         
@@ -1517,18 +4945,18 @@ def settings_ui():
                         st.error("❌ ملف النسخ الاحتياطي غير صالح")
                 except Exception as e:
                     st.error(f"❌ خطأ في استعادة البيانات: {e}")
-    
+
     st.markdown("---")
-    
+
     # قسم معلومات النظام
     st.subheader("ℹ️ معلومات النظام")
-    
+
     info_col1, info_col2 = st.columns(2)
-    
+
     with info_col1:
         st.info(f"**عدد الماكينات:** {len(machines_data['machines'])}")
         st.info(f"**أنواع الصيانة:** {len(machines_data['maintenance_types'])}")
-    
+
     with info_col2:
         if os.path.exists(APP_CONFIG["LOCAL_FILE"]):
             file_size = os.path.getsize(APP_CONFIG["LOCAL_FILE"]) / 1024  # بالكيلوبايت
@@ -1549,13 +4977,12 @@ def settings_ui():
 def login_ui():
     """واجهة تسجيل الدخول"""
     st.title(f"{APP_CONFIG['APP_ICON']} تسجيل الدخول - {APP_CONFIG['APP_TITLE']}")
-    
+
     users = load_users()
-    state = load_state()
-    
+
     if "logged_in" not in st.session_state:
         st.session_state.logged_in = False
-    
+
     if not st.session_state.logged_in:
         col1, col2 = st.columns([1, 2])
         
@@ -1568,13 +4995,13 @@ def login_ui():
             
             if st.button("🚀 تسجيل الدخول", type="primary", use_container_width=True):
                 if username in users and users[username]["password"] == password:
-                    # تحديث حالة الجلسة
-                    state[username] = {
-                        "active": True,
-                        "login_time": datetime.now().isoformat()
-                    }
-                    save_state(state)
+                    # تسجيل الجلسة (يُرفض إذا اكتمل عدد المستخدمين النشطين)
+                    session_id = _session_registry().open(username)
+                    if session_id is None:
+                        st.error(f"❌ تم الوصول للحد الأقصى من المستخدمين النشطين ({MAX_ACTIVE_USERS})، حاول لاحقاً")
+                        return False
                     
+                    st.session_state.session_id = session_id
                     st.session_state.logged_in = True
                     st.session_state.username = username
                     st.session_state.user_role = users[username].get("role", "user")
@@ -1583,22 +5010,17 @@ def login_ui():
                     st.rerun()
                 else:
                     st.error("❌ اسم المستخدم أو كلمة المرور غير صحيحة")
-    
+
     else:
         # شريط معلومات الجلسة
         st.success(f"✅ مسجل الدخول كـ: {st.session_state.username}")
         
         if st.button("🚪 تسجيل الخروج", key="logout_main"):
-            state[st.session_state.username]["active"] = False
-            save_state(state)
-            
-            for key in list(st.session_state.keys()):
-                del st.session_state[key]
-            
+            end_session()
             st.rerun()
         
         return True
-    
+
     return False
 
 # ===============================
@@ -1606,7 +5028,7 @@ def login_ui():
 # ===============================
 def main():
     """الواجهة الرئيسية للتطبيق"""
-    
+
     # إعداد الصفحة
     st.set_page_config(
         page_title=APP_CONFIG["APP_TITLE"],
@@ -1614,17 +5036,25 @@ def main():
         layout="wide",
         initial_sidebar_state="expanded"
     )
-    
+
     # تهيئة ملف Excel إذا لم يكن موجوداً
     initialize_excel_file()
-    
+
+    # المجدول الخلفي يبدأ مرة واحدة للخادم مع أول زيارة
+    _due_scheduler()
+
+    # الجلسة المنتهية أو المُزالة من السجل تعيد المستخدم لتسجيل الدخول
+    if st.session_state.get("logged_in") and not _session_registry().is_active(st.session_state.get("session_id")):
+        end_session()
+        st.warning("⏰ انتهت الجلسة، الرجاء تسجيل الدخول مرة أخرى")
+
     # التحقق من تسجيل الدخول
     if not st.session_state.get("logged_in"):
         if login_ui():
             st.rerun()
         else:
             st.stop()
-    
+
     # الشريط الجانبي
     with st.sidebar:
         st.header(f"{APP_CONFIG['APP_ICON']} {APP_CONFIG['APP_TITLE']}")
@@ -1633,13 +5063,37 @@ def main():
         st.markdown(f"""
         **👤 المستخدم:** {st.session_state.username}
         **🎭 الدور:** {st.session_state.user_role}
+        **👥 المستخدمون النشطون:** {len(_session_registry().active_users())}/{MAX_ACTIVE_USERS}
         """)
         
         st.markdown("---")
         
+        # التنقل بين الأقسام (يُحفظ في الجلسة وفي رابط الصفحة ?section=)
+        section_names = APP_CONFIG["CUSTOM_TABS"]
+        if st.session_state.get("active_section") not in section_names:
+            try:
+                section_idx = int(st.query_params.get("section", 0))
+            except ValueError:
+                section_idx = 0
+            if not 0 <= section_idx < len(section_names):
+                section_idx = 0
+            st.session_state["active_section"] = section_names[section_idx]
+        
+        active_section = st.radio("📂 القسم", section_names, key="active_section")
+        st.query_params["section"] = str(section_names.index(active_section))
+        
+        st.markdown("---")
+        
         # أدوات سريعة
         st.subheader("🛠️ أدوات سريعة")
         
+        # شاشات العرض: العدادات وبطاقات المؤقتات تتحدث وحدها عند تغير البيانات
+        st.toggle(
+            "📡 وضع العرض المباشر",
+            key="live_mode",
+            help=f"تحقق كل {APP_CONFIG['LIVE_REFRESH_SECONDS']} ثوانٍ من تغير البيانات بدون إعادة تحميل الصفحة"
+        )
+        
         if st.button("🔄 تحديث البيانات من GitHub", key="refresh_github_sidebar"):
             if fetch_from_github():
                 st.rerun()
@@ -1654,6 +5108,7 @@ def main():
             try:
                 if 'cache_data' in dir(st):
                     st.cache_data.clear()
+                invalidate_machines_cache()
                 st.success("✅ تم مسح الكاش")
                 st.rerun()
             except:
@@ -1663,18 +5118,14 @@ def main():
         if st.button("🕐 تحديث ساعات التشغيل", key="update_hours_sidebar"):
             st.session_state["show_update_hours"] = True
         
-        st.markdown("---")
-        
-        # إحصائيات سريعة
-        machines_data = load_machines_data()
+        render_push_status()
         
-        total_machines = len(machines_data["machines"])
-        critical_count = 0
+        st.markdown("---")
         
-        for machine in machines_data["machines"]:
-            for maint in machine.get("next_maintenance", []):
-                if maint.get("remaining", {}).get("status") == "critical":
-                    critical_count += 1
+        # إحصائيات سريعة (منشورة من الحالة المشتركة، لا تُحسب لكل جلسة)
+        stats = fleet_stats()
+        total_machines = stats["machines"]
+        critical_count = stats["status_counts"]["critical"]
         
         st.markdown(f"""
         **📊 إحصائيات سريعة:**
@@ -1683,49 +5134,59 @@ def main():
         🔴 **حرجة:** {critical_count}
         """)
         
+        # التنبيهات الجاهزة من المجدول الخلفي (بدون حساب في الجلسة)
+        alerts = due_alerts()
+        if alerts["items"]:
+            alert_icons = {"overdue": "⏰", "critical": "🔴", "warning": "🟡"}
+            with st.expander(f"🔔 التنبيهات ({len(alerts['items'])})", expanded=bool(alerts["changed"])):
+                for alert in alerts["items"][:10]:
+                    if alert["days"] is not None:
+                        remaining_text = f"{alert['days']} يوم"
+                    elif alert["hours"] is not None:
+                        remaining_text = f"{alert['hours']:.0f} ساعة"
+                    else:
+                        remaining_text = "-"
+                    new_mark = "🆕 " if alert["key"] in alerts["changed"] else ""
+                    st.markdown(f"{new_mark}{alert_icons.get(alert['status'], '')} **{alert['machine']}** - {alert['type']}: {remaining_text}")
+                if len(alerts["items"]) > 10:
+                    st.caption(f"و {len(alerts['items']) - 10} تنبيهات أخرى في تبويب المؤقتات")
+        
         st.markdown("---")
         
         # زر تسجيل الخروج
         if st.button("🚪 تسجيل الخروج", key="logout_sidebar", use_container_width=True):
-            state = load_state()
-            state[st.session_state.username]["active"] = False
-            save_state(state)
-            
-            for key in list(st.session_state.keys()):
-                del st.session_state[key]
-            
+            end_session()
             st.rerun()
-    
+
     # العنوان الرئيسي
     st.title(f"{APP_CONFIG['APP_ICON']} {APP_CONFIG['APP_TITLE']}")
-    
+
     # عرض تحديث الساعات إذا طلب
     if st.session_state.get("show_update_hours", False):
         update_machine_hours_ui()
-        st.session_state["show_update_hours"] = False
         return
-    
-    # التبويبات الرئيسية
-    tabs = st.tabs(APP_CONFIG["CUSTOM_TABS"])
-    
-    with tabs[0]:
-        dashboard_ui()
-    
-    with tabs[1]:
-        add_machine_ui()
-    
-    with tabs[2]:
-        maintenance_management_ui()
-    
-    with tabs[3]:
-        timers_dashboard_ui()
-    
-    with tabs[4]:
-        reports_ui()
-    
-    with tabs[5]:
-        settings_ui()
+
+    # الأقسام الرئيسية: يُنفذ القسم المختار فقط بدلاً من كل التبويبات في كل إعادة تشغيل
+    section_views = [
+        dashboard_ui,
+        add_machine_ui,
+        maintenance_management_ui,
+        timers_dashboard_ui,
+        reports_ui,
+        settings_ui
+    ]
+
+    section_views[section_names.index(active_section)]()
 
 # تشغيل التطبيق
 if __name__ == "__main__":
-    main()
+    # أداة ترحيل لمرة واحدة: python app.py --migrate-json-to-sqlite [--force]
+    if "--migrate-json-to-sqlite" in sys.argv:
+        try:
+            count = migrate_json_to_sqlite(force="--force" in sys.argv)
+        except StorageError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        print(f"✅ تم ترحيل {count} ماكينة من {MACHINES_FILE} إلى {MACHINES_DB_FILE}")
+    else:
+        main()
@@ -0,0 +1,70 @@
+"""أدوات مشتركة لسكربتات القياس: مجلد عمل مؤقت واستيراد التطبيق وتوليد أسطول"""
+import logging
+import os
+import random
+import sys
+import tempfile
+import warnings
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+warnings.filterwarnings("ignore")
+
+# مجلد مؤقت قبل استيراد التطبيق: كل ملفاته نسبية ولا يُلمس مجلد المشروع
+os.chdir(tempfile.mkdtemp(prefix="oil-bench-"))
+
+import app  # noqa: E402
+
+# التشغيل خارج streamlit run يطبع تحذيرات ScriptRunContext لكل استدعاء
+logging.disable(logging.WARNING)
+
+TYPES = [
+    ("oil_change", "تغيير الزيت", "ساعات", 1000),
+    ("greasing", "التشحيم", "ساعات", 500),
+    ("inspection", "فحص دوري", "أيام", 30),
+    ("calibration", "معايرة", "أشهر", 6),
+    ("filter", "تغيير الفلتر", "ساعات", 250)
+]
+
+
+def make_fleet(count, types=TYPES, seed=1):
+    """أسطول عشوائي ثابت البذرة بصيغة machines_data"""
+    rng = random.Random(seed)
+    today = datetime.now()
+    machines = []
+    for number in range(count):
+        schedule = []
+        for type_id, type_name, unit, interval in types:
+            hours_based = unit == "ساعات"
+            schedule.append({
+                "type_id": type_id,
+                "type_name": type_name,
+                "interval": interval,
+                "unit": unit,
+                "last_date": (today - timedelta(days=rng.randint(0, 300))).strftime("%d/%m/%Y"),
+                "last_hours": rng.randint(0, 3000),
+                "next_date": None if hours_based else (today + timedelta(days=rng.randint(-30, 300))).strftime("%d/%m/%Y"),
+                "next_hours": rng.randint(0, 5000) if hours_based else None
+            })
+        machines.append({
+            "id": f"m{number}",
+            "name": f"ماكينة {number}",
+            "model": "X",
+            "serial_number": f"S{number}",
+            "location": f"موقع {number % 7}",
+            "installation_date": "01/01/2024",
+            "total_hours": rng.randint(0, 5000),
+            "status": "active",
+            "notes": "",
+            "revision": 0,
+            "next_maintenance": schedule,
+            "created_at": "2024-01-01T00:00:00",
+            "updated_at": "2024-01-01T00:00:00"
+        })
+    return {"machines": machines, "maintenance_types": app.APP_CONFIG["DEFAULT_MAINTENANCE_TYPES"], "settings": {}}
+
+
+def sizes(default):
+    """أحجام القياس من سطر الأوامر أو الافتراضية"""
+    return [int(arg) for arg in sys.argv[1:]] or default
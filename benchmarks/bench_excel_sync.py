@@ -0,0 +1,90 @@
+"""قياس مزامنة oil.xlsx التزايدية مقابل إعادة توليد المصنف كاملاً
+
+python benchmarks/bench_excel_sync.py [عدد الماكينات ...]
+
+المسار القديم (DataFrames ثم pd.ExcelWriter) معاد بناؤه هنا للمقارنة. يُقاس لكل حجم:
+إعادة التوليد الكاملة، أول مزامنة (بدون كاش)، مزامنة كاملة بدون تغيير، ومزامنة بعد
+تغيير last_date لصيانة واحدة بتمرير الماكينة المحفوظة (dirty) كما يفعل مسار الحفظ، ثم
+نفس المسار بدون ماكينات محفوظة. في النهاية يُقرأ الملف بـ pandas ويُطابق مع البيانات.
+"""
+import os
+import time
+
+import pandas as pd
+
+from _common import app, make_fleet, sizes
+
+# لا رفع إلى GitHub أثناء القياس
+app.queue_github_push = lambda message: True
+
+
+def full_regeneration(machines_data, path="full.xlsx"):
+    machines = [
+        {"machine_id": m["id"], **{column: m.get(column, "") for column in app.MACHINES_SHEET_COLUMNS[1:]}}
+        for m in machines_data["machines"]
+    ]
+    remaining = app.fleet_remaining(machines_data)
+    schedule = []
+    for m in machines_data["machines"]:
+        for maint in m["next_maintenance"]:
+            entry = remaining.get((m["id"], maint["type_id"]), {})
+            schedule.append({
+                "maintenance_id": f"{m['id']}_{maint['type_id']}",
+                "machine_id": m["id"],
+                "machine_name": m["name"],
+                "maintenance_type": maint["type_name"],
+                "maintenance_type_id": maint["type_id"],
+                "last_date": maint.get("last_date", ""),
+                "last_hours": maint.get("last_hours", 0),
+                "next_date": maint.get("next_date", ""),
+                "next_hours": maint.get("next_hours", 0),
+                "interval": maint["interval"],
+                "interval_unit": maint["unit"],
+                "status": entry.get("status", "normal"),
+                "remaining_days": entry.get("days", 0),
+                "remaining_hours": entry.get("hours", 0),
+                "updated_at": m.get("updated_at", "")
+            })
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        pd.DataFrame(machines).to_excel(writer, sheet_name="Machines", index=False)
+        pd.DataFrame(schedule).to_excel(writer, sheet_name="Maintenance_Schedule", index=False)
+        pd.DataFrame(machines_data["maintenance_types"]).to_excel(writer, sheet_name="Maintenance_Types", index=False)
+
+
+def run(count):
+    machines_data = make_fleet(count)
+    app.invalidate_excel_cache()
+    if os.path.exists(app.APP_CONFIG["LOCAL_FILE"]):
+        os.remove(app.APP_CONFIG["LOCAL_FILE"])
+    
+    timings = {}
+    for name, step in [
+        ("full_regen", lambda: full_regeneration(machines_data)),
+        ("first_sync", lambda: app.update_excel_with_machines(machines_data)),
+        ("full_no_op", lambda: app.update_excel_with_machines(machines_data)),
+        ("one_row", lambda: (
+            machines_data["machines"][count // 2]["next_maintenance"][2].__setitem__("last_date", "05/05/2025"),
+            app.update_excel_with_machines(machines_data, dirty=[machines_data["machines"][count // 2]["id"]])
+        )),
+        ("no_op", lambda: app.update_excel_with_machines(machines_data, dirty=[])),
+    ]:
+        started = time.perf_counter()
+        step()
+        timings[name] = time.perf_counter() - started
+    
+    sheet = pd.read_excel(app.APP_CONFIG["LOCAL_FILE"], sheet_name="Maintenance_Schedule").set_index("maintenance_id")
+    changed = machines_data["machines"][count // 2]
+    key = f"{changed['id']}_{changed['next_maintenance'][2]['type_id']}"
+    assert sheet.loc[key, "last_date"] == "05/05/2025"
+    assert len(sheet) == sum(len(m["next_maintenance"]) for m in machines_data["machines"])
+    return timings
+
+
+if __name__ == "__main__":
+    print(f"{'machines':>9} {'full regen':>11} {'first sync':>11} {'full no-op':>11} {'one dirty':>10} {'none dirty':>11}")
+    for count in sizes([100, 1000, 10000]):
+        t = run(count)
+        print(
+            f"{count:>9} {t['full_regen']:>10.3f}s {t['first_sync']:>10.3f}s {t['full_no_op']:>10.3f}s"
+            f" {t['one_row']:>9.3f}s {t['no_op']:>10.5f}s"
+        )
@@ -0,0 +1,65 @@
+"""قياس إدخال قراءات الساعات دفعة واحدة مقابل حفظ كل ماكينة على حدة
+
+python benchmarks/bench_hours_ingest.py [عدد الماكينات ...]
+
+لكل حجم: قراءة لكل ماكينة (نصفها بالرقم المسلسل) مع قراءتين إضافيتين وخمس قراءات
+يجب رفضها، ثم مقارنة فهرس الاستحقاق بعد الإدخال بفهرس مبني من الصفر. المسار القديم
+(get_machine ثم save_machine لكل ماكينة) يُقاس على 200 ماكينة ويُقدّر للحجم كاملاً.
+"""
+import random
+import time
+
+from _common import app, make_fleet, sizes
+
+SINGLE_SAVE_SAMPLE = 200
+
+
+def readings_for(count, rng):
+    readings = [
+        (f"m{i}" if i % 2 else f"S{i}", 5000 + rng.randint(0, 50), f"{1 + i % 28:02d}/09/2026")
+        for i in range(count)
+    ]
+    # خمس قراءات مرفوضة: ماكينة غير معروفة، ساعات غير رقمية، أقل من الحالية، تاريخ غير صالح،
+    # وقراءة m1 العادية لأنها أقل من قراءة أقدم منها في نفس الدفعة
+    readings[5] = ("nope", 10, "")
+    readings[6] = ("m6", "abc", "")
+    readings[7] = ("m7", 5, "")
+    readings[9] = ("m9", 6000, "32/13/2026")
+    readings.append(("m1", 9000, "2026-09-30"))
+    readings.append(("m1", 8000, "2026-09-01"))
+    readings.append(("m3", 9999, "2026-10-01T10:00"))
+    return readings
+
+
+def run(count):
+    app.st.cache_resource.clear()
+    app.SqliteMachinesStorage(app.MACHINES_DB_FILE).save(make_fleet(count))
+    app.due_index()
+    readings = readings_for(count, random.Random(1))
+    
+    started = time.perf_counter()
+    result = app.ingest_hours_readings(readings)
+    bulk = time.perf_counter() - started
+    
+    index = app.due_index()
+    fresh = app.DueIndex()
+    fresh.rebuild(app.load_machines_data(), 0, index.as_of)
+    consistent = fresh.entries == index.entries and fresh._order == index._order
+    
+    started = time.perf_counter()
+    for number in range(SINGLE_SAVE_SAMPLE):
+        machine = app.get_machine(f"m{number}", for_update=True)
+        machine["total_hours"] += 1
+        app.save_machine(machine)
+    single = (time.perf_counter() - started) / SINGLE_SAVE_SAMPLE
+    
+    return len(readings), bulk, result["accepted"], len(result["rejected"]), consistent, single
+
+
+if __name__ == "__main__":
+    for count in sizes([10000]):
+        readings, bulk, accepted, rejected, consistent, single = run(count)
+        print(f"{count} machines, {readings} readings")
+        print(f"  bulk ingest: {bulk:.2f}s ({accepted} accepted, {rejected} rejected)")
+        print(f"  single-machine saves: {single * 1000:.1f} ms each, ~{single * count:.0f}s for the same machines")
+        print(f"  due index matches a full rebuild: {consistent}")
@@ -0,0 +1,78 @@
+"""قياس تحليل التواريخ: parse_dates مع الكاش المشترك مقابل pd.to_datetime لكل قيمة
+
+python benchmarks/bench_parse_dates.py [عدد القيم ...]
+
+العمود تواريخ عشوائية بالصيغة القياسية مع قيم بصيغ أخرى وفارغة وغير صالحة.
+المحلل السابق (pd.to_datetime لكل قيمة مختلفة في الاستدعاء) معاد بناؤه هنا
+للمقارنة ولعد الاختلافات في النتائج.
+"""
+import random
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from _common import app, sizes
+
+ODD_VALUES = [
+    "2024-03-05", "5/3/2024", "05/03/24", "31/02/2024", "garbage", "", None, float("nan"),
+    "2024-03-05 10:00", "13/01/2025", "1/1/2025 08:30", pd.NaT
+]
+
+
+def previous_parser(values):
+    """تحليل العمود كما كان: pd.to_datetime لكل قيمة مختلفة مع حفظها داخل الاستدعاء فقط"""
+    parsed = np.full(len(values), app.NO_DATE, dtype=np.int64)
+    seen = {}
+    for position, value in enumerate(values):
+        if not value or not pd.notna(value):
+            continue
+        if value not in seen:
+            try:
+                seen[value] = int(np.datetime64(pd.to_datetime(value, dayfirst=True), "ns").astype(np.int64))
+            except Exception:
+                seen[value] = app.NO_DATE
+        parsed[position] = seen[value]
+    return parsed
+
+
+def column(count, rng):
+    base = datetime(2026, 1, 1)
+    values = [(base + timedelta(days=rng.randint(-400, 400))).strftime("%d/%m/%Y") for _ in range(count)]
+    values += ODD_VALUES * 50
+    rng.shuffle(values)
+    return values
+
+
+def run(count):
+    values = column(count, random.Random(1))
+    mismatches = int((previous_parser(values) != app.parse_dates(values)).sum())
+    
+    sample = [value for value in values[:5000] if isinstance(value, str) and value and value not in ("garbage", "31/02/2024")]
+    started = time.perf_counter()
+    for value in sample:
+        pd.to_datetime(value, dayfirst=True)
+    per_value = (time.perf_counter() - started) / len(sample)
+    
+    started = time.perf_counter()
+    previous_parser(values)
+    previous = time.perf_counter() - started
+    
+    app._date_cache.clear()
+    started = time.perf_counter()
+    app.parse_dates(values)
+    cold = time.perf_counter() - started
+    started = time.perf_counter()
+    app.parse_dates(values)
+    warm = time.perf_counter() - started
+    return len(values), mismatches, per_value, previous, cold, warm
+
+
+if __name__ == "__main__":
+    for count in sizes([80000]):
+        total, mismatches, per_value, previous, cold, warm = run(count)
+        print(f"column of {total} values ({mismatches} mismatches against the previous parser)")
+        print(f"  per-value pd.to_datetime: {per_value * 1e6:.0f} us per value")
+        print(f"  previous per-call memoized parse: {previous * 1000:.0f} ms")
+        print(f"  parse_dates: {cold * 1000:.0f} ms cold, {warm * 1000:.0f} ms warm")
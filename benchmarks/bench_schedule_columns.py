@@ -0,0 +1,65 @@
+"""قياس الذاكرة وحساب الاستحقاق لجداول الصيانة كقواميس JSON مقابل صيانات MaintenanceEntry
+
+python benchmarks/bench_schedule_columns.py [عدد الماكينات ...]
+
+لكل حجم (4 صيانات لكل ماكينة) يُحمّل الأسطول من نص JSON كما يفعل التخزين، ثم يقاس:
+الذاكرة المحجوزة للأسطول بقواميس الصيانة وبعد ضغطها (compact_schedules كما في الكاش المشترك)،
+وزمن الضغط، وزمن بناء أعمدة الاستحقاق وحساب الحالة من كل تمثيل مع التحقق من تطابقهما
+ومن أن الحفظ بعد الضغط يعيد نص JSON نفسه.
+"""
+import gc
+import json
+import time
+import tracemalloc
+
+from _common import TYPES, app, make_fleet, sizes
+
+REPEAT = 3
+
+
+def timed(function):
+    """متوسط الزمن بالملي ثانية بعد تشغيل تمهيدي (كاش التواريخ دافئ في الحالتين)"""
+    function()
+    started = time.perf_counter()
+    for _ in range(REPEAT):
+        function()
+    return (time.perf_counter() - started) / REPEAT * 1000
+
+
+def retained(build):
+    """الذاكرة التي يبقيها ناتج build (بالميجابايت) والناتج نفسه"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size / 2**20, result
+
+
+def status(machines):
+    columns = app.ScheduleColumns.from_machines(machines)
+    return columns.remaining()
+
+
+def run(count):
+    text = json.dumps(make_fleet(count, types=TYPES[:4]), indent=4, ensure_ascii=False)
+    dict_mb, plain = retained(lambda: json.loads(text))
+    compact_mb, compact = retained(lambda: app.compact_schedules(json.loads(text)["machines"]))
+    assert json.dumps({**plain, "machines": compact}, indent=4, ensure_ascii=False, default=dict) == text
+    assert status(plain["machines"]).equals(status(compact))
+    return (
+        count * 4,
+        dict_mb,
+        compact_mb,
+        timed(lambda: app.compact_schedules(json.loads(text)["machines"])) - timed(lambda: json.loads(text)),
+        timed(lambda: status(plain["machines"])),
+        timed(lambda: status(compact))
+    )
+
+
+if __name__ == "__main__":
+    print(f"{'rows':>7} {'dicts':>9} {'compact':>9} {'compact time':>13} {'status from dicts':>18} {'status from compact':>20}")
+    for count in sizes([10000]):
+        rows, dict_mb, compact_mb, compacting, dicts, compact = run(count)
+        print(f"{rows:>7} {dict_mb:>7.1f}MB {compact_mb:>7.1f}MB {compacting:>11.0f}ms {dicts:>16.0f}ms {compact:>18.0f}ms")
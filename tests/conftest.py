@@ -0,0 +1,151 @@
+import json
+import os
+import sys
+import threading
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import streamlit as st
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_FILE = os.path.join(ROOT, "app.py")
+sys.path.insert(0, ROOT)
+
+import app  # noqa: E402
+
+
+def _stop_schedulers():
+    """إيقاف مجدولات الخلفية التي شغلتها اختبارات الواجهة (تعمل على مجلد العمل الحالي)"""
+    for thread in threading.enumerate():
+        if thread.name == "due-scheduler":
+            thread._target.__self__.stop(5)
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """مجلد عمل مؤقت: كل ملفات التطبيق نسبية، والكائنات المشتركة تُبنى من جديد"""
+    monkeypatch.chdir(tmp_path)
+    st.cache_resource.clear()
+    yield tmp_path
+    _stop_schedulers()
+    st.cache_resource.clear()
+
+
+def due_in(days):
+    return (date.today() + timedelta(days=days)).strftime("%d/%m/%Y")
+
+
+def make_machine(machine_id, schedule=None, **fields):
+    machine = {
+        "id": machine_id,
+        "name": f"ماكينة {machine_id}",
+        "model": "X",
+        "serial_number": f"S-{machine_id}",
+        "location": "A",
+        "installation_date": "01/01/2024",
+        "total_hours": 100,
+        "status": "active",
+        "notes": "",
+        "revision": 0,
+        "next_maintenance": schedule if schedule is not None else [],
+        "created_at": "2024-01-01T00:00:00",
+        "updated_at": "2024-01-01T00:00:00"
+    }
+    machine.update(fields)
+    return machine
+
+
+def inspection(next_date, **fields):
+    maint = {
+        "type_id": "inspection",
+        "type_name": "فحص دوري",
+        "interval": 30,
+        "unit": "أيام",
+        "last_date": None,
+        "last_hours": 0,
+        "next_date": next_date,
+        "next_hours": None
+    }
+    maint.update(fields)
+    return maint
+
+
+def seed_machines(machines):
+    """كتابة أسطول اختبار في قاعدة SQLite بمجلد العمل الحالي"""
+    data = app._default_machines_data()
+    data["machines"] = machines
+    app.SqliteMachinesStorage(app.MACHINES_DB_FILE).save(data)
+    return data
+
+
+@pytest.fixture
+def logged_in_app(workdir):
+    """AppTest بعد تسجيل الدخول كمدير"""
+    from streamlit.testing.v1 import AppTest
+
+    def start():
+        at = AppTest.from_file(APP_FILE, default_timeout=120)
+        at.run()
+        at.text_input[0].set_value("admin")
+        at.text_input[1].set_value("admin123")
+        at.button[0].click().run()
+        assert at.session_state["logged_in"]
+        return at
+
+    return start
+
+
+class FakeHTTPServer:
+    """خادم HTTP محلي يسجل الطلبات ويرد بما تحدده الدالة respond(request)
+
+    respond تعيد (الحالة، الترويسات، المحتوى bytes أو كائن JSON).
+    """
+
+    def __init__(self):
+        server = self
+        self.requests = []
+        self.respond = lambda request: (404, {}, b"")
+
+        class Handler(BaseHTTPRequestHandler):
+            def _handle(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                request = {
+                    "method": self.command,
+                    "path": self.path,
+                    "headers": dict(self.headers),
+                    "json": json.loads(body) if body else None
+                }
+                server.requests.append(request)
+                status, headers, content = server.respond(request)
+                if not isinstance(content, bytes):
+                    content = json.dumps(content).encode("utf-8")
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                if "Content-Length" not in headers:
+                    self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            do_GET = do_PUT = _handle
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self._httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+@pytest.fixture
+def http_server():
+    server = FakeHTTPServer()
+    yield server
+    server.close()
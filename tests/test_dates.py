@@ -0,0 +1,32 @@
+"""تحليل التواريخ: خارج مدى النانوثانية يُرفض بدلاً من الالتفاف إلى تاريخ خاطئ"""
+from datetime import datetime
+
+import pytest
+
+import app
+
+
+@pytest.mark.parametrize("value", [
+    "01/02/2300", "31/12/9999", "01/01/1500", "11/04/2262", "21/09/1677",
+    "2300-02-01", "1500-01-01", datetime(2300, 1, 1), datetime(1600, 6, 1),
+])
+def test_out_of_range_dates_are_rejected(value):
+    assert app.parse_date(value) is None
+    assert app.parse_dates([value]).tolist() == [app.NO_DATE]
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("10/04/2262", datetime(2262, 4, 10)),
+    ("22/09/1677", datetime(1677, 9, 22)),
+    ("01/02/2024", datetime(2024, 2, 1)),
+    ("2024-01-31", datetime(2024, 1, 31)),
+    (datetime(2024, 1, 5, 8, 30), datetime(2024, 1, 5, 8, 30)),
+])
+def test_in_range_dates_are_parsed(value, expected):
+    assert app.parse_date(value) == expected
+
+
+def test_out_of_range_due_date_is_treated_as_missing():
+    # قبل الإصلاح كان 01/02/2300 يصبح 1715 فتظهر الصيانة متأخرة بقرون
+    out_of_range, missing = app.calculate_remaining_batch(["01/02/2300", ""], [None, None], [None, None]).to_dict("records")
+    assert out_of_range == missing
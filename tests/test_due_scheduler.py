@@ -0,0 +1,34 @@
+"""المجدول الخلفي يحدث التنبيهات بدون جلسة، وأخطاء التحميل تُسجل في حالته"""
+import threading
+
+import app
+
+from tests.conftest import due_in, inspection, make_machine, seed_machines
+
+
+def run_in_thread(scheduler):
+    # خيط بدون سياق تشغيل سكربت كما في المجدول الحقيقي
+    thread = threading.Thread(target=scheduler.run_once)
+    thread.start()
+    thread.join(30)
+    return scheduler.status()
+
+
+def test_tick_publishes_alerts(workdir):
+    seed_machines([make_machine("m0", [inspection(due_in(-1))]), make_machine("m1", [inspection(due_in(200))])])
+    status = run_in_thread(app.DueScheduler(app.due_alerts, 60))
+    
+    assert (status["state"], status["ticks"], status["last_error"]) == ("running", 1, None)
+    alerts = app._machines_store()["alerts"]
+    assert [(item["key"], item["status"]) for item in alerts["items"]] == [(("m0", "inspection"), "overdue")]
+
+
+def test_tick_records_storage_error(workdir, monkeypatch):
+    monkeypatch.setitem(app.APP_CONFIG, "STORAGE_BACKEND", "json")
+    with open(app.MACHINES_FILE, "w", encoding="utf-8") as f:
+        f.write('{"machines": [')
+    
+    status = run_in_thread(app.DueScheduler(app.due_alerts, 60))
+    assert status["state"] == "error"
+    assert app.MACHINES_FILE in status["last_error"]
+    assert app._machines_store()["data"] is None
@@ -0,0 +1,60 @@
+"""مزامنة oil.xlsx بعد الحفظ: صفوف الماكينات المحفوظة فقط بمفتاح maintenance_id"""
+import pandas as pd
+import pytest
+
+import app
+
+from tests.conftest import due_in, inspection, make_machine, seed_machines
+
+
+@pytest.fixture
+def synced(workdir, monkeypatch):
+    monkeypatch.setattr(app, "queue_github_push", lambda message: True)
+    seed_machines([
+        make_machine(f"m{i}", [inspection(due_in(i)), inspection(due_in(40 + i), type_id="oil", type_name="زيت")])
+        for i in range(4)
+    ])
+    assert app.update_excel_with_machines(app.load_machines_data())
+
+
+def schedule_sheet():
+    return pd.read_excel(app.APP_CONFIG["LOCAL_FILE"], sheet_name="Maintenance_Schedule").set_index("maintenance_id")
+
+
+def edit(machine_id, **fields):
+    machine = app.get_machine(machine_id, for_update=True)
+    machine["next_maintenance"] = [maint for maint in machine["next_maintenance"] if maint["type_id"] != "oil"]
+    machine["next_maintenance"][0].update(fields)
+    assert app.save_machine(machine)
+    return machine
+
+
+def test_dirty_sync_encodes_only_saved_machines(synced, monkeypatch):
+    edit("m2", last_date="05/05/2025")
+    built = []
+    records = app._excel_machine_records
+    monkeypatch.setattr(app, "_excel_machine_records", lambda machines, remaining: built.append(len(machines)) or records(machines, remaining))
+
+    assert app.update_excel_with_machines(app.load_machines_data(), dirty=["m2"])
+    assert built == [1]
+
+    sheet = schedule_sheet()
+    assert sheet.loc["m2_inspection", "last_date"] == "05/05/2025"
+    # الصيانة التي أزيلت من الماكينة المحفوظة تُحذف، وصفوف الماكينات الأخرى تبقى
+    assert "m2_oil" not in sheet.index
+    assert len(sheet) == 7 and "m3_oil" in sheet.index
+
+
+def test_nothing_dirty_returns_before_building_records(synced, monkeypatch):
+    monkeypatch.setattr(app, "fleet_remaining", lambda *args: pytest.fail("records built"))
+    monkeypatch.setattr(app, "sync_excel_sheets", lambda *args: pytest.fail("sheets synced"))
+    assert app.update_excel_with_machines(app.load_machines_data(), dirty=[])
+
+
+def test_dirty_sync_without_matching_sheet_syncs_everything(synced):
+    app.invalidate_excel_cache()
+    with pd.ExcelWriter(app.APP_CONFIG["LOCAL_FILE"], engine="openpyxl") as writer:
+        pd.DataFrame({"other": [1]}).to_excel(writer, sheet_name="Maintenance_Schedule", index=False)
+
+    assert app.update_excel_with_machines(app.load_machines_data(), dirty=["m0"])
+    assert len(schedule_sheet()) == 8
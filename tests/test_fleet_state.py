@@ -0,0 +1,63 @@
+"""التنبيهات والإجماليات المنشورة تُحدَّث من الماكينات المحفوظة فقط وتطابق إعادة النشر الكاملة"""
+import copy
+
+import pytest
+
+import app
+
+from tests.conftest import due_in, inspection, make_machine, seed_machines
+
+
+def full_publish():
+    """نشر كامل من الفهرس الحالي في مخزن مؤقت للمقارنة"""
+    store = app._machines_store()
+    scratch = {"alerts": None, "stats": None, "totals": None}
+    app._publish_fleet_state(scratch, store["data"], store["due_index"])
+    return scratch
+
+
+@pytest.fixture
+def fleet(workdir):
+    offsets = [-20, -3, 0, 2, 5, 9, 14, 25, 60, 200]
+    seed_machines([
+        make_machine(f"m{i}", [inspection(due_in(offsets[i % len(offsets)]))], location="AB"[i % 2])
+        for i in range(30)
+    ])
+    app.due_alerts()
+    return app._machines_store()
+
+
+def test_saves_patch_alerts_without_walking_the_index(fleet, monkeypatch):
+    index = fleet["due_index"]
+    monkeypatch.setattr(type(index), "next_due", lambda *args, **kwargs: pytest.fail("next_due called on save"))
+    
+    for machine_id, offset in [("m3", 200), ("m8", -40), ("m11", 4), ("m0", 4), ("m8", 60)]:
+        machine = copy.deepcopy(app.load_machines_data()["machines"][int(machine_id[1:])])
+        machine["next_maintenance"][0]["next_date"] = due_in(offset)
+        assert app.save_machines([machine])
+    
+    monkeypatch.undo()
+    expected = full_publish()["alerts"]
+    alerts = app.due_alerts()
+    assert alerts["version"] == fleet["version"]
+    assert alerts["items"] == expected["items"]
+    assert alerts["order"] == expected["order"]
+
+
+def test_saves_adjust_running_totals(fleet, monkeypatch):
+    monkeypatch.setattr(app, "_fleet_totals", lambda *args: pytest.fail("full recompute on save"))
+    
+    changed = copy.deepcopy(app.load_machines_data()["machines"][4])
+    changed.update(location="C", status="inactive", total_hours=350.5)
+    changed["next_maintenance"][0]["next_date"] = due_in(-1)
+    assert app.save_machines([changed, make_machine("m99", location="A", total_hours=40)])
+    stats = app.fleet_stats()
+    
+    monkeypatch.undo()
+    expected = full_publish()["stats"]
+    assert stats["version"] == fleet["version"]
+    assert stats["locations"] == expected["locations"] == {"A": 15, "B": 15, "C": 1}
+    assert (stats["machines"], stats["active"], stats["status_counts"]) == (
+        expected["machines"], expected["active"], expected["status_counts"]
+    )
+    assert stats["total_hours"] == pytest.approx(expected["total_hours"])
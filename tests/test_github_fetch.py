@@ -0,0 +1,132 @@
+"""الجلب الشرطي من GitHub مقابل خادم محلي: 304 و Range/If-Range والتنزيل المنقطع"""
+import io
+import os
+
+import pytest
+from openpyxl import Workbook
+
+import app
+
+
+def workbook_bytes(value, filler_rows=0):
+    workbook = Workbook()
+    workbook.active["A1"] = value
+    # محتوى لا يُضغط حتى يتجاوز الملف عدة دفعات تنزيل
+    for row in range(2, filler_rows + 2):
+        workbook.active.cell(row, 1, os.urandom(24).hex())
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+class FakeRawFile:
+    """ملف على الخادم بـ ETag، يدعم If-None-Match و Range مع If-Range"""
+
+    def __init__(self, content, etag):
+        self.content = content
+        self.etag = etag
+        self.truncate_next = False
+
+    def __call__(self, request):
+        headers = request["headers"]
+        if headers.get("If-None-Match") == self.etag:
+            return 304, {"ETag": self.etag}, b""
+        status, body = 200, self.content
+        if "Range" in headers and headers.get("If-Range") == self.etag:
+            start = int(headers["Range"].split("=")[1].rstrip("-"))
+            status, body = 206, self.content[start:]
+        response_headers = {"ETag": self.etag, "Content-Length": str(len(body))}
+        if self.truncate_next:
+            # انقطاع الاتصال في منتصف الجسم
+            self.truncate_next = False
+            body = body[:len(body) // 2 + 1000]
+        return status, response_headers, body
+
+
+@pytest.fixture
+def remote(workdir, http_server):
+    raw = FakeRawFile(workbook_bytes("v1", filler_rows=8000), '"v1"')
+    http_server.respond = raw
+    return http_server, raw
+
+
+def local_bytes():
+    with open(app.APP_CONFIG["LOCAL_FILE"], "rb") as f:
+        return f.read()
+
+
+def test_not_modified_uses_etag(remote):
+    server, raw = remote
+    url = f"{server.url}/raw/data.xlsx"
+    assert app.fetch_from_github(url) is True
+    assert local_bytes() == raw.content
+    assert "If-None-Match" not in server.requests[0]["headers"]
+    
+    assert app.fetch_from_github(url) is False
+    assert server.requests[1]["headers"]["If-None-Match"] == '"v1"'
+    assert local_bytes() == raw.content
+
+
+def test_local_edit_disables_not_modified(remote):
+    server, raw = remote
+    url = f"{server.url}/raw/data.xlsx"
+    app.fetch_from_github(url)
+    with open(app.APP_CONFIG["LOCAL_FILE"], "wb") as f:
+        f.write(workbook_bytes("محلي"))
+    
+    assert app.fetch_from_github(url) is True
+    assert "If-None-Match" not in server.requests[1]["headers"]
+    assert local_bytes() == raw.content
+
+
+def test_interrupted_download_resumes_with_range(remote):
+    server, raw = remote
+    url = f"{server.url}/raw/data.xlsx"
+    raw.truncate_next = True
+    assert app.fetch_from_github(url) is False
+    part_size = os.path.getsize(f"{app.APP_CONFIG['LOCAL_FILE']}.part")
+    assert 0 < part_size < len(raw.content)
+    
+    assert app.fetch_from_github(url) is True
+    headers = server.requests[1]["headers"]
+    assert (headers["Range"], headers["If-Range"]) == (f"bytes={part_size}-", '"v1"')
+    assert local_bytes() == raw.content
+    assert "partial_etag" not in app._load_fetch_meta()
+
+
+def test_changed_remote_restarts_download(remote, monkeypatch):
+    server, raw = remote
+    url = f"{server.url}/raw/data.xlsx"
+    raw.truncate_next = True
+    app.fetch_from_github(url)
+    
+    raw.content, raw.etag = workbook_bytes("v2", filler_rows=8000), '"v2"'
+    part_path = f"{app.APP_CONFIG['LOCAL_FILE']}.part"
+    saved = []
+    save_meta = app._save_fetch_meta
+    
+    def record(meta):
+        if meta.get("partial_etag") == '"v2"':
+            with open(part_path, "rb") as f:
+                saved.append(f.read())
+        save_meta(meta)
+    
+    monkeypatch.setattr(app, "_save_fetch_meta", record)
+    assert app.fetch_from_github(url) is True
+    # If-Range لم يطابق فأرسل الخادم الملف كاملاً: الجزء القديم لم يعد على القرص
+    # عند تسجيل ETag الجديد
+    assert saved[0] == b""
+    assert local_bytes() == raw.content
+
+
+def test_successful_fetch_invalidates_shared_caches(remote):
+    server, raw = remote
+    url = f"{server.url}/raw/data.xlsx"
+    app.load_machines_data()
+    version = app.machines_data_version()
+    app._report_cache().get_or_build((version, None, "test", ()), lambda: "نتيجة")
+    
+    assert app.fetch_from_github(url) is True
+    assert app._machines_store()["data"] is None
+    assert app._report_cache().size == 0
+    assert app.machines_data_version() == version + 1
@@ -0,0 +1,115 @@
+"""عامل الرفع إلى GitHub مقابل خادم محلي: التجميع والـ SHA المحفوظ وإعادة المحاولة"""
+import base64
+import time
+
+import pytest
+
+import app
+
+CONTENTS_PATH = "/repos/owner/repo/contents/data.xlsx"
+
+
+class FakeContentsApi:
+    """واجهة contents مبسطة: SHA يتغير مع كل كتابة، وكتابة بـ SHA قديم ترد 409"""
+
+    def __init__(self):
+        self.sha = "sha-0"
+        self.content = None
+        self.put_failures = 0
+
+    def __call__(self, request):
+        if not request["path"].startswith(CONTENTS_PATH):
+            return 404, {}, {"message": "Not Found"}
+        if request["method"] == "GET":
+            return 200, {}, {"sha": self.sha}
+        if self.put_failures:
+            self.put_failures -= 1
+            return 500, {}, {"message": "Server Error"}
+        if request["json"].get("sha") != self.sha:
+            return 409, {}, {"message": "sha does not match"}
+        self.content = base64.b64decode(request["json"]["content"])
+        self.sha = f"sha-{int(self.sha.split('-')[1]) + 1}"
+        return 200, {}, {"content": {"sha": self.sha}}
+
+
+@pytest.fixture
+def github(http_server):
+    api = FakeContentsApi()
+    http_server.respond = api
+    return http_server, api
+
+
+def make_worker(server, **options):
+    options.setdefault("debounce_seconds", 0)
+    options.setdefault("backoff_seconds", 0.01)
+    return app.GitHubPushWorker(server.url, "owner/repo", "main", "data.xlsx", timeout=5, **options)
+
+
+def calls(server):
+    return [(request["method"], (request["json"] or {}).get("sha")) for request in server.requests]
+
+
+def test_debounce_batches_snapshots_into_one_commit(github):
+    server, api = github
+    worker = make_worker(server, debounce_seconds=0.3)
+    for number in range(3):
+        worker.submit(f"v{number}".encode(), f"تحديث {number}", "token")
+    assert worker.flush(10)
+    
+    puts = [request for request in server.requests if request["method"] == "PUT"]
+    assert len(puts) == 1
+    assert api.content == b"v2"
+    assert puts[0]["json"]["message"] == "تحديث 2 (+2 تحديثات مجمعة)"
+    assert puts[0]["headers"]["Authorization"] == "token token"
+    assert worker.status()["commits"] == 1
+
+
+def test_cached_sha_is_reused_and_refreshed_on_conflict(github):
+    server, api = github
+    worker = make_worker(server)
+    
+    worker.submit(b"v1", "أول", "token")
+    assert worker.flush(10)
+    worker.submit(b"v2", "ثاني", "token")
+    assert worker.flush(10)
+    # SHA معروف من الرد السابق: لا GET قبل الكتابة
+    assert calls(server) == [("GET", None), ("PUT", "sha-0"), ("PUT", "sha-1")]
+    
+    # كتابة من خارج العامل تجعل الـ SHA المحفوظ قديماً
+    api.sha = "sha-10"
+    server.requests.clear()
+    worker.submit(b"v3", "ثالث", "token")
+    assert worker.flush(10)
+    assert calls(server) == [("PUT", "sha-2"), ("GET", None), ("PUT", "sha-10")]
+    assert api.content == b"v3"
+    assert worker.status()["last_error"] is None
+
+
+def test_retries_transient_failures_with_backoff(github):
+    server, api = github
+    api.put_failures = 2
+    worker = make_worker(server, max_retries=5)
+    worker.submit(b"v1", "أول", "token")
+    assert worker.flush(10)
+    
+    assert [method for method, _ in calls(server)].count("PUT") == 3
+    assert api.content == b"v1"
+    assert worker.status()["state"] == "idle"
+    assert worker.status()["last_error"] is None
+
+
+def test_no_backoff_after_final_attempt(github):
+    server, api = github
+    api.put_failures = 100
+    worker = make_worker(server, max_retries=3, backoff_seconds=0.4)
+    started = time.monotonic()
+    worker.submit(b"v1", "أول", "token")
+    assert worker.flush(10)
+    elapsed = time.monotonic() - started
+    
+    assert [method for method, _ in calls(server)].count("PUT") == 3
+    status = worker.status()
+    assert status["state"] == "error"
+    assert "500" in status["last_error"]
+    # انتظار بعد المحاولتين الأوليين فقط (0.4 + 0.8)، وليس 1.6 إضافية بعد الأخيرة
+    assert 1.2 <= elapsed < 2.4
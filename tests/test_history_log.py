@@ -0,0 +1,85 @@
+"""سجل الصيانة الإلحاقي: الترتيب بتاريخ الحدث والاستعلام بالفترة والكتابة من عدة عمليات"""
+import multiprocessing
+
+import app
+
+
+def event(machine_id, day, timestamp, event_type="completion"):
+    return {
+        "history_id": f"{machine_id}-{day}-{timestamp}",
+        "machine_id": machine_id,
+        "date": day,
+        "timestamp": timestamp,
+        "event_type": event_type
+    }
+
+
+def make_log(directory, segment_bytes=1 << 20):
+    return app.MaintenanceHistoryLog(str(directory / "history"), segment_bytes)
+
+
+def ids(events):
+    return [item["history_id"] for item in events]
+
+
+def test_backdated_events_are_ordered_by_event_date(tmp_path):
+    log = make_log(tmp_path, segment_bytes=200)
+    log.append([event("m0", "10/03/2025", "2025-03-10T09:00:00")])
+    log.append([event("m0", "20/03/2025", "2025-03-20T09:00:00"), event("m1", "15/03/2025", "2025-03-20T09:05:00")])
+    # إتمام سُجل لاحقاً بتاريخ سابق
+    log.append([event("m0", "01/03/2025", "2025-03-21T08:00:00")])
+    
+    assert ids(log.query("m0")) == [
+        "m0-01/03/2025-2025-03-21T08:00:00",
+        "m0-10/03/2025-2025-03-10T09:00:00",
+        "m0-20/03/2025-2025-03-20T09:00:00"
+    ]
+    # الفترة تُطابق على تاريخ الحدث وليس وقت تسجيله
+    assert ids(log.query("m0", since="2025-03-01T00:00:00", until="2025-03-10T23:59:59")) == [
+        "m0-01/03/2025-2025-03-21T08:00:00",
+        "m0-10/03/2025-2025-03-10T09:00:00"
+    ]
+    assert ids(log.query(since="2025-03-12T00:00:00", until="2025-03-31T23:59:59")) == [
+        "m1-15/03/2025-2025-03-20T09:05:00",
+        "m0-20/03/2025-2025-03-20T09:00:00"
+    ]
+    # سجل جديد يبني نفس الفهرس من الملفات
+    assert ids(make_log(tmp_path).query("m0")) == ids(log.query("m0"))
+
+
+def test_torn_tail_is_truncated_by_next_append(tmp_path):
+    log = make_log(tmp_path)
+    log.append([event("m0", "01/01/2025", "2025-01-01T10:00:00")])
+    with open(log._segments[-1]["path"], "ab") as f:
+        f.write(b'{"history_id": "torn", "machine')
+    
+    other = make_log(tmp_path)
+    assert len(other) == 1
+    other.append([event("m0", "02/01/2025", "2025-01-02T10:00:00")])
+    
+    fresh = make_log(tmp_path)
+    assert ids(fresh.query("m0")) == ["m0-01/01/2025-2025-01-01T10:00:00", "m0-02/01/2025-2025-01-02T10:00:00"]
+    assert len(log) == 2
+
+
+def _appender(args):
+    directory, worker, count = args
+    log = make_log(directory, segment_bytes=2000)
+    for number in range(count):
+        log.append([event(f"w{worker}", f"{number % 28 + 1:02d}/02/2025", f"2025-03-01T00:00:{number:02d}")])
+    return len(log)
+
+
+def test_concurrent_appenders_across_processes(tmp_path):
+    workers, count = 6, 40
+    with multiprocessing.get_context("fork").Pool(workers) as pool:
+        pool.map(_appender, [(tmp_path, worker, count) for worker in range(workers)])
+    
+    log = make_log(tmp_path)
+    assert len(log) == workers * count
+    for worker in range(workers):
+        events = log.query(f"w{worker}")
+        assert len(events) == count
+        assert [app.MaintenanceHistoryLog.event_time(item) for item in events] == sorted(
+            app.MaintenanceHistoryLog.event_time(item) for item in events
+        )
@@ -0,0 +1,109 @@
+"""حساب التاريخ التالي بالتقويم: نهايات الشهور والسنوات الكبيسة والقيم الحدية"""
+from datetime import datetime
+
+import numpy as np
+import pytest
+from dateutil.relativedelta import relativedelta
+from hypothesis import given, settings, strategies as st
+
+import app
+
+Unit = app.MaintenanceUnit
+
+
+def epoch(text):
+    return int(np.datetime64(datetime.strptime(text, "%d/%m/%Y"), "ns").astype(np.int64))
+
+
+@pytest.mark.parametrize("last, interval, unit, expected", [
+    # نهايات الشهور
+    ("31/01/2024", 1, "شهور", "29/02/2024"),
+    ("31/01/2023", 1, "أشهر", "28/02/2023"),
+    ("31/03/2024", 1, "أشهر", "30/04/2024"),
+    ("31/08/2024", 1, "أشهر", "30/09/2024"),
+    ("30/11/2024", 3, "أشهر", "28/02/2025"),
+    ("31/12/2024", 2, "شهور", "28/02/2025"),
+    ("31/10/2024", 12, "أشهر", "31/10/2025"),
+    # السنوات الكبيسة
+    ("29/02/2024", 1, "سنوات", "28/02/2025"),
+    ("29/02/2024", 4, "سنوات", "29/02/2028"),
+    ("28/02/2024", 1, "أيام", "29/02/2024"),
+    ("28/02/2023", 1, "أيام", "01/03/2023"),
+    ("29/02/2000", 100, "سنوات", "28/02/2100"),
+    # فترات صفرية وسالبة
+    ("31/01/2024", 0, "أشهر", "31/01/2024"),
+    ("15/05/2024", 0, "أيام", "15/05/2024"),
+    ("31/03/2024", -1, "شهور", "29/02/2024"),
+    ("01/03/2024", -1, "أيام", "29/02/2024"),
+    ("29/02/2024", -1, "سنوات", "28/02/2023"),
+    ("08/01/2025", -2, "أسابيع", "25/12/2024"),
+    # الأسابيع والفترات الكسرية والصيغ الأخرى
+    ("25/12/2024", 2, "أسابيع", "08/01/2025"),
+    ("01/01/2024", 6.0, "أشهر", "01/07/2024"),
+    ("01/01/2024", 1, "يوم", "02/01/2024"),
+    ("2024-01-31", 1, "شهور", "29/02/2024"),
+])
+def test_calculate_next_date(last, interval, unit, expected):
+    assert app.calculate_next_date(last, interval, unit) == expected
+
+
+@pytest.mark.parametrize("last, interval, unit", [
+    ("01/01/2024", 3, "ساعات"),
+    ("", 3, "أيام"),
+    (None, 3, "أشهر"),
+    ("bad", 3, "أشهر"),
+    ("01/01/2024", "x", "أشهر"),
+    ("01/01/2024", float("nan"), "أيام"),
+    ("01/01/2024", 10**9, "سنوات"),
+    ("01/01/2024", 10**12, "أيام"),
+])
+def test_calculate_next_date_without_result(last, interval, unit):
+    assert app.calculate_next_date(last, interval, unit) is None
+
+
+def test_add_intervals_keeps_missing_dates_missing():
+    result = app.add_intervals(
+        [app.NO_DATE, epoch("31/01/2024"), app.NO_DATE, epoch("31/01/2024")],
+        [1, 1, 5, np.nan],
+        [Unit.MONTHS, Unit.MONTHS, Unit.DAYS, Unit.MONTHS],
+    )
+    assert result.tolist() == [app.NO_DATE, epoch("29/02/2024"), app.NO_DATE, app.NO_DATE]
+
+
+def test_add_intervals_out_of_range_is_missing():
+    result = app.add_intervals([epoch("01/01/2260")], [5], [Unit.YEARS])
+    assert result.tolist() == [app.NO_DATE]
+
+
+@settings(max_examples=300, deadline=None)
+@given(
+    st.dates(min_value=datetime(1900, 1, 1).date(), max_value=datetime(2200, 12, 31).date()),
+    st.integers(-600, 600),
+    st.sampled_from([Unit.MONTHS, Unit.YEARS]),
+)
+def test_calendar_units_match_relativedelta(day, amount, unit):
+    start = datetime.combine(day, datetime.min.time())
+    delta = relativedelta(months=amount) if unit == Unit.MONTHS else relativedelta(years=amount)
+    expected = start + delta
+    [result] = app.add_intervals([int(np.datetime64(start, "ns").astype(np.int64))], [amount], [unit]).tolist()
+    if app._FIRST_SAFE_DAY <= np.datetime64(expected.date()) <= app._LAST_SAFE_DAY:
+        assert result == int(np.datetime64(expected, "ns").astype(np.int64))
+    else:
+        assert result == app.NO_DATE
+
+
+def test_fill_calendar_due_dates_uses_last_date_or_installation():
+    machines = [
+        {"id": "a", "installation_date": "31/01/2024", "next_maintenance": [
+            {"type_id": "calibration", "unit": "أشهر", "interval": 6, "last_date": None, "next_date": None},
+            {"type_id": "oil", "unit": "ساعات", "interval": 6, "last_date": None, "next_date": None},
+        ]},
+        {"id": "b", "installation_date": "01/01/2020", "next_maintenance": [
+            {"type_id": "calibration", "unit": "أشهر", "interval": 1, "last_date": "31/08/2025", "next_date": None},
+            {"type_id": "yearly", "unit": "سنوات", "interval": 1, "last_date": "29/02/2024", "next_date": "01/01/2030"},
+        ]},
+    ]
+    assert app.fill_calendar_due_dates(machines) == 2
+    assert [m["next_date"] for machine in machines for m in machine["next_maintenance"]] == [
+        "31/07/2024", None, "30/09/2025", "01/01/2030"
+    ]
@@ -0,0 +1,23 @@
+import app
+from tests.conftest import due_in, inspection, make_machine, seed_machines
+
+
+def test_bulk_complete_clears_the_table_selection(logged_in_app):
+    seed_machines([make_machine(f"m{i}", [inspection(due_in(i))]) for i in range(3)])
+    at = logged_in_app()
+    at.sidebar.radio(key="active_section").set_value(app.APP_CONFIG["CUSTOM_TABS"][2]).run()
+
+    # AppTest لا يحفظ تحديد الجدول بين التشغيلات: يُعاد تعيينه مع النقر كما يرسله المتصفح
+    [table] = at.dataframe
+    selection = {"selection": {"rows": [0, 1], "columns": [], "cells": []}}
+    at.session_state[table.key] = selection
+    at.run()
+    at.session_state[table.key] = selection
+    at.button(key="bulk_complete").click().run()
+    assert not at.exception
+    assert len(app.MaintenanceHistoryLog(app.HISTORY_DIR, app.APP_CONFIG["HISTORY_SEGMENT_BYTES"])) == 2
+
+    # الصفوف تغيرت بعد الحفظ: الجدول بمفتاح جديد فلا يبقى في المتصفح تحديد قديم يشير إلى الصيانة الثالثة
+    assert at.dataframe[0].key != table.key
+    assert not [m for m in at.markdown if "تم تحديد" in m.value]
+    assert not [b for b in at.button if b.key == "bulk_complete"]
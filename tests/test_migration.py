@@ -0,0 +1,35 @@
+"""ترحيل ملف JSON إلى SQLite لا يكتب فوق قاعدة فيها بيانات إلا مع --force"""
+import pytest
+
+import app
+
+from tests.conftest import make_machine
+
+
+def write_json(path, machines):
+    data = app._default_machines_data()
+    data["machines"] = machines
+    app.JsonMachinesStorage(str(path)).save(data)
+
+
+def test_migrate_into_empty_database(tmp_path):
+    write_json(tmp_path / "m.json", [make_machine("a"), make_machine("b")])
+    assert app.migrate_json_to_sqlite(str(tmp_path / "m.json"), str(tmp_path / "m.db")) == 2
+    assert [m["id"] for m in app.SqliteMachinesStorage(str(tmp_path / "m.db")).load()["machines"]] == ["a", "b"]
+
+
+def test_migrate_refuses_to_overwrite_without_force(tmp_path):
+    write_json(tmp_path / "m.json", [make_machine("a")])
+    existing = app._default_machines_data()
+    existing["machines"] = [make_machine("a", total_hours=900), make_machine("z")]
+    app.SqliteMachinesStorage(str(tmp_path / "m.db")).save(existing)
+    
+    with pytest.raises(app.StorageError) as error:
+        app.migrate_json_to_sqlite(str(tmp_path / "m.json"), str(tmp_path / "m.db"))
+    assert "2 ماكينة (1 ستُستبدل و1 ستُحذف)" in str(error.value)
+    assert "--force" in str(error.value)
+    assert len(app.SqliteMachinesStorage(str(tmp_path / "m.db")).load()["machines"]) == 2
+    
+    assert app.migrate_json_to_sqlite(str(tmp_path / "m.json"), str(tmp_path / "m.db"), force=True) == 1
+    [machine] = app.SqliteMachinesStorage(str(tmp_path / "m.db")).load()["machines"]
+    assert (machine["id"], machine["total_hours"]) == ("a", 100)
@@ -0,0 +1,140 @@
+"""تطابق محرك الوقت المتبقي المتجه مع الدالة الأصلية صفاً بصف"""
+import math
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+from hypothesis import given, settings, strategies as st
+
+import app
+
+NOW = datetime.now().replace(hour=10, minute=30, second=0, microsecond=0)
+
+
+def reference_remaining(next_date_str, next_hours, current_hours=None, now=NOW):
+    """calculate_remaining_time كما كانت قبل المحرك المتجه (مع تمرير الوقت الحالي)"""
+    remaining = {
+        "days": None,
+        "hours": None,
+        "status": "normal",
+        "percentage": 100
+    }
+
+    if next_date_str and pd.notna(next_date_str):
+        try:
+            next_date = pd.to_datetime(next_date_str, dayfirst=True)
+            days_remaining = (next_date - now).days
+
+            if days_remaining < 0:
+                remaining["days"] = abs(days_remaining)
+                remaining["status"] = "overdue"
+                remaining["percentage"] = 0
+            else:
+                remaining["days"] = days_remaining
+                if days_remaining <= app.APP_CONFIG["CRITICAL_DAYS_BEFORE"]:
+                    remaining["status"] = "critical"
+                    remaining["percentage"] = max(0, 100 * days_remaining / app.APP_CONFIG["CRITICAL_DAYS_BEFORE"])
+                elif days_remaining <= app.APP_CONFIG["WARNING_DAYS_BEFORE"]:
+                    remaining["status"] = "warning"
+                    remaining["percentage"] = max(0, 100 * days_remaining / app.APP_CONFIG["WARNING_DAYS_BEFORE"])
+                else:
+                    remaining["status"] = "normal"
+                    remaining["percentage"] = max(0, 100 * (1 - (days_remaining / 365)))
+        except Exception:
+            pass
+
+    if next_hours and pd.notna(next_hours) and current_hours and pd.notna(current_hours):
+        try:
+            hours_remaining = float(next_hours) - float(current_hours)
+
+            if hours_remaining < 0:
+                remaining["hours"] = abs(hours_remaining)
+                if remaining["status"] != "overdue":
+                    remaining["status"] = "overdue"
+            else:
+                remaining["hours"] = hours_remaining
+                if not remaining["days"]:
+                    if hours_remaining <= 50:
+                        remaining["status"] = "critical"
+                        remaining["percentage"] = max(0, 100 * hours_remaining / 50)
+                    elif hours_remaining <= 100:
+                        remaining["status"] = "warning"
+                        remaining["percentage"] = max(0, 100 * hours_remaining / 100)
+                    else:
+                        remaining["status"] = "normal"
+                        remaining["percentage"] = max(0, 100 * (1 - (hours_remaining / 1000)))
+        except Exception:
+            pass
+
+    return remaining
+
+
+dates = st.one_of(
+    st.sampled_from([None, "", float("nan"), "garbage", "2024-02-30", "31/02/2024"]),
+    st.integers(-400, 400).map(lambda days: (NOW + timedelta(days=days)).strftime("%d/%m/%Y")),
+    st.integers(-400, 400).map(lambda days: (NOW + timedelta(days=days)).strftime("%Y-%m-%d")),
+)
+hours = st.one_of(
+    st.sampled_from([None, 0, 0.0, "", float("nan"), "abc", "120", "0"]),
+    st.integers(-5, 3000),
+    st.floats(0, 3000, allow_nan=False),
+)
+
+
+def assert_same(expected, actual):
+    assert actual["status"] == expected["status"]
+    assert actual["days"] == expected["days"]
+    if expected["hours"] is None:
+        assert actual["hours"] is None
+    else:
+        assert actual["hours"] == pytest.approx(expected["hours"])
+    assert actual["percentage"] == pytest.approx(expected["percentage"])
+
+
+@settings(max_examples=200, deadline=None)
+@given(st.lists(st.tuples(dates, hours, hours), min_size=1, max_size=40))
+def test_batch_matches_reference_per_row(rows):
+    next_dates, next_hours, current_hours = zip(*rows)
+    batch = app.calculate_remaining_batch(next_dates, next_hours, current_hours, now=NOW).to_dict("records")
+    for row, actual in zip(rows, batch):
+        assert_same(reference_remaining(*row), actual)
+
+
+maintenance = st.fixed_dictionaries({
+    "type_id": st.sampled_from(["oil_change", "greasing", "inspection", "calibration"]),
+    "type_name": st.just("صيانة"),
+    "unit": st.sampled_from(["ساعات", "أيام", "أشهر", "شهور", "أسابيع", "سنوات"]),
+    "interval": st.integers(1, 1000),
+    "next_date": dates,
+    "next_hours": hours,
+})
+machines = st.lists(
+    st.tuples(hours, st.lists(maintenance, max_size=4, unique_by=lambda m: m["type_id"])),
+    min_size=1,
+    max_size=15,
+)
+
+
+@settings(max_examples=150, deadline=None)
+@given(machines)
+def test_fleet_columns_match_reference_per_entry(generated):
+    fleet = [
+        {"id": f"m{i}", "name": f"m{i}", "total_hours": total_hours, "next_maintenance": schedule}
+        for i, (total_hours, schedule) in enumerate(generated)
+    ]
+    computed = {
+        (machine["id"], maint["type_id"]): remaining
+        for (machine, maint), remaining, _ in app.DueIndex._compute(fleet, now=NOW)
+    }
+    assert len(computed) == sum(len(machine["next_maintenance"]) for machine in fleet)
+    for machine in fleet:
+        for maint in machine["next_maintenance"]:
+            expected = reference_remaining(maint["next_date"], maint["next_hours"], machine["total_hours"])
+            assert_same(expected, computed[(machine["id"], maint["type_id"])])
+
+
+def test_single_row_wrapper_matches_reference():
+    due = (datetime.now() + timedelta(days=5)).strftime("%d/%m/%Y")
+    actual = app.calculate_remaining_time(due, 1100, 1000)
+    assert_same(reference_remaining(due, 1100, 1000, now=datetime.now()), actual)
+    assert not math.isnan(actual["percentage"])
@@ -0,0 +1,41 @@
+"""ملفات التصدير: لا يُحذف إلا ما يخص الكاش وانتهت مدته"""
+import os
+import time
+
+import app
+
+
+def touch(name, age_seconds=0):
+    path = os.path.join(app.REPORTS_DIR, name)
+    with open(path, "wb") as f:
+        f.write(b"x")
+    stamp = time.time() - age_seconds
+    os.utime(path, (stamp, stamp))
+    return path
+
+
+def test_startup_removes_only_expired_report_files(workdir):
+    os.makedirs(app.REPORTS_DIR)
+    max_age = app.APP_CONFIG["REPORT_FILE_MAX_AGE_SECONDS"]
+    expired = touch("export-111-0123456789abcdef.xlsx", max_age + 60)
+    expired_tmp = touch("export-111-0123456789abcdef.csv.tmp", max_age + 60)
+    live = touch("export-222-fedcba9876543210.xlsx")
+    unrelated = touch("notes.xlsx", max_age + 60)
+    
+    app._report_cache()
+    assert not os.path.exists(expired)
+    assert not os.path.exists(expired_tmp)
+    assert os.path.exists(live)
+    assert os.path.exists(unrelated)
+
+
+def test_report_files_are_named_per_process_and_cleaned_by_owner(workdir):
+    path = app.cached_report_file("export", "csv", lambda target: open(target, "w").close(), "x")
+    name = os.path.basename(path)
+    assert name.startswith(f"export-{os.getpid()}-")
+    assert app.REPORT_FILE_PATTERN.match(name)
+    other = touch("export-1-0123456789abcdef.csv")
+    
+    app._report_cache().clear()
+    assert not os.path.exists(path)
+    assert os.path.exists(other)
@@ -0,0 +1,74 @@
+"""الصيانات المضغوطة (MaintenanceEntry) في الكاش المشترك تُقرأ وتُحفظ بصيغة JSON نفسها حرفياً"""
+import json
+
+from hypothesis import given, settings, strategies as st
+
+import app
+
+from tests.conftest import due_in, inspection, make_machine, seed_machines
+
+ODD_ENTRIES = [
+    inspection("2025-02-01"),
+    inspection("1/2/2025", unit="أشهر", remaining={"days": 3, "status": "critical"}),
+    inspection("ليس تاريخاً", unit="وحدة أخرى", last_date="31/01/2025"),
+    inspection("", unit=3, last_date=20250101, interval=2.5),
+    {"next_date": "01/02/2025", "type_name": "ترتيب مختلف", "type_id": "odd"},
+    {"type_id": "nothing"}
+]
+
+
+def fleet_json(machines):
+    data = app._default_machines_data()
+    data["machines"] = machines
+    return json.dumps(data, indent=4, ensure_ascii=False)
+
+
+def test_json_load_save_round_trip(workdir, monkeypatch):
+    monkeypatch.setitem(app.APP_CONFIG, "STORAGE_BACKEND", "json")
+    text = fleet_json([
+        make_machine("m0", [inspection(due_in(3)), inspection(due_in(-2), type_id="oil", unit="ساعات", next_hours=900)]),
+        make_machine("m1", ODD_ENTRIES)
+    ])
+    with open(app.MACHINES_FILE, "w", encoding="utf-8") as f:
+        f.write(text)
+
+    data = app.load_machines_data()
+    entries = data["machines"][0]["next_maintenance"] + data["machines"][1]["next_maintenance"]
+    assert all(type(maint).__name__ == "MaintenanceEntry" for maint in entries)
+    assert entries[0].next_date == app._cached_date(due_in(3))
+    assert data["machines"][1]["next_maintenance"] == ODD_ENTRIES
+
+    app.JsonMachinesStorage(app.MACHINES_FILE).save(data)
+    with open(app.MACHINES_FILE, encoding="utf-8") as f:
+        assert f.read() == text
+
+
+def test_copies_for_update_are_plain_dicts(workdir):
+    seed_machines([make_machine("m0", [inspection("01/02/2025")])])
+
+    copied = app.load_machines_data(for_update=True)["machines"][0]["next_maintenance"][0]
+    machine = app.get_machine("m0", for_update=True)
+    for maint in (copied, machine["next_maintenance"][0]):
+        assert type(maint) is dict and maint == inspection("01/02/2025")
+        maint["next_date"] = "02/02/2025"
+    assert app.load_machines_data()["machines"][0]["next_maintenance"][0]["next_date"] == "01/02/2025"
+
+
+def test_due_status_matches_dict_schedules():
+    machines = [make_machine(f"m{i}", [inspection(due_in(offset)), *ODD_ENTRIES]) for i, offset in enumerate((-5, 0, 4, 40))]
+    compact = app.compact_schedules(json.loads(json.dumps(machines)))
+    assert app.ScheduleColumns.from_machines(compact).remaining().equals(app.ScheduleColumns.from_machines(machines).remaining())
+
+
+json_values = st.one_of(
+    st.none(), st.booleans(), st.integers(-10**6, 10**6), st.floats(allow_nan=False, allow_infinity=False),
+    st.text(max_size=12), st.sampled_from(["01/02/2025", "1/2/2025", "2025-02-01", "31/02/2025", "01/02/3000", "ساعات", "أشهر"])
+)
+
+
+@settings(max_examples=300, deadline=None)
+@given(st.dictionaries(st.sampled_from(app.MaintenanceEntry.FIELDS + ("remaining", "notes")), json_values, max_size=10))
+def test_any_entry_round_trips(maint):
+    entry = app.MaintenanceEntry.from_dict(maint)
+    assert json.dumps(entry, default=dict, ensure_ascii=False) == json.dumps(maint, ensure_ascii=False)
+    assert all(entry.get(key) == maint.get(key) for key in app.MaintenanceEntry.FIELDS)
@@ -0,0 +1,191 @@
+"""التحكم التفاؤلي في التزامن: الدمج على مستوى الحقول والتعارض وسجل JSON"""
+import multiprocessing
+import random
+import time
+
+import pytest
+
+import app
+
+from tests.conftest import inspection, make_machine
+
+
+def make_storage(kind, directory):
+    if kind == "json":
+        return app.JsonMachinesStorage(str(directory / "machines.json"))
+    return app.SqliteMachinesStorage(str(directory / "machines.db"))
+
+
+def stored_machine(storage, machine_id):
+    return next(machine for machine in storage.load()["machines"] if machine["id"] == machine_id)
+
+
+def seed(storage, count=1):
+    data = app._default_machines_data()
+    data["machines"] = [make_machine(f"m{i}", [inspection("01/02/2025")]) for i in range(count)]
+    storage.save(data)
+
+
+def test_merge_machine_combines_disjoint_fields():
+    base = make_machine("m0", [inspection("01/02/2025")], revision=3)
+    ours = app._copy_machine(base)
+    ours["name"] = "اسم جديد"
+    theirs = app._copy_machine(base)
+    theirs["total_hours"] = 500
+    theirs["revision"] = 4
+    theirs["next_maintenance"][0]["last_date"] = "01/01/2025"
+    
+    merged = app.merge_machine(base, ours, theirs)
+    assert merged["name"] == "اسم جديد"
+    assert merged["total_hours"] == 500
+    assert merged["next_maintenance"][0]["last_date"] == "01/01/2025"
+
+
+def test_merge_machine_combines_disjoint_schedule_fields():
+    base = make_machine("m0", [inspection("01/02/2025")])
+    ours = app._copy_machine(base)
+    ours["next_maintenance"][0]["interval"] = 45
+    theirs = app._copy_machine(base)
+    theirs["next_maintenance"][0]["next_date"] = "15/02/2025"
+    
+    [entry] = app.merge_machine(base, ours, theirs)["next_maintenance"]
+    assert (entry["interval"], entry["next_date"]) == (45, "15/02/2025")
+
+
+def test_merge_machine_refuses_same_field_changes():
+    base = make_machine("m0", [inspection("01/02/2025")])
+    ours = app._copy_machine(base)
+    ours["total_hours"] = 200
+    theirs = app._copy_machine(base)
+    theirs["total_hours"] = 300
+    assert app.merge_machine(base, ours, theirs) is None
+    
+    ours = app._copy_machine(base)
+    ours["next_maintenance"][0]["next_date"] = "02/02/2025"
+    theirs = app._copy_machine(base)
+    theirs["next_maintenance"] = []
+    assert app.merge_machine(base, ours, theirs) is None
+
+
+@pytest.mark.parametrize("kind", ["json", "sqlite"])
+def test_save_machines_merges_stale_write(tmp_path, kind):
+    storage = make_storage(kind, tmp_path)
+    seed(storage)
+    base = stored_machine(storage, "m0")
+    
+    first = app._copy_machine(base)
+    first["notes"] = "من الجلسة الأولى"
+    [saved] = storage.save_machines([first], {"m0": base})
+    assert saved["revision"] == base["revision"] + 1
+    
+    second = app._copy_machine(base)
+    second["total_hours"] = 999
+    [saved] = make_storage(kind, tmp_path).save_machines([second], {"m0": base})
+    assert saved["revision"] == base["revision"] + 2
+    
+    result = stored_machine(make_storage(kind, tmp_path), "m0")
+    assert (result["notes"], result["total_hours"], result["revision"]) == ("من الجلسة الأولى", 999, saved["revision"])
+
+
+@pytest.mark.parametrize("kind", ["json", "sqlite"])
+def test_save_machines_raises_on_same_field_conflict(tmp_path, kind):
+    storage = make_storage(kind, tmp_path)
+    seed(storage)
+    base = stored_machine(storage, "m0")
+    
+    first = app._copy_machine(base)
+    first["total_hours"] = 200
+    storage.save_machines([first], {"m0": base})
+    
+    second = app._copy_machine(base)
+    second["total_hours"] = 300
+    with pytest.raises(app.ConflictError):
+        make_storage(kind, tmp_path).save_machines([second], {"m0": base})
+    # بدون أساس للدمج تُرفض أي كتابة بمراجعة قديمة
+    with pytest.raises(app.ConflictError):
+        make_storage(kind, tmp_path).save_machines([second])
+    assert stored_machine(make_storage(kind, tmp_path), "m0")["total_hours"] == 200
+
+
+def test_json_journal_ignores_torn_tail(tmp_path):
+    storage = make_storage("json", tmp_path)
+    seed(storage)
+    machine = stored_machine(storage, "m0")
+    machine["total_hours"] = 111
+    storage.save_machines([machine])
+    
+    # كتابة انقطعت في منتصف السطر
+    with open(storage.journal_path, "ab") as f:
+        f.write(b'{"machines": [{"id": "m0", "total_ho')
+    
+    reader = make_storage("json", tmp_path)
+    machine = stored_machine(reader, "m0")
+    assert machine["total_hours"] == 111
+    
+    machine["total_hours"] = 222
+    reader.save_machines([machine])
+    assert stored_machine(make_storage("json", tmp_path), "m0")["total_hours"] == 222
+    with open(storage.journal_path, "rb") as f:
+        assert all(line.endswith(b"\n") for line in f.readlines())
+
+
+def test_json_journal_from_older_snapshot_is_ignored(tmp_path):
+    storage = make_storage("json", tmp_path)
+    seed(storage)
+    machine = stored_machine(storage, "m0")
+    machine["total_hours"] = 111
+    storage.save_machines([machine])
+    with open(storage.journal_path, "rb") as f:
+        journal = f.read()
+    
+    data = storage.load()
+    data["machines"][0]["total_hours"] = 5
+    storage.save(data)
+    # سجل متبقٍ من قبل آخر كتابة كاملة (مثلاً انقطاع قبل حذفه)
+    with open(storage.journal_path, "wb") as f:
+        f.write(journal)
+    
+    assert stored_machine(make_storage("json", tmp_path), "m0")["total_hours"] == 5
+
+
+def _writer(args):
+    """زيادة عداد خاص بالعامل (يُدمج) وكتابة حقل مشترك (يتعارض) مع إعادة المحاولة"""
+    kind, directory, worker, operations = args
+    storage = make_storage(kind, directory)
+    random.seed(worker)
+    own = conflicts = 0
+    for step in range(operations):
+        machine_id = f"m{random.randint(0, 2)}"
+        shared = random.random() < 0.3
+        while True:
+            base = stored_machine(storage, machine_id)
+            mine = app._copy_machine(base)
+            if shared:
+                mine["notes"] = f"w{worker}-{step}"
+            else:
+                mine[f"count_w{worker}"] = mine.get(f"count_w{worker}", 0) + 1
+            time.sleep(random.random() * 0.002)
+            try:
+                storage.save_machines([mine], {machine_id: base})
+                break
+            except app.ConflictError:
+                conflicts += 1
+        own += not shared
+    return worker, own, operations, conflicts
+
+
+@pytest.mark.parametrize("kind", ["json", "sqlite"])
+def test_concurrent_writers_across_processes(tmp_path, kind):
+    storage = make_storage(kind, tmp_path)
+    seed(storage, count=3)
+    workers, operations = 6, 30
+    
+    with multiprocessing.get_context("fork").Pool(workers) as pool:
+        results = pool.map(_writer, [(kind, tmp_path, worker, operations) for worker in range(workers)])
+    
+    machines = make_storage(kind, tmp_path).load()["machines"]
+    for worker, own, _, _ in results:
+        assert sum(machine.get(f"count_w{worker}", 0) for machine in machines) == own
+    # كل حفظ ناجح رفع المراجعة مرة واحدة بالضبط
+    assert sum(machine["revision"] for machine in machines) == workers * operations
+    assert all(machine["notes"].startswith("w") or machine["notes"] == "" for machine in machines)
@@ -0,0 +1,49 @@
+import app
+from tests.conftest import due_in, inspection, make_machine, seed_machines
+
+
+def _history_count():
+    return len(app.MaintenanceHistoryLog(app.HISTORY_DIR, app.APP_CONFIG["HISTORY_SEGMENT_BYTES"]))
+
+
+def _submit(at):
+    [button] = [b for b in at.button if b.label == "💾 تسجيل الصيانات المحددة"]
+    button.click().run()
+
+
+def test_repeated_submit_does_not_record_completion_twice(logged_in_app):
+    seed_machines([make_machine("m0", [inspection(due_in(2))])])
+    at = logged_in_app()
+    at.sidebar.radio(key="active_section").set_value(app.APP_CONFIG["CUSTOM_TABS"][3]).run()
+    # كل الحالات ظاهرة حتى تبقى البطاقة بعد إعادة جدولتها
+    [status_filter] = [m for m in at.multiselect if m.label == "الحالة"]
+    status_filter.set_value(["normal", "warning", "critical", "overdue"]).run()
+
+    at.checkbox(key="done_timer_m0_inspection").check()
+    _submit(at)
+    assert not at.exception
+    assert _history_count() == 1
+    assert not at.checkbox(key="done_timer_m0_inspection").value
+
+    # إرسال ثانٍ بدون تحديد شيء لا يسجل إتماماً جديداً
+    _submit(at)
+    assert not at.exception
+    assert _history_count() == 1
+
+
+def test_page_buttons_reflect_the_page_they_lead_to(logged_in_app):
+    seed_machines([make_machine(f"m{i:02d}", [inspection(due_in(i))]) for i in range(13)])
+    at = logged_in_app()
+    at.sidebar.radio(key="active_section").set_value(app.APP_CONFIG["CUSTOM_TABS"][3]).run()
+    [status_filter] = [m for m in at.multiselect if m.label == "الحالة"]
+    status_filter.set_value(["normal", "warning", "critical", "overdue"]).run()
+    assert (at.button(key="timers_prev").disabled, at.button(key="timers_next").disabled) == (True, False)
+
+    # الزران يُرسمان بعد تغيير الصفحة: التالي معطل في الصفحة الأخيرة من أول نقرة
+    at.button(key="timers_next").click().run()
+    assert at.session_state["timers_page"] == 1
+    assert (at.button(key="timers_prev").disabled, at.button(key="timers_next").disabled) == (False, True)
+
+    at.button(key="timers_prev").click().run()
+    assert at.session_state["timers_page"] == 0
+    assert (at.button(key="timers_prev").disabled, at.button(key="timers_next").disabled) == (True, False)